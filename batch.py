@@ -0,0 +1,331 @@
+import os
+import csv
+import glob
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from stabilizing import local_stabilizer_video, global_stabilizer_video, perspective_stabilizer_video
+from trajectory import SMOOTHING_METHODS
+from trajectory_cache import TrajectoryCache, DEFAULT_CACHE_DIR
+from lk_window import WINDOW_POLICIES
+from point_selection import SELECTION_METHODS
+from warping import INTERPOLATIONS, BORDERS
+from encoding import CODECS, FFMPEG_CODECS, CODEC_EXTENSIONS, X264_PRESETS, DEFAULT_PRESET, DEFAULT_CRF, ffmpeg_available
+from cropping import parse_size
+from results import VideoOpenError
+
+DEFAULT_JOB = {
+    'stabilization_type': 'global',
+    'roi_x': 0,
+    'roi_y': 0,
+    'roi_width': 0,
+    'roi_height': 0,
+    'max_shift_x': 0,
+    'max_shift_y': 0,
+    'max_level': 10,
+    'eps': 0.01,
+    'count': 30,
+    'factor': 4,
+    'two_pass': False,
+    'smoothing': 'moving_average',
+    'smoothing_window': 30,
+    'lk_window': 'auto',
+    'points': 'grid',
+    'points_budget': None,
+    'analysis_scale': 1.0,
+    'interpolation': 'linear',
+    'border': 'constant',
+    'codec': 'XVID',
+    'preset': DEFAULT_PRESET,
+    'crf': DEFAULT_CRF,
+    'bitrate': None,
+    'crop': False,
+    'output_size': None
+}
+
+# Files picked from a folder or glob source; manifests name their inputs explicitly.
+VIDEO_EXTENSIONS = {'.avi', '.mp4', '.m4v', '.mov', '.mkv', '.webm', '.wmv', '.flv', '.mpg', '.mpeg', '.ts', '.mts', '.3gp'}
+
+INT_FIELDS = ['roi_x', 'roi_y', 'roi_width', 'roi_height', 'max_shift_x', 'max_shift_y', 'max_level', 'count', 'factor', 'smoothing_window', 'crf']
+FLOAT_FIELDS = ['eps', 'analysis_scale']
+
+def normalize_job(row, defaults):
+    job = dict(defaults)
+    for field, value in row.items():
+        if value is None or value == '':
+            continue
+        field = {'type': 'stabilization_type', 'input': 'video_path', 'output': 'output_path'}.get(field, field)
+        job[field] = value
+
+    # "roi" may be given as "x,y,w,h" or as a list instead of four separate columns.
+    if 'roi' in job:
+        roi = job.pop('roi')
+        if isinstance(roi, str):
+            roi = roi.replace(';', ',').split(',')
+        job['roi_x'], job['roi_y'], job['roi_width'], job['roi_height'] = roi
+
+    for field in INT_FIELDS:
+        job[field] = int(job[field])
+    for field in FLOAT_FIELDS:
+        job[field] = float(job[field])
+    for field in ['two_pass', 'crop']:
+        if isinstance(job[field], str):
+            job[field] = job[field].strip().lower() in ('1', 'true', 'yes')
+
+    if 'video_path' not in job or 'output_path' not in job:
+        raise ValueError(f"Job without input or output: {row}")
+    if job['stabilization_type'] not in ['local', 'global', 'perspective']:
+        raise ValueError(f"Invalid stabilization type: {job['stabilization_type']}")
+    if job['points_budget'] is not None:
+        job['points_budget'] = int(job['points_budget'])
+    if job['points'] not in SELECTION_METHODS:
+        raise ValueError(f"Invalid point selection method: {job['points']}")
+    if job['lk_window'] not in WINDOW_POLICIES:
+        raise ValueError(f"Invalid LK window policy: {job['lk_window']}")
+    if not 0 < job['analysis_scale'] <= 1:
+        raise ValueError(f"Invalid analysis scale: {job['analysis_scale']}")
+    if job['interpolation'] not in INTERPOLATIONS:
+        raise ValueError(f"Invalid interpolation: {job['interpolation']}")
+    if job['border'] not in BORDERS:
+        raise ValueError(f"Invalid border: {job['border']}")
+    if job['codec'] not in CODECS:
+        raise ValueError(f"Invalid codec: {job['codec']}")
+    if job['codec'] in FFMPEG_CODECS and not ffmpeg_available():
+        raise ValueError(f"The {job['codec']} codec needs ffmpeg, which was not found")
+    if job['preset'] not in X264_PRESETS:
+        raise ValueError(f"Invalid x264 preset: {job['preset']}")
+    if job['output_size'] is not None:
+        output_size = parse_size(job['output_size'])
+        if output_size is None:
+            raise ValueError(f"Invalid output size: {job['output_size']}")
+        job['output_size'] = output_size
+    if job['stabilization_type'] in ['local', 'perspective'] and (job['roi_width'] <= 0 or job['roi_height'] <= 0):
+        raise ValueError(f"ROI required for {job['stabilization_type']} stabilization: {job['video_path']}")
+    return job
+
+def is_batch_input(path, output_dir, suffix):
+    # Only videos, and none of the outputs of this tool: they land next to the inputs by
+    # default, and would be stabilized again, or read while a worker is still writing them.
+    if not os.path.isfile(path) or os.path.splitext(path)[1].lower() not in VIDEO_EXTENSIONS:
+        return False
+    # Whatever their codec: "_stabilized" for the default suffix.
+    marker = os.path.splitext(suffix)[0]
+    if marker and os.path.splitext(os.path.basename(path))[0].endswith(marker):
+        return False
+    if output_dir is not None:
+        output_dir = os.path.abspath(output_dir)
+        if os.path.commonpath([os.path.abspath(path), output_dir]) == output_dir:
+            return False
+    return True
+
+def load_jobs(source, defaults, output_dir=None, suffix=None):
+    if suffix is None:
+        suffix = "_stabilized" + CODEC_EXTENSIONS[defaults['codec']]
+    if source.endswith('.json'):
+        with open(source) as file:
+            rows = json.load(file)
+        if isinstance(rows, dict):
+            rows = rows.get('jobs', [])
+    elif source.endswith('.csv'):
+        with open(source, newline='') as file:
+            rows = list(csv.DictReader(file))
+    else:
+        pattern = os.path.join(source, '*') if os.path.isdir(source) else source
+        rows = []
+        for video_path in sorted(glob.glob(pattern)):
+            if not is_batch_input(video_path, output_dir, suffix):
+                continue
+            name = os.path.splitext(os.path.basename(video_path))[0] + suffix
+            rows.append({'input': video_path, 'output': os.path.join(output_dir or os.path.dirname(video_path), name)})
+    return [normalize_job(row, defaults) for row in rows]
+
+def job_id(job):
+    return os.path.abspath(job['video_path']) + " -> " + os.path.abspath(job['output_path'])
+
+def load_state(state_path):
+    done = {}
+    if not os.path.isfile(state_path):
+        return done
+    with open(state_path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash: that job simply runs again.
+                continue
+            if entry.get('status') == 'done':
+                done[entry['id']] = entry
+    return done
+
+def _init_worker():
+    cv2.setNumThreads(1)
+
+def run_job(job, cache_dir=None, retries=0):
+    lkparams = [job['max_level'], job['eps'], job['count']]
+    roi = [job['roi_x'], job['roi_y'], job['roi_width'], job['roi_height']]
+    options = {
+        'preview': False,
+        'progress_callback': lambda current_frame, frame_count: None,
+        'two_pass': job['two_pass'],
+        'smoothing': job['smoothing'],
+        'smoothing_window': job['smoothing_window'],
+        'lk_window': job['lk_window'],
+        'points': job['points'],
+        'budget': job['points_budget'],
+        'analysis_scale': job['analysis_scale'],
+        'interpolation': job['interpolation'],
+        'border': job['border'],
+        'codec': job['codec'],
+        'preset': job['preset'],
+        'crf': job['crf'],
+        'bitrate': job['bitrate'],
+        'crop': job['crop'],
+        'output_size': job['output_size'],
+        'cache': TrajectoryCache(cache_dir) if cache_dir is not None else None
+    }
+
+    result = {'id': job_id(job), 'input': job['video_path'], 'output': job['output_path'], 'type': job['stabilization_type'], 'frames': 0}
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            output_dir = os.path.dirname(job['output_path'])
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            if job['stabilization_type'] == 'local':
+                run = local_stabilizer_video(job['video_path'], job['output_path'], lkparams, roi, job['factor'], **options)
+            elif job['stabilization_type'] == 'global':
+                run = global_stabilizer_video(job['video_path'], job['output_path'], lkparams, job['max_shift_x'], job['max_shift_y'], job['factor'], **options)
+            else:
+                run = perspective_stabilizer_video(job['video_path'], job['output_path'], lkparams, roi, job['factor'], **options)
+        except Exception as error:
+            result.update(status='failed', attempts=attempt + 1, wall_time=time.perf_counter() - start, fps=0, error_type=type(error).__name__,
+                          error=traceback.format_exc(limit=3))
+            if isinstance(error, VideoOpenError):
+                # Unreadable input: another attempt would fail the same way.
+                break
+            continue
+        wall_time = time.perf_counter() - start
+        result.update(status='done', attempts=attempt + 1, wall_time=wall_time, frames=run.frames, fps=run.frames / wall_time if wall_time > 0 else 0,
+                      tracking_failures=len(run.failed_frames), output_size=list(run.output_size) if run.output_size is not None else None, stages=run.stats['stages'], events=run.stats['events'],
+                      error_type=None, error=None)
+        break
+    return result
+
+def write_summary(results, summary_path):
+    done = [r for r in results if r['status'] == 'done']
+    wall_time = sum(r['wall_time'] for r in done)
+    summary = {
+        'jobs': len(results),
+        'done': len(done),
+        'failed': len(results) - len(done),
+        'total_frames': sum(r['frames'] for r in done),
+        'total_job_time': wall_time,
+        'average_fps': sum(r['frames'] for r in done) / wall_time if wall_time > 0 else 0,
+        'results': results
+    }
+    if summary_path.endswith('.csv'):
+        with open(summary_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['id', 'input', 'output', 'type', 'status', 'attempts', 'frames', 'tracking_failures', 'wall_time', 'fps', 'error_type', 'error'])
+            writer.writeheader()
+            for result in results:
+                writer.writerow({field: result.get(field) for field in writer.fieldnames})
+    else:
+        with open(summary_path, 'w') as file:
+            json.dump(summary, file, indent=2)
+    return summary
+
+def run_batch(jobs, concurrency=1, state_path=None, summary_path=None, cache_dir=None, retries=0, resume=True):
+    done = load_state(state_path) if state_path is not None and resume else {}
+    pending = [job for job in jobs if job_id(job) not in done]
+    results = [done[job_id(job)] for job in jobs if job_id(job) in done]
+    if done:
+        print(f"Resuming: {len(results)} jobs already done, {len(pending)} to run")
+
+    for path in (state_path, summary_path):
+        if path is not None and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    state_file = open(state_path, 'a') if state_path is not None else None
+    try:
+        with ProcessPoolExecutor(max_workers=concurrency, initializer=_init_worker) as pool:
+            futures = {pool.submit(run_job, job, cache_dir, retries): job for job in pending}
+            for index, future in enumerate(as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as error:
+                    job = futures[future]
+                    result = {'id': job_id(job), 'input': job['video_path'], 'output': job['output_path'], 'type': job['stabilization_type'],
+                              'frames': 0, 'status': 'failed', 'attempts': 1, 'wall_time': 0, 'fps': 0, 'error_type': type(error).__name__, 'error': traceback.format_exc(limit=3)}
+                results.append(result)
+                if state_file is not None:
+                    state_file.write(json.dumps(result) + "\n")
+                    state_file.flush()
+                print(f"[{index}/{len(pending)}] {result['status']}: {result['input']} ({result['wall_time']:.1f} s, {result['fps']:.1f} fps)")
+    finally:
+        if state_file is not None:
+            state_file.close()
+
+    if summary_path is not None:
+        return write_summary(results, summary_path)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main-nogui.py batch", description="Stabilize a folder, glob or manifest (CSV/JSON) of videos")
+    parser.add_argument("source", help="Folder, glob pattern (e.g. 'clips/*.mp4') or CSV/JSON manifest of jobs")
+    parser.add_argument("-o", "--output_dir", help="Output folder for folder/glob sources (default: next to each input)")
+    parser.add_argument("-j", "--jobs", dest="concurrency", type=int, default=os.cpu_count() or 1, help="Number of videos processed at the same time")
+    parser.add_argument("--state", help="Progress file used to resume an interrupted batch (default: <summary>.state.jsonl)")
+    parser.add_argument("--summary", default="batch_summary.json", help="Summary file (.json or .csv) with per-job wall time and fps")
+    parser.add_argument("--no_resume", action="store_true", help="Run every job again even if the progress file says it is done")
+    parser.add_argument("--retries", type=int, default=0, help="Retries for a failed job")
+    parser.add_argument("--no_cache", action="store_true", help="Do not read or write the motion trajectory cache")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="Folder of the motion trajectory cache")
+    parser.add_argument("-t", "--stabilization_type", choices=['local', 'global', 'perspective'], help="Default type of stabilization")
+    parser.add_argument("-msx", "--max_shift_x", type=int, help="Default max shift X for global stabilization")
+    parser.add_argument("-msy", "--max_shift_y", type=int, help="Default max shift Y for global stabilization")
+    parser.add_argument("-ml", "--max_level", type=int, help="Default max level")
+    parser.add_argument("-e", "--eps", type=float, help="Default EPS value")
+    parser.add_argument("-c", "--count", type=int, help="Default count value")
+    parser.add_argument("-f", "--factor", type=int, help="Default factor")
+    parser.add_argument("-tp", "--two_pass", action="store_true", default=None, help="Use the two-pass mode by default")
+    parser.add_argument("-s", "--smoothing", choices=SMOOTHING_METHODS, help="Default trajectory smoothing for the two-pass mode")
+    parser.add_argument("-sw", "--smoothing_window", type=int, help="Default smoothing window for the two-pass mode")
+    parser.add_argument("--lk_window", choices=WINDOW_POLICIES, help="Default LK window policy")
+    parser.add_argument("-p", "--points", choices=SELECTION_METHODS, help="Default point selection method")
+    parser.add_argument("-pb", "--points_budget", type=int, help="Default maximum number of tracked points")
+    parser.add_argument("-as", "--analysis_scale", type=float, help="Default scale of the frames used for tracking")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, help="Default interpolation of the stabilized frames")
+    parser.add_argument("--border", choices=BORDERS, help="Default fill of the areas uncovered by the warp")
+    parser.add_argument("--codec", choices=CODECS, help="Default output codec (also sets the extension of folder/glob outputs)")
+    parser.add_argument("--preset", choices=X264_PRESETS, help="Default x264 speed preset for libx264")
+    parser.add_argument("--crf", type=int, help="Default x264 constant quality for libx264")
+    parser.add_argument("--bitrate", help="Default target bitrate for libx264, e.g. 4M")
+    parser.add_argument("--crop", action="store_true", default=None, help="Crop the outputs to the area covered by every stabilized frame by default")
+    parser.add_argument("--output_size", help="Default output size, WIDTHxHEIGHT")
+    args = parser.parse_args(argv)
+
+    defaults = dict(DEFAULT_JOB)
+    for field in ['stabilization_type', 'max_shift_x', 'max_shift_y', 'max_level', 'eps', 'count', 'factor', 'two_pass', 'smoothing', 'smoothing_window', 'lk_window', 'points', 'points_budget', 'analysis_scale', 'interpolation', 'border', 'codec', 'preset', 'crf', 'bitrate', 'crop', 'output_size']:
+        if getattr(args, field) is not None:
+            defaults[field] = getattr(args, field)
+
+    try:
+        jobs = load_jobs(args.source, defaults, args.output_dir)
+    except (OSError, ValueError) as error:
+        print("Invalid batch source:", error)
+        return
+    if not jobs:
+        print("No videos found.")
+        return
+
+    state_path = args.state if args.state is not None else os.path.splitext(args.summary)[0] + ".state.jsonl"
+    summary = run_batch(jobs, args.concurrency, state_path, args.summary, None if args.no_cache else args.cache_dir, args.retries, not args.no_resume)
+    print(f"Batch completed: {summary['done']}/{summary['jobs']} jobs, {summary['average_fps']:.1f} fps on average. Summary saved in: {args.summary}")
@@ -0,0 +1,67 @@
+import os
+import sys
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from common import CASES, scaled_copy
+
+# Python-side memory allocated per frame by the stabilization loop, with and without
+# reusing the frame buffers. tracemalloc sees the numpy arrays OpenCV returns (decoded,
+# grayscale and warped frames), not OpenCV's own internal buffers. "per frame" is the peak
+# of the traced memory above its level at the end of the previous frame, "growth" how much
+# the traced memory grew between the 10th and the last frame.
+
+class AllocationProfile:
+    def __init__(self):
+        self.peaks = []
+        self.levels = []
+        self.previous = None
+
+    def __call__(self, current_frame, frame_count):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.previous is not None:
+            self.peaks.append(peak - self.previous)
+        self.levels.append(current)
+        self.previous = current
+        tracemalloc.reset_peak()
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory allocated per frame by the stabilization loop, with and without buffer reuse")
+    parser.add_argument("-t", "--stabilization_type", choices=['local', 'global', 'perspective'], nargs="+", default=['local', 'global', 'perspective'], help="Types of stabilization to test")
+    parser.add_argument("--scale", type=float, default=1, help="Scale factor of the example videos")
+    parser.add_argument("-tp", "--two_pass", action="store_true", help="Profile the two-pass mode instead of the single-pass one")
+    parser.add_argument("--threaded", action="store_true", help="Decode and encode on separate threads")
+    args = parser.parse_args()
+
+    print(f"{'type':<12}{'frame':>11}{'reuse':>7}{'per frame (KB)':>16}{'max (KB)':>10}{'growth (KB)':>13}{'frame (KB)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for stabilization_type in args.stabilization_type:
+            video_path, roi = CASES[stabilization_type]
+            path = video_path if args.scale == 1 else scaled_copy(video_path, args.scale, tmp)
+            scaled_roi = tuple(int(v * args.scale) for v in roi) if roi is not None else None
+            for reuse in (False, True):
+                profile = AllocationProfile()
+                pipeline = build_pipeline(stabilization_type, VideoDecoder(path), VideoEncoder(os.path.join(tmp, "out.avi")), [10, 0.01, 30], scaled_roi,
+                                          progress_callback=profile, threaded=args.threaded, reuse_buffers=reuse)
+                tracemalloc.start()
+                if args.two_pass:
+                    pipeline.run_two_pass()
+                else:
+                    pipeline.run()
+                tracemalloc.stop()
+
+                # The first frames also calibrate the LK window.
+                peaks = np.array(profile.peaks[10:]) / 1024
+                growth = (profile.levels[-1] - profile.levels[10]) / 1024
+                frame = f"{pipeline.decoder.width}x{pipeline.decoder.height}"
+                frame_size = pipeline.decoder.width * pipeline.decoder.height * 3 / 1024
+                print(f"{stabilization_type:<12}{frame:>11}{'yes' if reuse else 'no':>7}{np.mean(peaks):>16.1f}{np.max(peaks):>10.1f}{growth:>13.1f}{frame_size:>12.1f}")
+
+if __name__ == "__main__":
+    main()
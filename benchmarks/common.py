@@ -0,0 +1,76 @@
+import os
+
+import cv2
+import numpy as np
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example")
+CASES = {
+    'local': (os.path.join(EXAMPLE_DIR, "vespa.mp4"), (140, 176, 34, 49)),
+    'global': (os.path.join(EXAMPLE_DIR, "vespa.mp4"), None),
+    'perspective': (os.path.join(EXAMPLE_DIR, "perspective-stabilization.avi"), (366, 111, 124, 30)),
+    'synthetic': (None, None)
+}
+
+def scaled_copy(video_path, scale, tmp):
+    # Larger frames make the cost of the "roi" policy (window = 2x ROI height) obvious.
+    path = os.path.join(tmp, f"{scale}x_" + os.path.splitext(os.path.basename(video_path))[0] + ".avi")
+    if os.path.isfile(path):
+        return path
+    cap = cv2.VideoCapture(video_path)
+    out = None
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        if out is None:
+            out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), cap.get(cv2.CAP_PROP_FPS), (frame.shape[1], frame.shape[0]))
+        out.write(frame)
+    cap.release()
+    out.release()
+    return path
+
+def synthetic_pan(tmp, frame_count=240, seed=0):
+    # Pan with hand-held jitter over a still, textured scene (the first frame of the vespa
+    # example, enlarged). Returns the video path and the true camera path.
+    path = os.path.join(tmp, "synthetic_pan.avi")
+    rng = np.random.default_rng(seed)
+    cap = cv2.VideoCapture(CASES['local'][0])
+    ret, frame = cap.read()
+    cap.release()
+    height, width = frame.shape[:2]
+    scene = cv2.resize(frame, (width * 2, height * 2), interpolation=cv2.INTER_CUBIC)
+    noise = cv2.GaussianBlur(rng.integers(0, 256, scene.shape).astype(np.uint8), (0, 0), 3)
+    scene = cv2.addWeighted(scene, 0.7, noise, 0.3, 0)
+
+    camera = np.cumsum(rng.normal(0, 1.0, (frame_count, 2)), axis=0) + rng.normal(0, 2.0, (frame_count, 2))
+    camera -= camera[0]
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (width, height))
+    for dx, dy in camera:
+        out.write(cv2.warpAffine(scene, np.float32([[1, 0, -width / 2 - dx], [0, 1, -height / 2 - dy]]), (width, height)))
+    out.release()
+    # The scene moves opposite to the camera.
+    return path, -camera
+
+def residual_jitter(video_path, transforms, roi):
+    # Locks the ROI with the measured trajectory and measures how much it still moves:
+    # the RMS phase correlation shift between consecutive stabilized frames.
+    cap = cv2.VideoCapture(video_path)
+    previous = None
+    steps = []
+    for transform in transforms:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        size = (frame.shape[1], frame.shape[0])
+        if transform[2, 0] == 0 and transform[2, 1] == 0:
+            frame = cv2.warpAffine(frame, transform[:2], size)
+        else:
+            frame = cv2.warpPerspective(frame, transform, size)
+        x, y, w, h = roi
+        patch = np.float32(cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY))
+        if previous is not None:
+            steps.append(np.hypot(*cv2.phaseCorrelate(previous, patch)[0]))
+        previous = patch
+    cap.release()
+    return float(np.sqrt(np.mean(np.square(steps))))
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from trajectory import SMOOTHING_METHODS
+from cropping import crop_window, fit_output
+from common import CASES, scaled_copy
+
+# Rendering time and output size of global stabilization with the crop window, written
+# directly by the stabilizer, against rendering the full canvas and cropping it in a second
+# decode and encode pass, as a separate crop of the output does. Both crop the same window.
+
+def crop_pass(input_path, output_path, window):
+    x, y, width, height = window
+    decoder = VideoDecoder(input_path)
+    decoder.open()
+    encoder = VideoEncoder(output_path)
+    encoder.open(decoder.fps, (width, height))
+    while True:
+        frame = decoder.read()
+        if frame is None:
+            break
+        encoder.write(frame[y:y + height, x:x + width])
+    encoder.release()
+    decoder.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Render time and size of the cropped output, direct or with a second crop pass")
+    parser.add_argument("-s", "--smoothing", choices=SMOOTHING_METHODS, default='moving_average', help="Trajectory smoothing of the corrections")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1, 4.5], help="Scale factors of the example video (4.5 is 1440x1080)")
+    parser.add_argument("--shift", type=int, nargs=2, default=[50, 42], help="max_shift_x and max_shift_y at scale 1")
+    args = parser.parse_args()
+
+    print(f"{'frame':>11}{'output':>11}{'mode':>13}{'render (s)':>12}{'crop pass (s)':>15}{'total (s)':>11}{'size (MB)':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scale:
+            video_path = CASES['global'][0] if scale == 1 else scaled_copy(CASES['global'][0], scale, tmp)
+            offset = (args.shift[0] * scale, args.shift[1] * scale)
+            pipeline = build_pipeline('global', VideoDecoder(video_path), VideoEncoder(None), [10, 0.01, 30], offset=offset)
+            transforms = pipeline.analyze().corrections(args.smoothing, 30, offset)
+            size = (pipeline.decoder.width, pipeline.decoder.height)
+            window = crop_window(transforms, size)
+            cropped, output_size = fit_output(transforms, size, crop=True)
+
+            full_path = os.path.join(tmp, "full.avi")
+            start = time.perf_counter()
+            build_pipeline('global', VideoDecoder(video_path), VideoEncoder(full_path), [10, 0.01, 30]).render(transforms)
+            render_time = time.perf_counter() - start
+            start = time.perf_counter()
+            crop_pass(full_path, os.path.join(tmp, "two_passes.avi"), window)
+            crop_time = time.perf_counter() - start
+
+            direct_path = os.path.join(tmp, "direct.avi")
+            start = time.perf_counter()
+            build_pipeline('global', VideoDecoder(video_path), VideoEncoder(direct_path), [10, 0.01, 30]).render(cropped, size=output_size)
+            direct_time = time.perf_counter() - start
+
+            frame = f"{size[0]}x{size[1]}"
+            output = f"{output_size[0]}x{output_size[1]}"
+            two_passes_size = os.path.getsize(os.path.join(tmp, "two_passes.avi")) / 1e6
+            print(f"{frame:>11}{frame:>11}{'full canvas':>13}{render_time:>12.2f}{'-':>15}{render_time:>11.2f}{os.path.getsize(full_path) / 1e6:>11.2f}")
+            print(f"{frame:>11}{output:>11}{'crop pass':>13}{render_time:>12.2f}{crop_time:>15.2f}{render_time + crop_time:>11.2f}{two_passes_size:>11.2f}")
+            print(f"{frame:>11}{output:>11}{'direct':>13}{direct_time:>12.2f}{'-':>15}{direct_time:>11.2f}{os.path.getsize(direct_path) / 1e6:>11.2f}")
+
+if __name__ == "__main__":
+    main()
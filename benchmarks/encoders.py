@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder
+from encoding import OPENCV_CODECS, FFMPEG_CODECS, CODEC_EXTENSIONS, X264_PRESETS, ffmpeg_available, make_encoder
+from common import CASES, scaled_copy
+
+# Encoding time per frame, file size and frame rate read back for every codec, on an
+# example re-timed to 29.97 fps. libx264 runs in its own process: its time is what the
+# pipeline waits for, writing into the pipe and finishing the file.
+
+def retimed_copy(video_path, fps, tmp):
+    path = os.path.join(tmp, "retimed_" + os.path.splitext(os.path.basename(video_path))[0] + ".avi")
+    cap = cv2.VideoCapture(video_path)
+    out = None
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if out is None:
+            out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (frame.shape[1], frame.shape[0]))
+        out.write(frame)
+    cap.release()
+    out.release()
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoding time, size and frame rate of the output codecs")
+    parser.add_argument("--scale", type=float, default=4.5, help="Scale factor of the example video (4.5 is 1440x1080)")
+    parser.add_argument("--presets", choices=X264_PRESETS, nargs="+", default=['ultrafast', 'veryfast', 'medium'], help="x264 presets to test")
+    args = parser.parse_args()
+
+    configurations = [(codec, None) for codec in OPENCV_CODECS]
+    if ffmpeg_available():
+        configurations += [(codec, preset) for codec in FFMPEG_CODECS for preset in args.presets]
+    else:
+        print("ffmpeg not found: libx264 is skipped")
+
+    print(f"{'codec':<10}{'preset':>11}{'encode (ms/frame)':>19}{'size (MB)':>11}{'fps':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = CASES['global'][0]
+        if args.scale != 1:
+            video_path = scaled_copy(video_path, args.scale, tmp)
+        video_path = retimed_copy(video_path, 30000 / 1001, tmp)
+        for codec, preset in configurations:
+            output_path = os.path.join(tmp, f"{codec}_{preset}{CODEC_EXTENSIONS[codec]}")
+            encoder = make_encoder(output_path, codec, preset) if preset is not None else make_encoder(output_path, codec)
+            decoder = VideoDecoder(video_path)
+            decoder.open()
+            encoder.open(decoder.fps, (decoder.width, decoder.height))
+            frame_count = 0
+            elapsed = 0.0
+            while True:
+                frame = decoder.read()
+                if frame is None:
+                    break
+                start = time.perf_counter()
+                encoder.write(frame)
+                elapsed += time.perf_counter() - start
+                frame_count += 1
+            start = time.perf_counter()
+            encoder.release()
+            elapsed += time.perf_counter() - start
+            decoder.release()
+
+            cap = cv2.VideoCapture(output_path)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            cap.release()
+            print(f"{codec:<10}{preset or '-':>11}{elapsed / frame_count * 1000:>19.2f}{os.path.getsize(output_path) / 1e6:>11.2f}{fps:>9.3f}")
+
+if __name__ == "__main__":
+    main()
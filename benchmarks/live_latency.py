@@ -0,0 +1,43 @@
+import os
+import sys
+import argparse
+import tempfile
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live import LIVE_SMOOTHERS, live_stabilize
+from common import CASES, scaled_copy
+
+# Latency percentiles and dropped frames of the live mode for several lookaheads, on the
+# global example read at its own frame rate (25 fps), as is and upscaled. "capture" frames
+# were dropped because the loop fell behind the source, "late" ones because they were
+# older than --max_latency when their lookahead was complete.
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles and drops of the live mode")
+    parser.add_argument("--lookahead", type=int, nargs="+", default=[0, 5, 15], help="Lookaheads to test (frames)")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1, 4.5], help="Scale factors of the example video (4.5 is 1440x1080)")
+    parser.add_argument("-as", "--analysis_scale", type=float, default=0.25, help="Analysis scale of the upscaled videos")
+    parser.add_argument("-s", "--smoothing", choices=LIVE_SMOOTHERS, default='moving_average', help="Causal smoothing of the camera path")
+    parser.add_argument("--max_latency", type=float, default=1000, help="Maximum latency (ms)")
+    args = parser.parse_args()
+
+    print(f"{'frame':>11}{'lookahead':>11}{'written':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'capture':>9}{'late':>6}{'output':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scale:
+            video_path = CASES['global'][0] if scale == 1 else scaled_copy(CASES['global'][0], scale, tmp)
+            analysis_scale = 1.0 if scale == 1 else args.analysis_scale
+            cap = cv2.VideoCapture(video_path)
+            frame = f"{int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}"
+            cap.release()
+            for lookahead in args.lookahead:
+                latency = live_stabilize('global', video_path, os.path.join(tmp, "live.avi"), [10, 0.01, 30], lookahead=lookahead, smoothing=args.smoothing,
+                                         max_latency=args.max_latency / 1000, analysis_scale=analysis_scale)
+                drops = [latency.drops.get(reason, 0) for reason in ("capture", "late", "output")]
+                print(f"{frame:>11}{lookahead:>11}{len(latency.latencies):>9}{latency.percentile(50) * 1000:>10.1f}{latency.percentile(95) * 1000:>10.1f}"
+                      f"{latency.percentile(99) * 1000:>10.1f}{drops[0]:>9}{drops[1]:>6}{drops[2]:>8}")
+
+if __name__ == "__main__":
+    main()
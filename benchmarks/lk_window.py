@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from lk_window import WINDOW_POLICIES
+from common import CASES, scaled_copy, synthetic_pan, residual_jitter
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LK window policies: tracking time and residual jitter")
+    parser.add_argument("-t", "--stabilization_type", choices=list(CASES), nargs="+", default=list(CASES), help="Types of stabilization to test")
+    parser.add_argument("-p", "--policies", choices=WINDOW_POLICIES, nargs="+", default=['roi', 'fixed', 'auto'], help="Window policies to compare")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1], help="Also test copies of the examples scaled by these factors (e.g. 4.5 for 1080p)")
+    parser.add_argument("-ml", "--max_level", type=int, default=10, help="Max level for stabilization")
+    args = parser.parse_args()
+
+    print(f"{'type':<12}{'scale':>6}{'policy':>8}{'window':>8}{'levels':>8}{'track (s)':>11}{'fps':>9}{'jitter (px)':>13}{'path error (px)':>17}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for stabilization_type in args.stabilization_type:
+            video_path, roi = CASES[stabilization_type]
+            truth = None
+            if stabilization_type == 'synthetic':
+                # Global stabilization of a clip whose camera path is known.
+                video_path, truth = synthetic_pan(tmp)
+            for scale in args.scale:
+                path = video_path if scale == 1 else scaled_copy(video_path, scale, tmp)
+                scaled_roi = tuple(int(v * scale) for v in roi) if roi is not None else None
+                for policy in args.policies:
+                    pipeline = build_pipeline('global' if truth is not None else stabilization_type, VideoDecoder(path), VideoEncoder(None), [args.max_level, 0.01, 30], scaled_roi, window=policy)
+                    start = time.perf_counter()
+                    trajectory = pipeline.analyze()
+                    elapsed = time.perf_counter() - start
+                    track_time = pipeline.stats.times.get("track", 0) + pipeline.stats.times.get("calibrate", 0)
+                    window = pipeline.tracker.lk_params['winSize'][0]
+                    levels = pipeline.tracker.lk_params['maxLevel']
+
+                    measure_roi = scaled_roi
+                    if measure_roi is None:
+                        # Global stabilization: measure on the central half of the frame.
+                        height, width = pipeline.decoder.height, pipeline.decoder.width
+                        measure_roi = (width // 4, height // 4, width // 2, height // 2)
+                    jitter = residual_jitter(path, trajectory.corrections('none'), measure_roi)
+                    error = f"{'-':>17}"
+                    if truth is not None:
+                        camera_path = trajectory.camera_path()[:, :2, 2]
+                        error = f"{np.mean(np.linalg.norm(camera_path - truth[:len(camera_path)] * scale, axis=1)):>17.2f}"
+                    print(f"{stabilization_type:<12}{scale:>6g}{policy:>8}{window:>8}{levels:>8}{track_time:>11.2f}{len(trajectory) / elapsed:>9.1f}{jitter:>13.2f}{error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from parallel import parallel_stabilize, trajectory_difference, TOLERANCE_RMS, TOLERANCE_MAX
+from lk_window import WINDOW_POLICIES
+from common import synthetic_pan
+
+def truth_error(trajectory, truth):
+    camera_path = trajectory.camera_path()[:, :2, 2]
+    return float(np.sqrt(np.mean(np.sum((camera_path - truth[:len(camera_path)]) ** 2, axis=1))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the chunked multi-process trajectory with the single-process one")
+    parser.add_argument("-i", "--input", dest="video_path", help="Path to the input video file (default: a synthetic pan with a known camera path)")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[2, 4, 8], help="Worker counts to test")
+    parser.add_argument("-ml", "--max_level", type=int, default=10, help="Max level for stabilization")
+    parser.add_argument("--lk_window", choices=WINDOW_POLICIES, default='auto', help="LK window policy")
+    args = parser.parse_args()
+
+    lkparams = [args.max_level, 0.01, 30]
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path, truth = (args.video_path, None) if args.video_path else synthetic_pan(tmp)
+        start = time.perf_counter()
+        reference = build_pipeline('global', VideoDecoder(video_path), VideoEncoder(None), lkparams, window=args.lk_window).analyze()
+        print(f"single process: {time.perf_counter() - start:.2f} s" + (f", {truth_error(reference, truth):.2f} px RMS from the true path" if truth is not None else ""))
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            trajectory = parallel_stabilize('global', video_path, os.path.join(tmp, "out.avi"), lkparams, workers=workers, window=args.lk_window)
+            elapsed = time.perf_counter() - start
+            rms, worst = trajectory_difference(reference, trajectory)
+            ok = rms <= TOLERANCE_RMS and worst <= TOLERANCE_MAX
+            failed = failed or not ok
+            print(f"{workers} workers: {elapsed:.2f} s (tracking + rendering), rms {rms:.2f} px, max {worst:.2f} px {'OK' if ok else 'OUT OF TOLERANCE'}"
+                  + (f", {truth_error(trajectory, truth):.2f} px RMS from the true path" if truth is not None else ""))
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
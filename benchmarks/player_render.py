@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import tkinter as tk
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video_player import VideoPlayer
+from buffers import FrameRing
+from common import CASES
+
+# Render time per frame of the video player and number of items on its canvas, per block of
+# frames: the player used to convert every full-size frame with PIL, resize it and add a new
+# image item to the canvas, which never removed the previous ones, so the item count grew
+# with every frame shown. It now scales the frame with OpenCV into
+# reused arrays, converts only the displayed pixels and pastes them into one PhotoImage.
+# Without a display only prepare() (scaling and conversion, the part that does not touch Tk)
+# is measured, with the Python memory traced at the end of every block instead of the items.
+
+class OldPlayer(VideoPlayer):
+    def prepare(self, frame, ring):
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        image = Image.fromarray(frame)
+        return image.resize(self.display_size, Image.BOX)
+
+    def display(self, frame_number, image):
+        photo = ImageTk.PhotoImage(image)
+        self.canvas.create_image(0, 0, image=photo, anchor=tk.NW)
+        self.canvas.image = photo
+        self.current_frame = frame_number
+
+class Headless:
+    # Stands in for a player without a display: prepare() only reads display_size.
+    def __init__(self, display_size):
+        self.display_size = display_size
+        self.frames = FrameRing(2)
+
+def load_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Render time per frame and canvas items of the video player over many frames")
+    parser.add_argument("--video", default=CASES['local'][0], help="Video the frames are taken from")
+    parser.add_argument("--frames", type=int, default=10000, help="Frames to render")
+    parser.add_argument("--block", type=int, default=1000, help="Frames per line of the report")
+    parser.add_argument("--size", default="960x540", help="Size of the canvas")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    frames = load_frames(args.video, 100)
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"No display ({e}): prepare() only")
+        root = None
+
+    print(f"{'player':<8}{'frames':>8}{'mean (ms)':>11}{'p95 (ms)':>10}{'items' if root is not None else 'traced (KB)':>12}")
+    for label, player_class in (('old', OldPlayer), ('new', VideoPlayer)):
+        if root is not None:
+            player = player_class(root)
+            player.pack()
+            player.canvas.config(width=width, height=height)
+            root.update()
+            player.display_size = (width, height)
+        else:
+            player = Headless((width, height))
+            tracemalloc.start()
+        times = np.zeros(args.frames)
+        for i in range(args.frames):
+            start = time.perf_counter()
+            if root is not None:
+                player.display(i, player.prepare(frames[i % len(frames)], player.frames))
+                root.update_idletasks()
+            else:
+                image = player_class.prepare(player, frames[i % len(frames)], player.frames)
+            times[i] = (time.perf_counter() - start) * 1000
+            if (i + 1) % args.block == 0:
+                block = times[i + 1 - args.block:i + 1]
+                last = len(player.canvas.find_all()) if root is not None else tracemalloc.get_traced_memory()[0] / 1024
+                print(f"{label:<8}{i + 1:>8}{np.mean(block):>11.2f}{np.percentile(block, 95):>10.2f}{last:>12.0f}")
+        if root is not None:
+            player.destroy()
+        else:
+            del image
+            tracemalloc.stop()
+    if root is not None:
+        root.destroy()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from point_selection import SELECTION_METHODS
+from lk_window import WINDOW_POLICIES
+from common import CASES, synthetic_pan, residual_jitter
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare point selection methods: tracking time, re-detections and residual jitter")
+    parser.add_argument("-t", "--stabilization_type", choices=list(CASES), nargs="+", default=list(CASES), help="Types of stabilization to test")
+    parser.add_argument("-p", "--points", choices=SELECTION_METHODS, nargs="+", default=SELECTION_METHODS, help="Point selection methods to compare")
+    parser.add_argument("-b", "--budget", type=int, nargs="+", default=[None], help="Point budgets to test (default: (factor-1)^2)")
+    parser.add_argument("-f", "--factor", type=int, default=4, help="Factor (grid size) for stabilization")
+    parser.add_argument("--lk_window", choices=WINDOW_POLICIES, default='auto', help="LK window policy")
+    parser.add_argument("-ml", "--max_level", type=int, default=10, help="Max level for stabilization")
+    args = parser.parse_args()
+
+    print(f"{'type':<12}{'points':>9}{'budget':>8}{'tracked':>9}{'selects':>9}{'track (s)':>11}{'fps':>9}{'jitter (px)':>13}{'path error (px)':>17}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for stabilization_type in args.stabilization_type:
+            video_path, roi = CASES[stabilization_type]
+            truth = None
+            if stabilization_type == 'synthetic':
+                video_path, truth = synthetic_pan(tmp)
+            for budget in args.budget:
+                for method in args.points:
+                    pipeline = build_pipeline('global' if truth is not None else stabilization_type, VideoDecoder(video_path), VideoEncoder(None),
+                                              [args.max_level, 0.01, 30], roi, args.factor, window=args.lk_window, points=method, budget=budget)
+                    start = time.perf_counter()
+                    trajectory = pipeline.analyze()
+                    elapsed = time.perf_counter() - start
+                    track_time = sum(pipeline.stats.times.get(stage, 0) for stage in ("select", "calibrate", "track"))
+                    tracked = np.mean([status.sum() for status in trajectory.status])
+
+                    measure_roi = roi
+                    if measure_roi is None:
+                        height, width = pipeline.decoder.height, pipeline.decoder.width
+                        measure_roi = (width // 4, height // 4, width // 2, height // 2)
+                    jitter = residual_jitter(video_path, trajectory.corrections('none'), measure_roi)
+                    error = f"{'-':>17}"
+                    if truth is not None:
+                        camera_path = trajectory.camera_path()[:, :2, 2]
+                        error = f"{np.mean(np.linalg.norm(camera_path - truth[:len(camera_path)], axis=1)):>17.2f}"
+                    print(f"{stabilization_type:<12}{method:>9}{pipeline.point_selector.budget:>8}{tracked:>9.1f}{pipeline.stats.counts.get('select', 0):>9}"
+                          f"{track_time:>11.2f}{len(trajectory) / elapsed:>9.1f}{jitter:>13.2f}{error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stabilizing import local_stabilizer_video, global_stabilizer_video, perspective_stabilizer_video
+
+EXAMPLE_VIDEO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example", "vespa.mp4")
+
+def run_once(stabilization_type, video_path, output_path, preview):
+    lkparams = [10, 0.01, 30]
+    roi = [140, 176, 34, 49]
+    if stabilization_type == 'local':
+        local_stabilizer_video(video_path, output_path, lkparams, roi, 4, preview, lambda current, total: None)
+    elif stabilization_type == 'global':
+        global_stabilizer_video(video_path, output_path, lkparams, 50, 42, 4, preview, lambda current, total: None)
+    else:
+        perspective_stabilizer_video(video_path, output_path, lkparams, roi, 4, preview, lambda current, total: None)
+
+def measure(stabilization_type, video_path, preview):
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        run_once(stabilization_type, video_path, os.path.join(tmp, "out.avi"), preview)
+        elapsed = time.perf_counter() - start
+    return frame_count / elapsed if elapsed > 0 else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Frames/sec of the stabilizers with and without the preview window")
+    parser.add_argument("-i", "--input", dest="video_path", default=EXAMPLE_VIDEO, help="Path to the input video file")
+    parser.add_argument("-t", "--stabilization_type", choices=['local', 'global', 'perspective'], default='local', help="Type of stabilization")
+    args = parser.parse_args()
+
+    headless_fps = measure(args.stabilization_type, args.video_path, False)
+    print(f"{args.stabilization_type} headless: {headless_fps:.1f} fps")
+
+    try:
+        preview_fps = measure(args.stabilization_type, args.video_path, True)
+    except cv2.error:
+        print(f"{args.stabilization_type} preview: unavailable (no display or GUI support in this OpenCV build)")
+        return
+    print(f"{args.stabilization_type} preview: {preview_fps:.1f} fps")
+    print(f"speedup: {headless_fps / preview_fps:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from streaming import StageStats
+from profiling import Profiler
+from common import CASES, scaled_copy
+
+# Frames/sec of the stabilization loop with the default stage totals (StageStats), with the
+# per-frame times of the Profiler and with its trace too. Best of --repeat runs.
+
+PROFILES = {
+    'totals': StageStats,
+    'per-frame': Profiler,
+    'trace': lambda: Profiler(trace=True)
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of the profiler on the stabilization loop")
+    parser.add_argument("-t", "--stabilization_type", choices=['local', 'global', 'perspective'], nargs="+", default=['local', 'global', 'perspective'], help="Types of stabilization to test")
+    parser.add_argument("--scale", type=float, default=1, help="Scale factor of the example videos")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the fastest one is kept")
+    args = parser.parse_args()
+
+    print(f"{'type':<12}{'profile':>10}{'fps':>8}{'overhead':>10}{'calls':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for stabilization_type in args.stabilization_type:
+            video_path, roi = CASES[stabilization_type]
+            path = video_path if args.scale == 1 else scaled_copy(video_path, args.scale, tmp)
+            scaled_roi = tuple(int(v * args.scale) for v in roi) if roi is not None else None
+            baseline = None
+            for name, make_stats in PROFILES.items():
+                best = 0
+                for _ in range(args.repeat):
+                    stats = make_stats()
+                    pipeline = build_pipeline(stabilization_type, VideoDecoder(path), VideoEncoder(os.path.join(tmp, "out.avi"), 'MJPG'), [10, 0.01, 30],
+                                              scaled_roi, stats=stats)
+                    start = time.perf_counter()
+                    pipeline.run()
+                    elapsed = time.perf_counter() - start
+                    best = max(best, pipeline.decoder.frame_count / elapsed)
+                baseline = baseline or best
+                calls = sum(stats.counts.values())
+                print(f"{stabilization_type:<12}{name:>10}{best:>8.1f}{(baseline / best - 1) * 100:>9.1f}%{calls:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_cache import SeekableVideo, DEFAULT_CACHE_BYTES, keyframe_index
+from common import CASES
+
+# Response time of the player to scrubbing, stepping and jumps: setting CAP_PROP_POS_FRAMES
+# and reading for every request, as the player used to, against SeekableVideo (keyframe
+# index, frame cache and prefetch). example/vespa.mp4 is H.264 with a keyframe every 30 to
+# 60 frames; pass a long clip with --video to see the difference grow with the GOP.
+
+def scrub_pattern(frame_count, requests, seed=0):
+    # A slider dragged back and forth: steps of a few frames, changing direction now and then.
+    rng = np.random.default_rng(seed)
+    position, direction, pattern = frame_count // 2, 1, []
+    for _ in range(requests):
+        if rng.random() < 0.05:
+            direction = -direction
+        position = int(np.clip(position + direction * rng.integers(1, 6), 0, frame_count - 1))
+        pattern.append(position)
+    return pattern
+
+def patterns(frame_count, requests):
+    rng = np.random.default_rng(1)
+    return {
+        'scrub': scrub_pattern(frame_count, requests),
+        'step back': list(range(frame_count - 1, max(frame_count - 1 - requests, -1), -1)),
+        'step forward': list(range(0, min(requests, frame_count))),
+        'jump': [int(v) for v in rng.integers(0, frame_count, requests)]
+    }
+
+class SeekEveryTime:
+    def __init__(self, video_path):
+        self.cap = cv2.VideoCapture(video_path)
+
+    def read(self, index):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        self.cap.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Response time of the player to scrubbing, stepping and jumps, with and without the frame cache")
+    parser.add_argument("--video", default=CASES['local'][0], help="Video to seek in")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per pattern")
+    parser.add_argument("--interval", type=float, default=15, help="Milliseconds between requests (time left to the prefetch)")
+    parser.add_argument("--cache_mb", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024), help="Size of the frame cache")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    keyframes = keyframe_index(args.video)
+    index_time = time.perf_counter() - start
+    if keyframes is not None:
+        print(f"{len(keyframes)} keyframes, indexed in {index_time * 1000:.1f} ms")
+
+    frame_count = int(cv2.VideoCapture(args.video).get(cv2.CAP_PROP_FRAME_COUNT))
+    print(f"{'pattern':<14}{'reader':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'max (ms)':>10}")
+    for name, pattern in patterns(frame_count, args.requests).items():
+        for label, make_reader in (('seek', lambda: SeekEveryTime(args.video)), ('cached', lambda: SeekableVideo(args.video, args.cache_mb * 1024 * 1024))):
+            reader = make_reader()
+            if isinstance(reader, SeekableVideo):
+                reader.open()
+            times = []
+            for index in pattern:
+                start = time.perf_counter()
+                reader.read(index)
+                times.append((time.perf_counter() - start) * 1000)
+                time.sleep(args.interval / 1000)
+            reader.release()
+            print(f"{name:<14}{label:>10}{np.percentile(times, 50):>10.2f}{np.percentile(times, 95):>10.2f}{max(times):>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import exponential_moving_average
+from smoothing import EMASmoother, SlidingWindowSmoother, OneEuroSmoother
+
+def synthetic_homographies(frame_count, seed=0):
+    rng = np.random.default_rng(seed)
+    H = np.repeat(np.eye(3)[np.newaxis], frame_count, axis=0)
+    H[:, 0, 2] = rng.normal(0, 2, frame_count)
+    H[:, 1, 2] = rng.normal(0, 2, frame_count)
+    H[:, 0, 1] = rng.normal(0, 0.01, frame_count)
+    H[:, 1, 0] = rng.normal(0, 0.01, frame_count)
+    H[:, 2, 0] = rng.normal(0, 1e-5, frame_count)
+    H[:, 2, 1] = rng.normal(0, 1e-5, frame_count)
+    return H
+
+def per_frame_times(smoother, H, block_size):
+    times = []
+    for start in range(0, len(H), block_size):
+        block = H[start:start + block_size]
+        begin = time.perf_counter()
+        for h in block:
+            smoother.update(h)
+        times.append((time.perf_counter() - begin) / len(block) * 1e6)
+    return times
+
+def legacy_per_frame_times(H, block_size, frame_limit):
+    times = []
+    history = []
+    for start in range(0, min(len(H), frame_limit), block_size):
+        block = H[start:start + block_size]
+        begin = time.perf_counter()
+        for h in block:
+            history.append(h)
+            exponential_moving_average(history, alpha=0.2)
+        times.append((time.perf_counter() - begin) / len(block) * 1e6)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame cost of the trajectory smoothers on a synthetic trajectory")
+    parser.add_argument("-n", "--frames", type=int, default=100000, help="Length of the synthetic trajectory")
+    parser.add_argument("-b", "--block_size", type=int, default=10000, help="Frames per timing block")
+    parser.add_argument("--legacy_frames", type=int, default=4000, help="Frames to run through the old full-history EMA (0 to skip)")
+    args = parser.parse_args()
+
+    H = synthetic_homographies(args.frames)
+    smoothers = {
+        'ema': EMASmoother(0.2, initial=np.eye(3), normalize=True),
+        'window': SlidingWindowSmoother(30, normalize=True),
+        'one-euro': OneEuroSmoother(min_cutoff=1.0, beta=0.01, normalize=True)
+    }
+
+    print("us/frame per block of", args.block_size, "frames")
+    for name, smoother in smoothers.items():
+        times = per_frame_times(smoother, H, args.block_size)
+        print(f"{name:>10}: " + " ".join(f"{t:6.1f}" for t in times))
+
+    if args.legacy_frames > 0:
+        block_size = max(args.legacy_frames // 10, 1)
+        times = legacy_per_frame_times(H, block_size, args.legacy_frames)
+        print(f"old full-history EMA, us/frame per block of {block_size} frames (first {args.legacy_frames} frames only):")
+        print(f"{'legacy':>10}: " + " ".join(f"{t:6.1f}" for t in times))
+
+if __name__ == "__main__":
+    main()
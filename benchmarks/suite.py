@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from streaming import StageStats
+from synthetic import KINDS, parse_resolution, generate, load_truth
+
+# Benchmark suite on the synthetic videos of synthetic.py, for regression checks.
+#
+# "run" stabilizes every video with every stabilization type in the two-pass mode (the one
+# that exposes the corrections) and writes one JSON record per case: overall fps, fps of
+# every pipeline stage, peak RSS of the process (every case runs in a fresh one), and
+# against the ground truth:
+#   tracking_error  RMS distance in pixels between the ROI corners and center moved by the
+#                   estimated camera path and by the true one, on the frames with an
+#                   estimate;
+#   input_jitter    RMS high-frequency motion of these points in the input (their distance
+#                   to their moving average over JITTER_WINDOW frames);
+#   residual_jitter the same in the stabilized output.
+# "compare" checks a run against a baseline and exits with status 1 when a case lost more
+# than --fps_tolerance of its fps, or its errors or peak RSS grew beyond the tolerances.
+
+STABILIZATION_TYPES = ['local', 'global', 'perspective']
+JITTER_WINDOW = 9
+# Accuracy changes below this (in pixels) are noise, whatever the tolerance.
+MIN_ACCURACY_CHANGE = 0.05
+
+def case_roi(width, height):
+    # The central half of the frame.
+    return (width // 4, height // 4, width // 2, height // 2)
+
+def apply(transforms, points):
+    # Points (k, 2) moved by every transform (n, 3, 3): (n, k, 2).
+    moved = np.matmul(transforms, np.hstack([points, np.ones((len(points), 1))]).T)
+    return np.transpose(moved[:, :2] / moved[:, 2:], (0, 2, 1))
+
+def high_frequency(tracks):
+    # Distance of every point to its centered moving average.
+    half = JITTER_WINDOW // 2
+    padded = np.pad(tracks, ((half, half), (0, 0), (0, 0)), mode='edge')
+    kernel = np.ones(JITTER_WINDOW) / JITTER_WINDOW
+    smooth = np.apply_along_axis(lambda values: np.convolve(values, kernel, mode='valid'), 0, padded)
+    return float(np.sqrt(np.mean(np.sum((tracks - smooth) ** 2, axis=2))))
+
+def peak_rss_mb():
+    # VmHWM starts over in the new process, ru_maxrss would include the RSS of the parent
+    # it was forked from.
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_case(video_path, stabilization_type, smoothing, smoothing_window):
+    camera, _ = load_truth(video_path)
+    decoder = VideoDecoder(video_path)
+    decoder.open()
+    width, height, frame_count = decoder.width, decoder.height, decoder.frame_count
+    decoder.release()
+    roi = case_roi(width, height)
+    offset = (width // 20, height // 20) if stabilization_type == 'global' else (0, 0)
+
+    stats = StageStats()
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = build_pipeline(stabilization_type, VideoDecoder(video_path), VideoEncoder(os.path.join(tmp, "out.avi"), 'MJPG'), [10, 0.01, 30],
+                                  roi if stabilization_type != 'global' else None, 4, offset, stats=stats)
+        start = time.perf_counter()
+        trajectory = pipeline.run_two_pass(smoothing, smoothing_window)
+        elapsed = time.perf_counter() - start
+
+    # The true motion of the content between the first frame and every frame.
+    truth = np.matmul(camera, np.linalg.inv(camera[0]))
+    x, y, w, h = roi
+    points = np.float64([[x, y], [x + w, y], [x + w, y + h], [x, y + h], [x + w / 2, y + h / 2]])
+    n = min(len(trajectory), len(truth))
+    estimated = apply(trajectory.camera_path()[:n], points)
+    expected = apply(truth[:n], points)
+    stabilized = apply(np.matmul(trajectory.corrections(smoothing, smoothing_window, offset)[:n], truth[:n]), points)
+
+    return {
+        'frames': frame_count,
+        'fps': 2 * frame_count / elapsed,
+        'stages': {stage: stats.fps(stage) for stage in stats.times},
+        'peak_rss_mb': peak_rss_mb(),
+        'tracking_error': float(np.sqrt(np.mean(np.sum((estimated - expected)[trajectory.valid[:n]] ** 2, axis=2)))),
+        'input_jitter': high_frequency(expected),
+        'residual_jitter': high_frequency(stabilized)
+    }
+
+def environment():
+    info = {'python': platform.python_version(), 'opencv': cv2.__version__, 'numpy': np.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count()}
+    try:
+        import cpuinfo
+        info['cpu'] = cpuinfo.get_cpu_info()['brand_raw']
+    except Exception:
+        info['cpu'] = platform.processor()
+    return info
+
+def run(args):
+    results = {'environment': environment(), 'smoothing': args.smoothing, 'smoothing_window': args.smoothing_window, 'cases': {}}
+    # Every case in a fresh process, for its own peak RSS.
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.kinds:
+            for width, height in args.resolutions:
+                for frame_count in args.frames:
+                    video_path = generate(args.video_dir or tmp, kind, width, height, frame_count, args.jitter)
+                    for stabilization_type in args.stabilization_type:
+                        name = f"{kind}_{width}x{height}_{frame_count}_{stabilization_type}"
+                        best = None
+                        for _ in range(args.repeat):
+                            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                                result = pool.submit(run_case, video_path, stabilization_type, args.smoothing, args.smoothing_window).result()
+                            if best is None or result['fps'] > best['fps']:
+                                best = result
+                        results['cases'][name] = best
+                        print(f"{name:<36}{best['fps']:>8.1f} fps{best['peak_rss_mb']:>8.0f} MB  error {best['tracking_error']:.2f} px"
+                              f"  jitter {best['input_jitter']:.2f} -> {best['residual_jitter']:.2f} px")
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print("Results saved in:", args.output)
+
+def compare(args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)['cases']
+    with open(args.current) as file:
+        current = json.load(file)['cases']
+
+    regressions = []
+    print(f"{'case':<36}{'fps':>16}{'tracking error':>18}{'residual jitter':>18}{'peak RSS (MB)':>16}")
+    for name, old in baseline.items():
+        new = current.get(name)
+        if new is None:
+            print(f"{name:<36}  missing from the current run")
+            continue
+        problems = []
+        if new['fps'] < old['fps'] * (1 - args.fps_tolerance):
+            problems.append('fps')
+        for metric in ('tracking_error', 'residual_jitter'):
+            if new[metric] > old[metric] * (1 + args.accuracy_tolerance) + MIN_ACCURACY_CHANGE:
+                problems.append(metric)
+        if new['peak_rss_mb'] > old['peak_rss_mb'] * (1 + args.memory_tolerance):
+            problems.append('peak_rss_mb')
+        print(f"{name:<36}{old['fps']:>7.1f} ->{new['fps']:>7.1f}{old['tracking_error']:>8.2f} ->{new['tracking_error']:>7.2f}"
+              f"{old['residual_jitter']:>8.2f} ->{new['residual_jitter']:>7.2f}{old['peak_rss_mb']:>7.0f} ->{new['peak_rss_mb']:>6.0f}"
+              + (f"  REGRESSION: {', '.join(problems)}" if problems else ""))
+        regressions += [(name, problem) for problem in problems]
+
+    if regressions:
+        print(f"{len(regressions)} regressions")
+        return 1
+    print("No regressions")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite on synthetic shaky videos, with a regression check")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the suite and save the results as JSON")
+    run_parser.add_argument("-o", "--output", default="benchmark_results.json", help="Results file")
+    run_parser.add_argument("-t", "--stabilization_type", choices=STABILIZATION_TYPES, nargs="+", default=STABILIZATION_TYPES, help="Types of stabilization to test")
+    run_parser.add_argument("--kinds", choices=KINDS, nargs="+", default=KINDS, help="Kinds of jitter")
+    run_parser.add_argument("--resolutions", type=parse_resolution, nargs="+", default=[(320, 240), (1280, 720)], help="Frame sizes, e.g. 640x480")
+    run_parser.add_argument("--frames", type=int, nargs="+", default=[60, 240], help="Video lengths (frames)")
+    run_parser.add_argument("--jitter", type=float, default=0.01, help="Standard deviation of the jitter shifts, as a fraction of the width")
+    run_parser.add_argument("-s", "--smoothing", default='moving_average', help="Trajectory smoothing of the two-pass mode")
+    run_parser.add_argument("-sw", "--smoothing_window", type=int, default=30, help="Smoothing window (frames)")
+    run_parser.add_argument("--repeat", type=int, default=1, help="Runs per case, the fastest one is kept")
+    run_parser.add_argument("--video_dir", help="Keep the generated videos in this folder")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare results with a baseline, exit status 1 on regressions")
+    compare_parser.add_argument("baseline", help="Baseline results")
+    compare_parser.add_argument("current", help="Current results")
+    compare_parser.add_argument("--fps_tolerance", type=float, default=0.1, help="Allowed relative loss of fps")
+    compare_parser.add_argument("--accuracy_tolerance", type=float, default=0.1, help="Allowed relative growth of the tracking error and residual jitter")
+    compare_parser.add_argument("--memory_tolerance", type=float, default=0.2, help="Allowed relative growth of the peak RSS")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import argparse
+
+import cv2
+import numpy as np
+
+# Synthetic shaky videos with a known camera motion. A procedural textured scene is filmed
+# by a camera that pans slowly across it (the intended motion) with random hand-held
+# jitter on top: shifts only ("translation"), or also rotation, zoom and perspective
+# ("homography"). The ground truth is saved next to the video as NPZ: "camera" maps scene
+# coordinates to the coordinates of every frame, "intended" is the same without jitter.
+# Everything is generated from the seed, so the videos are the same on every machine.
+
+KINDS = ['translation', 'homography']
+
+def parse_resolution(text):
+    width, height = (int(value) for value in text.lower().split('x'))
+    return width, height
+
+def make_scene(width, height, seed=0):
+    # Blurred noise for texture and random shapes for corners, 8-bit BGR.
+    rng = np.random.default_rng(seed)
+    scene = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3)).astype(np.uint8), (0, 0), 2)
+    scale = max(width, height) / 100
+    for _ in range(int(width * height / 2000)):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(1, 6) * scale)
+        if rng.random() < 0.5:
+            cv2.rectangle(scene, (x, y), (x + size, y + size), color, -1)
+        else:
+            cv2.circle(scene, (x, y), size, color, -1)
+    return scene
+
+def camera_motion(kind, width, height, frame_count, jitter=0.01, pan=0.1, seed=0):
+    # (camera, intended): scene-to-frame homographies with and without jitter. The scene is
+    # 1.5 times the frame, the camera starts at its center and pans by `pan` of the frame
+    # width; jitter is the standard deviation of the shifts as a fraction of the width.
+    rng = np.random.default_rng(seed + 1)
+    t = np.linspace(0, 1, frame_count)
+    center = np.array([width * 0.75, height * 0.75])
+    pan_x, pan_y = pan * width * t, pan * height * 0.5 * np.sin(np.pi * t)
+
+    camera = np.empty((frame_count, 3, 3))
+    intended = np.empty((frame_count, 3, 3))
+    for i in range(frame_count):
+        # Scene point center + pan goes to the frame center.
+        look = np.array([[1, 0, width / 2 - center[0] - pan_x[i]], [0, 1, height / 2 - center[1] - pan_y[i]], [0, 0, 1]])
+        intended[i] = look
+        dx, dy = rng.normal(0, jitter * width, 2)
+        shake = np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]])
+        if kind == 'homography':
+            angle = np.radians(rng.normal(0, 0.5))
+            zoom = 1 + rng.normal(0, 0.01)
+            px, py = rng.normal(0, 2e-5, 2) * 640 / width
+            about = np.array([[1, 0, width / 2], [0, 1, height / 2], [0, 0, 1]])
+            rotation = np.array([[zoom * np.cos(angle), -zoom * np.sin(angle), 0], [zoom * np.sin(angle), zoom * np.cos(angle), 0], [px, py, 1]])
+            shake = shake.dot(about).dot(rotation).dot(np.linalg.inv(about))
+        elif kind != 'translation':
+            raise ValueError(f"Unknown kind of motion: {kind}")
+        camera[i] = shake.dot(look)
+    return camera, intended
+
+def generate(output_dir, kind='translation', width=640, height=480, frame_count=120, jitter=0.01, fps=30, seed=0):
+    # Writes <kind>_<width>x<height>_<frames>.avi (MJPG at its best quality) and its .npz
+    # ground truth; returns the video path.
+    name = f"{kind}_{width}x{height}_{frame_count}"
+    video_path = os.path.join(output_dir, name + ".avi")
+    truth_path = os.path.join(output_dir, name + ".npz")
+    os.makedirs(output_dir, exist_ok=True)
+    scene = make_scene(int(width * 1.5), int(height * 1.5), seed)
+    camera, intended = camera_motion(kind, width, height, frame_count, jitter, seed=seed)
+    out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    out.set(cv2.VIDEOWRITER_PROP_QUALITY, 100)
+    for H in camera:
+        out.write(cv2.warpPerspective(scene, H, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT))
+    out.release()
+    np.savez(truth_path, camera=camera, intended=intended)
+    return video_path
+
+def load_truth(video_path):
+    with np.load(os.path.splitext(video_path)[0] + ".npz") as data:
+        return data['camera'], data['intended']
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic shaky videos with their ground-truth camera motion")
+    parser.add_argument("output_dir", help="Folder of the videos")
+    parser.add_argument("--kinds", choices=KINDS, nargs="+", default=KINDS, help="Kinds of jitter")
+    parser.add_argument("--resolutions", type=parse_resolution, nargs="+", default=[(320, 240), (1280, 720)], help="Frame sizes, e.g. 640x480")
+    parser.add_argument("--frames", type=int, nargs="+", default=[120], help="Video lengths (frames)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Standard deviation of the jitter shifts, as a fraction of the width")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    for kind in args.kinds:
+        for width, height in args.resolutions:
+            for frame_count in args.frames:
+                print(generate(args.output_dir, kind, width, height, frame_count, args.jitter, seed=args.seed))
+
+if __name__ == "__main__":
+    main()
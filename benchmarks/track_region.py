@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from lk_window import WINDOW_POLICIES
+from common import CASES, scaled_copy, residual_jitter
+
+# OpenCV builds the image pyramids of both frames on every calcOpticalFlowPyrLK call. The
+# tracker only passes it the region around the points; this compares the per-frame cost of
+# the "track" stage with and without that crop.
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame tracking cost with and without cropping the frames to the tracked region")
+    parser.add_argument("-t", "--stabilization_type", choices=['local', 'perspective'], nargs="+", default=['local', 'perspective'], help="Types of stabilization to test")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1, 3, 6], help="Scale factors of the example videos")
+    parser.add_argument("--lk_window", choices=WINDOW_POLICIES, default='auto', help="LK window policy")
+    parser.add_argument("-ml", "--max_level", type=int, default=10, help="Max level for stabilization")
+    args = parser.parse_args()
+
+    print(f"{'type':<12}{'scale':>6}{'frame':>11}{'crop':>6}{'track (ms/frame)':>18}{'total (s)':>11}{'jitter (px)':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for stabilization_type in args.stabilization_type:
+            video_path, roi = CASES[stabilization_type]
+            for scale in args.scale:
+                path = video_path if scale == 1 else scaled_copy(video_path, scale, tmp)
+                scaled_roi = tuple(int(v * scale) for v in roi)
+                for crop in (False, True):
+                    pipeline = build_pipeline(stabilization_type, VideoDecoder(path), VideoEncoder(None), [args.max_level, 0.01, 30], scaled_roi, window=args.lk_window)
+                    pipeline.tracker.crop = crop
+                    start = time.perf_counter()
+                    trajectory = pipeline.analyze()
+                    elapsed = time.perf_counter() - start
+                    track_time = pipeline.stats.times.get("track", 0) / max(pipeline.stats.counts.get("track", 1), 1)
+                    jitter = residual_jitter(path, trajectory.corrections('none'), scaled_roi)
+                    frame = f"{pipeline.decoder.width}x{pipeline.decoder.height}"
+                    print(f"{stabilization_type:<12}{scale:>6g}{frame:>11}{'yes' if crop else 'no':>6}{track_time * 1000:>18.2f}{elapsed:>11.2f}{jitter:>13.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from trajectory import SMOOTHING_METHODS
+from warping import INTERPOLATIONS, BORDERS, AffineWarper, TranslationWarper
+from common import CASES, scaled_copy
+
+# Warp time per frame of the translation warper for every interpolation, on the corrections
+# of the local and global examples, against plain warpAffine. "copied" is the share of
+# frames shifted by an integer, "difference" the mean absolute difference from warpAffine
+# with bilinear interpolation, in gray levels.
+
+def main():
+    parser = argparse.ArgumentParser(description="Warp time of the translation warper per interpolation")
+    parser.add_argument("-t", "--stabilization_type", choices=['local', 'global'], nargs="+", default=['local', 'global'], help="Types of stabilization to test")
+    parser.add_argument("-s", "--smoothing", choices=SMOOTHING_METHODS, default='moving_average', help="Trajectory smoothing of the corrections")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1, 4.5], help="Scale factors of the example videos (4.5 is 1440x1080)")
+    parser.add_argument("--border", choices=BORDERS, default='constant', help="Border of the warps")
+    args = parser.parse_args()
+
+    print(f"{'type':<8}{'frame':>11}{'interpolation':>15}{'copied':>8}{'warp (ms/frame)':>17}{'difference':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for stabilization_type in args.stabilization_type:
+            video_path, roi = CASES[stabilization_type]
+            trajectory = build_pipeline(stabilization_type, VideoDecoder(video_path), VideoEncoder(None), [10, 0.01, 30], roi).analyze()
+            for scale in args.scale:
+                path = video_path if scale == 1 else scaled_copy(video_path, scale, tmp)
+                offset = (0, 0) if stabilization_type == 'local' else (25 * scale, 20 * scale)
+                transforms = trajectory.corrections(args.smoothing, 30, offset)
+                transforms[:, :2, 2] *= scale
+
+                reference = AffineWarper()
+                warpers = {interpolation: TranslationWarper(interpolation, args.border) for interpolation in INTERPOLATIONS}
+                times = {name: 0.0 for name in ['warpAffine'] + INTERPOLATIONS}
+                differences = {name: 0.0 for name in INTERPOLATIONS}
+                decoder = VideoDecoder(path)
+                decoder.open()
+                frame_count = 0
+                for transform in transforms:
+                    frame = decoder.read()
+                    if frame is None:
+                        break
+                    frame_count += 1
+                    dst = np.empty_like(frame)
+                    start = time.perf_counter()
+                    expected = reference.warp(frame, transform)
+                    times['warpAffine'] += time.perf_counter() - start
+                    for name, warper in warpers.items():
+                        start = time.perf_counter()
+                        warped = warper.warp(frame, transform, dst)
+                        times[name] += time.perf_counter() - start
+                        differences[name] += cv2.absdiff(warped, expected).mean()
+                decoder.release()
+
+                frame = f"{decoder.width}x{decoder.height}"
+                print(f"{stabilization_type:<8}{frame:>11}{'warpAffine':>15}{'-':>8}{times['warpAffine'] / frame_count * 1000:>17.2f}{'-':>12}")
+                for name, warper in warpers.items():
+                    copied = warper.copied / max(warper.copied + warper.interpolated, 1)
+                    print(f"{stabilization_type:<8}{frame:>11}{name:>15}{copied:>8.0%}{times[name] / frame_count * 1000:>17.2f}{differences[name] / frame_count:>12.3f}")
+
+if __name__ == "__main__":
+    main()
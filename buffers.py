@@ -0,0 +1,55 @@
+import threading
+
+import numpy as np
+
+# Reusable frame buffers for the per-frame loop, so that decoding, grayscale conversion and
+# warping write into arrays allocated once instead of a new array for every frame.
+#
+# BufferPool hands out arrays that go back to the pool once their content is no longer
+# needed: it suits frames held for an unknown time (decoded frames waiting for a good
+# estimate, the previous grayscale frame). FrameRing cycles over a fixed set of arrays: it
+# suits outputs consumed in order, like the warped frames queued for the encoder.
+
+class BufferPool:
+    def __init__(self):
+        # The threaded decoder acquires from its own thread.
+        self.lock = threading.Lock()
+        self.free = {}
+        self.allocated = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                return buffers.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype)
+
+    def release(self, buffer):
+        # Only for arrays nobody reads anymore: the next acquire() may overwrite them.
+        if buffer is None:
+            return
+        with self.lock:
+            self.free.setdefault((buffer.shape, buffer.dtype.str), []).append(buffer)
+
+class FrameRing:
+    def __init__(self, size):
+        self.size = max(size, 1)
+        self.buffers = []
+        self.index = 0
+        self.allocated = 0
+
+    def next(self, shape, dtype=np.uint8):
+        # The returned array is overwritten size calls later.
+        shape = tuple(shape)
+        if self.buffers and (self.buffers[0].shape != shape or self.buffers[0].dtype != dtype):
+            self.buffers = []
+            self.index = 0
+        if len(self.buffers) < self.size:
+            self.buffers.append(np.empty(shape, dtype))
+            self.allocated += 1
+            return self.buffers[-1]
+        buffer = self.buffers[self.index]
+        self.index = (self.index + 1) % self.size
+        return buffer
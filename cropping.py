@@ -0,0 +1,105 @@
+import itertools
+
+import cv2
+import numpy as np
+
+from trajectory import translation_matrix
+
+# Crop of the stabilized output. The corrections move every frame around the canvas and
+# the border fills what they leave uncovered; the crop window is the largest rectangle
+# covered by every corrected frame of the trajectory, so it needs the corrections of the
+# whole video (two-pass and parallel modes). The crop, and the scaling to another output
+# size, are folded into the corrections: every frame is warped once, straight into the
+# output canvas, instead of being cropped by another decode and encode pass.
+
+def parse_size(text):
+    # "1280x720" -> (1280, 720), None if invalid.
+    try:
+        width, height = (int(value) for value in str(text).lower().split('x'))
+    except ValueError:
+        return None
+    return (width, height) if width > 0 and height > 0 else None
+
+def covered_region(transforms, size):
+    # Convex polygon of the canvas covered by every transformed frame, None if empty. The
+    # outlines join the centers of the edge pixels, where the warps stop interpolating the
+    # frame with the border.
+    width, height = size
+    outline = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+    corners = np.matmul(transforms, np.hstack([outline, np.ones((4, 1), np.float32)]).T)
+    if (corners[:, 2] <= 0).any():
+        # A homography that sends a corner of the frame to infinity.
+        return None
+    corners = np.transpose(corners[:, :2] / corners[:, 2:], (0, 2, 1)).astype(np.float32)
+    region = outline
+    for quad in corners:
+        area, region = cv2.intersectConvexConvex(region, quad)
+        if region is None or area <= 0:
+            return None
+        region = region.reshape(-1, 2)
+    return region
+
+def largest_rectangle(region, aspect):
+    # Largest rectangle of the given width/height ratio in the convex region. Every edge of
+    # the region bounds the center (cx, cy) and the height h of the rectangle linearly, by
+    # the rectangle corner furthest out: the best rectangle is where three of these bounds
+    # meet.
+    edges = np.roll(region, -1, axis=0) - region
+    normals = np.stack([edges[:, 1], -edges[:, 0]], axis=1)
+    if (region[:, 0] * edges[:, 1] - region[:, 1] * edges[:, 0]).sum() < 0:
+        # Outward normals for either orientation of the outline.
+        normals = -normals
+    limits = (normals * region).sum(axis=1)
+    bounds = np.column_stack([normals, (np.abs(normals[:, 0]) * aspect + np.abs(normals[:, 1])) / 2])
+
+    best = None
+    for rows in itertools.combinations(range(len(bounds)), 3):
+        rows = list(rows)
+        if abs(np.linalg.det(bounds[rows])) < 1e-9:
+            continue
+        cx, cy, h = np.linalg.solve(bounds[rows], limits[rows])
+        if h > 0 and (bounds.dot((cx, cy, h)) <= limits + 1e-6 * np.abs(limits).max()).all() and (best is None or h > best[2]):
+            best = (cx, cy, h)
+    if best is None:
+        return None
+    cx, cy, h = best
+    return cx - h * aspect / 2, cy - h / 2, h * aspect, h
+
+def crop_window(transforms, size, aspect=None):
+    # (x, y, width, height) in whole pixels, with even sizes for the codecs that subsample
+    # the chroma. Without an aspect ratio a rectangular region (translations only) is taken
+    # whole, any other keeps the ratio of the frame.
+    region = covered_region(np.asarray(transforms, dtype=np.float64), size)
+    if region is None:
+        return None
+    bounds = region.min(axis=0), region.max(axis=0)
+    rectangular = abs(cv2.contourArea(region) - np.prod(bounds[1] - bounds[0])) < 1.0
+    if aspect is not None or not rectangular:
+        rectangle = largest_rectangle(region.astype(np.float64), aspect if aspect is not None else (size[0] - 1) / (size[1] - 1))
+        if rectangle is None:
+            return None
+        bounds = np.array(rectangle[:2]), np.array(rectangle[:2]) + rectangle[2:]
+    x, y = np.ceil(bounds[0] - 1e-6).astype(int)
+    width, height = np.floor(bounds[1] + 1e-6).astype(int) - (x, y) + 1
+    width, height = width - width % 2, height - height % 2
+    if width <= 0 or height <= 0:
+        return None
+    return int(x), int(y), int(width), int(height)
+
+def fit_output(transforms, size, crop=False, output_size=None):
+    # Corrections and size of the output frames: cropped to the crop window and/or scaled
+    # to output_size.
+    window = (0, 0) + tuple(size)
+    if crop:
+        window = crop_window(transforms, size, output_size[0] / output_size[1] if output_size is not None else None)
+        if window is None:
+            print("No area is covered by every frame: the output is not cropped")
+            window = (0, 0) + tuple(size)
+    x, y, width, height = window
+    fit = translation_matrix(-x, -y)
+    if output_size is not None and tuple(output_size) != (width, height):
+        # Scaled about the pixel centers, like cv2.resize.
+        scale = np.diag([output_size[0] / width, output_size[1] / height, 1.0])
+        fit = translation_matrix(-0.5, -0.5).dot(scale).dot(translation_matrix(0.5, 0.5)).dot(fit)
+        width, height = output_size
+    return np.matmul(fit, transforms), (int(width), int(height))
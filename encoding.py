@@ -0,0 +1,110 @@
+import shutil
+import subprocess
+from fractions import Fraction
+
+import cv2
+import numpy as np
+
+from results import EncoderError
+
+# Encoders of the stabilized video. The OpenCV codecs are written by cv2.VideoWriter in
+# the container given by the extension of the output path: MJPG is the fastest, for
+# intermediate files, XVID the original default. "libx264" pipes the raw frames into an
+# ffmpeg process, which must be installed, with an x264 speed preset and a constant quality
+# (CRF) or a bitrate. Both keep fractional frame rates such as 29.97 (30000/1001), which
+# used to be truncated to 29 fps and drifted from the audio of the source.
+
+OPENCV_CODECS = ['XVID', 'MJPG', 'mp4v']
+FFMPEG_CODECS = ['libx264']
+CODECS = OPENCV_CODECS + FFMPEG_CODECS
+CODEC_EXTENSIONS = {'XVID': '.avi', 'MJPG': '.avi', 'mp4v': '.mp4', 'libx264': '.mp4'}
+X264_PRESETS = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow']
+DEFAULT_PRESET = 'veryfast'
+DEFAULT_CRF = 23
+
+def frame_rate(fps):
+    # Containers often store NTSC rates rounded (29.97 for 30000/1001): they are snapped
+    # back to the exact fraction.
+    for base in (24, 30, 48, 60, 120):
+        ntsc = Fraction(base * 1000, 1001)
+        if abs(fps - ntsc) < 0.001:
+            return ntsc
+    return Fraction(fps).limit_denominator(1001)
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+class VideoEncoder:
+    stage_name = "encode"
+
+    def __init__(self, output_path, fourcc='XVID'):
+        self.output_path = output_path
+        self.fourcc = fourcc
+        self.out = None
+
+    def open(self, fps, size):
+        # Cameras often report 0 fps.
+        rate = frame_rate(fps) if fps > 0 else Fraction(30)
+        self.out = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*self.fourcc), float(rate), size)
+        if not self.out.isOpened():
+            raise EncoderError(f"Error opening the output video: {self.output_path}")
+
+    def write(self, frame):
+        self.out.write(frame)
+
+    def release(self):
+        if self.out:
+            self.out.release()
+
+class FFmpegEncoder:
+    stage_name = "encode"
+
+    def __init__(self, output_path, codec='libx264', preset=DEFAULT_PRESET, crf=DEFAULT_CRF, bitrate=None):
+        self.output_path = output_path
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.bitrate = bitrate
+        self.process = None
+
+    def command(self, fps, size):
+        width, height = size
+        rate = frame_rate(fps) if fps > 0 else Fraction(30)
+        command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(rate), "-i", "-",
+                   "-an", "-c:v", self.codec, "-preset", self.preset]
+        command += ["-b:v", str(self.bitrate)] if self.bitrate else ["-crf", str(self.crf)]
+        if width % 2 or height % 2:
+            # yuv420p needs even sizes.
+            command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+        return command + ["-pix_fmt", "yuv420p", self.output_path]
+
+    def open(self, fps, size):
+        try:
+            self.process = subprocess.Popen(self.command(fps, size), stdin=subprocess.PIPE)
+        except OSError as error:
+            raise EncoderError(f"Cannot run ffmpeg to write {self.output_path}: {error}") from error
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError as error:
+            # ffmpeg exited; its own message is on stderr.
+            raise EncoderError(f"ffmpeg stopped while encoding {self.output_path}") from error
+
+    def release(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if process.wait() != 0:
+            raise EncoderError(f"ffmpeg failed to encode {self.output_path}")
+
+def make_encoder(output_path, codec='XVID', preset=DEFAULT_PRESET, crf=DEFAULT_CRF, bitrate=None):
+    if codec in FFMPEG_CODECS:
+        return FFmpegEncoder(output_path, codec, preset, crf, bitrate)
+    if codec in OPENCV_CODECS:
+        return VideoEncoder(output_path, codec)
+    raise ValueError(f"Unknown codec: {codec}")
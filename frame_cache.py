@@ -0,0 +1,194 @@
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+import cv2
+
+# Random access to the frames of a video for the player. Setting CAP_PROP_POS_FRAMES makes
+# OpenCV seek to the keyframe before the target and decode every frame up to it, so
+# scrubbing an H.264 file with a keyframe every few seconds decoded up to a whole GOP for
+# every move of the slider. SeekableVideo knows where the keyframes are, keeps the frames it
+# decodes in an LRU cache bounded in bytes and decodes ahead of the playhead on a
+# background thread:
+#   - a frame ahead of the decoder, before the next keyframe, is decoded forward without
+#     seeking;
+#   - any other frame is decoded from its keyframe, and the frames decoded on the way are
+#     cached, so scrubbing or stepping back within the GOP is then free;
+#   - the frames after the last one read are decoded in the background, for playback and
+#     stepping forward.
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+PREFETCH_FRAMES = 30
+# Without a keyframe index, frames at most this far ahead of the decoder are decoded
+# forward instead of seeked to.
+FORWARD_LIMIT = 30
+
+def keyframe_index(video_path):
+    # Frame numbers of the keyframes, from a pass that only demuxes the packets (no
+    # decoding: milliseconds for minutes of video). None when the backend cannot tell.
+    # The packets are in decoding order: with B-frames a keyframe can come a few frames
+    # before its display position, which only costs a few more decoded frames, since the
+    # seek itself stays exact.
+    if not hasattr(cv2, 'CAP_PROP_LRF_HAS_KEY_FRAME'):
+        return None
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        return None
+    keyframes = []
+    index = 0
+    while cap.grab():
+        if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+            keyframes.append(index)
+        index += 1
+    cap.release()
+    return keyframes if keyframes and keyframes[0] == 0 else None
+
+class FrameCache:
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.frames = OrderedDict()
+        self.bytes = 0
+
+    def __contains__(self, index):
+        with self.lock:
+            return index in self.frames
+
+    def get(self, index):
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None:
+                self.frames.move_to_end(index)
+            return frame
+
+    def put(self, index, frame):
+        with self.lock:
+            if index in self.frames:
+                self.frames.move_to_end(index)
+                return
+            self.frames[index] = frame
+            self.bytes += frame.nbytes
+            # The newest frame stays even if it is larger than the whole cache.
+            while self.bytes > self.max_bytes and len(self.frames) > 1:
+                _, oldest = self.frames.popitem(last=False)
+                self.bytes -= oldest.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.bytes = 0
+
+class SeekableVideo:
+    def __init__(self, video_path, cache_bytes=DEFAULT_CACHE_BYTES, prefetch=PREFETCH_FRAMES):
+        self.video_path = video_path
+        self.cache = FrameCache(cache_bytes)
+        self.prefetch = prefetch
+        self.cap = None
+        self.keyframes = None
+        self.frame_count = 0
+        self.fps = 0
+        self.width = 0
+        self.height = 0
+        # Number of the frame the next cap.read() returns.
+        self.position = 0
+        # The capture is shared with the prefetch thread.
+        self.lock = threading.Lock()
+        self.wanted = threading.Condition()
+        self.playhead = None
+        self.generation = 0
+        self.closed = False
+        self.thread = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.video_path)
+        if not self.cap.isOpened():
+            return False
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.keyframes = keyframe_index(self.video_path)
+        self.position = 0
+        self.closed = False
+        if self.prefetch > 0:
+            self.thread = threading.Thread(target=self._prefetch_worker, daemon=True)
+            self.thread.start()
+        return True
+
+    def read(self, index):
+        # Frame number `index`, None past the end of the video. The returned array is shared
+        # with the cache: it must not be modified.
+        if index < 0:
+            return None
+        frame = self.cache.get(index)
+        if frame is None:
+            with self.lock:
+                frame = self._decode(index)
+        self._prefetch_from(index)
+        return frame
+
+    def _forward(self, index):
+        # Whether decoding forward from the current position is the cheapest way to index.
+        if index < self.position:
+            return False
+        if self.keyframes is None:
+            return index - self.position <= FORWARD_LIMIT
+        next_keyframe = bisect_right(self.keyframes, self.position)
+        return next_keyframe == len(self.keyframes) or index < self.keyframes[next_keyframe]
+
+    def _decode(self, index):
+        # Called with the lock held.
+        frame = self.cache.get(index)
+        if frame is not None or self.cap is None:
+            return frame
+        if not self._forward(index):
+            start = self.keyframes[bisect_right(self.keyframes, index) - 1] if self.keyframes is not None else index
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            self.position = start
+        while self.position <= index:
+            ret, frame = self.cap.read()
+            if not ret:
+                return None
+            self.cache.put(self.position, frame)
+            self.position += 1
+        return frame
+
+    def _prefetch_from(self, index):
+        if self.thread is None:
+            return
+        with self.wanted:
+            self.playhead = index
+            self.generation += 1
+            self.wanted.notify()
+
+    def _prefetch_worker(self):
+        while True:
+            with self.wanted:
+                while self.playhead is None and not self.closed:
+                    self.wanted.wait()
+                if self.closed:
+                    return
+                start, generation = self.playhead, self.generation
+                self.playhead = None
+            for index in range(start + 1, min(start + 1 + self.prefetch, self.frame_count)):
+                if self.generation != generation or self.closed:
+                    break
+                if index in self.cache:
+                    continue
+                with self.lock:
+                    # Only forward: a seek is left to the next read, which may go elsewhere.
+                    if not self._forward(index) or self._decode(index) is None:
+                        break
+
+    def release(self):
+        with self.wanted:
+            self.closed = True
+            self.wanted.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+        self.cache.clear()
@@ -0,0 +1,123 @@
+import queue
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Background jobs of the GUI. Stabilizations run on a pool of at most JOB_WORKERS threads;
+# the others wait in the queue, so that several exports do not compete for the CPU. Jobs
+# never touch Tk: every change of state or progress is put in a queue that the GUI drains
+# from its main loop with poll(). A job is cancelled by setting its event, which the
+# pipeline checks at every frame (a queued job is simply dropped).
+
+JOB_WORKERS = 2
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+class Job:
+    def __init__(self, job_id, label, function, args, kwargs, on_done=None):
+        self.id = job_id
+        self.label = label
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        # Called from poll(), on the thread of the GUI, once the job is finished.
+        self.on_done = on_done
+        self.state = QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.notified = False
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def status(self):
+        if self.state == RUNNING:
+            return f"{self.progress * 100:.0f}%"
+        if self.state == FAILED:
+            return f"failed: {self.error}"
+        return self.state
+
+class JobManager:
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.jobs = []
+        self.updates = queue.Queue()
+        self.ids = itertools.count(1)
+
+    def submit(self, label, function, *args, on_done=None, **kwargs):
+        # function is called with progress_callback and cancel keyword arguments on top of
+        # the given ones, like the stabilizer functions.
+        job = Job(next(self.ids), label, function, args, kwargs, on_done)
+        self.jobs.append(job)
+        job.future = self.pool.submit(self._run, job)
+        self.updates.put(job)
+        return job
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            job.state = CANCELLED
+            self.updates.put(job)
+            return
+        job.state = RUNNING
+        self.updates.put(job)
+        try:
+            job.result = job.function(*job.args, progress_callback=self._progress(job), cancel=job.cancel_event, **job.kwargs)
+        except Exception as error:
+            # Any error: a job must not stay "running" because of a bug.
+            job.error = error
+            job.state = FAILED
+        else:
+            job.state = CANCELLED if job.cancel_event.is_set() else DONE
+        self.updates.put(job)
+
+    def _progress(self, job):
+        def callback(current_frame, frame_count):
+            progress = current_frame / frame_count if frame_count > 0 else 0.0
+            # One update per percent at most, the GUI does not need every frame.
+            if progress - job.progress >= 0.01:
+                job.progress = progress
+                self.updates.put(job)
+        return callback
+
+    def cancel(self, job):
+        job.cancel_event.set()
+        if job.future.cancel():
+            # Still queued: it never runs.
+            job.state = CANCELLED
+            self.updates.put(job)
+
+    def poll(self):
+        # From the thread of the GUI only: the jobs changed since the last call, after
+        # calling on_done for the ones that finished.
+        changed = []
+        while True:
+            try:
+                job = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if job not in changed:
+                changed.append(job)
+        for job in changed:
+            if job.finished and not job.notified:
+                job.notified = True
+                if job.on_done is not None:
+                    job.on_done(job)
+        return changed
+
+    def clear_finished(self):
+        self.jobs = [job for job in self.jobs if not job.finished]
+
+    def shutdown(self, wait=False):
+        # wait blocks until the running jobs have stopped: not from the thread of the GUI.
+        for job in self.jobs:
+            self.cancel(job)
+        self.pool.shutdown(wait=wait)
@@ -0,0 +1,47 @@
+import tkinter as tk
+from tkinter import Listbox, Button
+
+# List of the jobs of a JobManager (jobs.py) with their state and progress, polled from the
+# Tk main loop.
+
+POLL_INTERVAL = 100
+
+class JobsPanel(tk.Frame):
+    def __init__(self, parent, manager):
+        super().__init__(parent)
+        self.manager = manager
+
+        tk.Label(self, text=f"Jobs ({manager.workers} at a time)").pack(anchor=tk.W)
+        self.listbox = Listbox(self, height=5)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        buttons = tk.Frame(self)
+        buttons.pack(side=tk.LEFT, padx=5)
+        Button(buttons, text="Cancel", command=self.cancel_selected).pack(fill=tk.X)
+        Button(buttons, text="Clear finished", command=self.clear_finished).pack(fill=tk.X, pady=5)
+
+        self.poll()
+
+    def poll(self):
+        if self.manager.poll():
+            self.refresh()
+        self.after(POLL_INTERVAL, self.poll)
+
+    def refresh(self):
+        selection = self.listbox.curselection()
+        self.listbox.delete(0, tk.END)
+        for job in self.manager.jobs:
+            self.listbox.insert(tk.END, f"#{job.id}  {job.label}  -  {job.status()}")
+        for index in selection:
+            if index < self.listbox.size():
+                self.listbox.selection_set(index)
+
+    def cancel_selected(self):
+        for index in self.listbox.curselection():
+            job = self.manager.jobs[index]
+            if not job.finished:
+                self.manager.cancel(job)
+
+    def clear_finished(self):
+        self.manager.clear_finished()
+        self.refresh()
@@ -0,0 +1,139 @@
+import os
+import time
+import argparse
+
+from pipeline import VideoDecoder, PreviewWindow, build_pipeline
+from smoothing import EMASmoother, SlidingWindowSmoother, OneEuroSmoother
+from streaming import StageStats, LatencyStats, LatestFrameDecoder, DroppingEncoder
+from point_selection import SELECTION_METHODS
+from warping import INTERPOLATIONS
+from encoding import CODECS, make_encoder
+from results import VideoOpenError, StabilizationError
+
+# Live stabilization of a camera (device index), a stream URL or, to test it locally, a
+# video file read at its own frame rate. The frames go through the same tracking as the
+# offline modes; each is written once `lookahead` later frames have been tracked, so the
+# latency is about lookahead frame intervals plus the processing time. The capture keeps
+# only the newest frame and the output never blocks: when the processing falls behind,
+# frames are dropped instead of queued, and frames older than max_latency are not written.
+
+LIVE_SMOOTHERS = ['moving_average', 'ema', 'one_euro']
+
+class LiveSource(VideoDecoder):
+    def __init__(self, source, paced=None):
+        super().__init__(int(source) if str(source).isdigit() else source)
+        # Files are read at their frame rate, like a camera delivering frames.
+        self.paced = os.path.isfile(str(source)) if paced is None else paced
+        self.next_time = None
+
+    def open(self):
+        if not super().open():
+            return False
+        self.next_time = None
+        return True
+
+    def read(self):
+        if self.paced:
+            now = time.perf_counter()
+            if self.next_time is not None and self.next_time > now:
+                time.sleep(self.next_time - now)
+            self.next_time = max(self.next_time or now, now - 1.0) + 1.0 / (self.fps if self.fps > 0 else 30)
+        return super().read()
+
+def make_live_smoother(method='moving_average', window_size=30, fps=30):
+    # Causal smoothers of the camera path. moving_average is the mean of the last
+    # window_size frames: with a lookahead of window_size / 2 it is the centered moving
+    # average of the two-pass mode, with less it lags behind pans.
+    if method == 'moving_average':
+        return SlidingWindowSmoother(window_size, normalize=True)
+    if method == 'ema':
+        return EMASmoother(2.0 / (window_size + 1), normalize=True)
+    if method == 'one_euro':
+        return OneEuroSmoother(min_cutoff=1.0, beta=0.01, rate=fps if fps > 0 else 30, normalize=True)
+    raise ValueError(f"Unknown live smoothing method: {method}")
+
+def live_stabilize(stabilization_type, source, output_path, lkparams, roi=None, factor=4, offset=(0, 0), lookahead=5, smoothing='moving_average',
+                   smoothing_window=30, max_latency=None, max_frames=None, preview=False, paced=None, points='grid', analysis_scale=1.0,
+                   interpolation='linear', codec='MJPG', stats=None, latency=None):
+    latency = latency if latency is not None else LatencyStats()
+    stats = stats if stats is not None else StageStats()
+    source = LiveSource(source, paced)
+    if not source.open():
+        raise VideoOpenError(f"Error opening the live source: {source.video_path}")
+    fps = source.fps
+    source.release()
+    decoder = LatestFrameDecoder(source, stats=stats, latency=latency)
+    # Room for the lookahead frames, all written at once at the end of the stream.
+    encoder = DroppingEncoder(make_encoder(output_path, codec), lookahead + 2, stats, latency)
+    if max_latency is not None and lookahead / (fps if fps > 0 else 30) >= max_latency:
+        print("Warning: the lookahead alone is longer than the maximum latency, every frame will be dropped")
+    # The LK window is not calibrated, which would hold the first frames back, and the
+    # warped frames are not written into reused buffers, since the output queue may still
+    # hold them.
+    pipeline = build_pipeline(stabilization_type, decoder, encoder, lkparams, roi, factor, offset, calibration_frames=0, points=points,
+                              analysis_scale=analysis_scale, interpolation=interpolation, stats=stats, reuse_buffers=False)
+    if preview:
+        pipeline.preview = PreviewWindow(1, "Live stabilization")
+    try:
+        pipeline.run_live(make_live_smoother(smoothing, smoothing_window, fps), lookahead, max_latency, latency, max_frames)
+    except KeyboardInterrupt:
+        pass
+    return latency
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main-nogui.py live", description="Stabilize a camera, a stream or a video file read in real time")
+    parser.add_argument("source", help="Camera index (e.g. 0), stream URL or video file")
+    parser.add_argument("output_path", help="Path for the output video")
+    parser.add_argument("-t", "--stabilization_type", choices=['local', 'global', 'perspective'], required=True, help="Type of stabilization")
+    parser.add_argument("-msx", "--max_shift_x", type=int, default=0, help="Max shift X for global stabilization")
+    parser.add_argument("-msy", "--max_shift_y", type=int, default=0, help="Max shift Y for global stabilization")
+    parser.add_argument("-ml", "--max_level", type=int, default=10, help="Max level for stabilization")
+    parser.add_argument("-e", "--eps", type=float, default=0.01, help="EPS value for stabilization")
+    parser.add_argument("-c", "--count", type=int, default=30, help="Count value for stabilization")
+    parser.add_argument("-f", "--factor", type=int, default=4, help="Factor for stabilization")
+    parser.add_argument("-rx", "--roi_x", type=int, help="ROI X coordinate")
+    parser.add_argument("-ry", "--roi_y", type=int, help="ROI Y coordinate")
+    parser.add_argument("-rw", "--roi_width", type=int, help="ROI Width")
+    parser.add_argument("-rh", "--roi_height", type=int, help="ROI Height")
+    parser.add_argument("-la", "--lookahead", type=int, default=5, help="Frames tracked ahead of the written frame (adds as many frame intervals of latency)")
+    parser.add_argument("-s", "--smoothing", choices=LIVE_SMOOTHERS, default='moving_average', help="Causal smoothing of the camera path")
+    parser.add_argument("-sw", "--smoothing_window", type=int, default=30, help="Smoothing window (frames)")
+    parser.add_argument("--max_latency", type=float, help="Drop the frames older than this many milliseconds instead of writing them")
+    parser.add_argument("--max_frames", type=int, help="Stop after this many frames")
+    parser.add_argument("--no_pacing", action="store_true", help="Read video files as fast as possible instead of at their frame rate")
+    parser.add_argument("--preview", action="store_true", help="Show the live preview (press q to stop)")
+    parser.add_argument("-p", "--points", choices=SELECTION_METHODS, default='grid', help="Tracked points")
+    parser.add_argument("-as", "--analysis_scale", type=float, default=1.0, help="Track on frames downscaled by this factor")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default='linear', help="Interpolation of the stabilized frames")
+    parser.add_argument("--codec", choices=CODECS, default='MJPG', help="Output codec")
+    parser.add_argument("--stats", action="store_true", help="Print the throughput of every pipeline stage")
+    args = parser.parse_args(argv)
+
+    roi = None
+    if args.roi_x is not None and args.roi_y is not None and args.roi_width is not None and args.roi_height is not None:
+        roi = (args.roi_x, args.roi_y, args.roi_width, args.roi_height)
+    elif args.stabilization_type in ['local', 'perspective']:
+        print("ROI coordinates are required for live local and perspective stabilization.")
+        return
+    if args.lookahead < 0:
+        print("Invalid lookahead: it must be 0 or more frames")
+        return
+    if not 0 < args.analysis_scale <= 1:
+        print("Invalid analysis scale: it must be greater than 0 and at most 1")
+        return
+
+    offset = (args.max_shift_x, args.max_shift_y) if args.stabilization_type == 'global' else (0, 0)
+    stats = StageStats()
+    print("Starting live stabilization (Ctrl+C to stop)...")
+    try:
+        latency = live_stabilize(args.stabilization_type, args.source, args.output_path, [args.max_level, args.eps, args.count], roi, args.factor, offset,
+                                 args.lookahead, args.smoothing, args.smoothing_window, args.max_latency / 1000 if args.max_latency is not None else None,
+                                 args.max_frames, args.preview, False if args.no_pacing else None, args.points, args.analysis_scale, args.interpolation,
+                                 args.codec, stats)
+    except StabilizationError as error:
+        print(error)
+        return
+    print("Live stabilization stopped, video saved in:", args.output_path)
+    print(latency.report())
+    if args.stats:
+        print(stats.report())
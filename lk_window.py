@@ -0,0 +1,77 @@
+import math
+
+import cv2
+import numpy as np
+
+# Window sizing for the Lucas-Kanade tracker.
+#
+# "roi" is the original policy: a window twice the ROI height, which for global
+# stabilization means twice the frame height and makes every calcOpticalFlowPyrLK call
+# very expensive. "fixed" uses a small square window and lets the pyramid cover large
+# motions instead. "auto" picks the window from a short calibration pass on the first
+# frames: candidates from the smallest up to one cell of the point grid are tracked
+# forward and back, and the smallest one that sees enough texture and brings its points
+# back where they started is kept. The pyramid is then made deep enough for the largest
+# motion seen during calibration. While tracking, the window may grow up to one cell of
+# the grid when most points fail the same check, and shrinks back once they pass again.
+
+WINDOW_POLICIES = ['auto', 'fixed', 'roi']
+DEFAULT_WIN_SIZE = 21
+CALIBRATION_SIZES = (15, 21, 31, 41, 61, 91, 135, 201)
+CALIBRATION_FRAMES = 10
+
+def roi_window(roi):
+    h = roi[3]
+    return int(h*2)
+
+def cell_window(roi, factor, min_size=31):
+    # Window covering one cell of the initialize_points grid, so that the windows of all
+    # the points together cover the ROI, but never smaller than min_size.
+    return min(max(max(roi[2], roi[3]) // factor | 1, min_size), roi_window(roi))
+
+def pyramid_levels(win_size, motion, margin=2.0):
+    # At level L a window of win_size pixels covers motions of about win_size / 2 * 2^L.
+    if motion <= 0:
+        return 0
+    return max(int(math.ceil(math.log2(margin * motion / (win_size / 2)))), 0)
+
+def forward_backward_error(prev_gray, gray, points, new_points, status, lk_params):
+    # Distance between the points and where tracking them forward then back brings them;
+    # inf for the points lost in either direction.
+    back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, new_points, None, **lk_params)
+    error = np.linalg.norm((back_points - points).reshape(-1, 2), axis=1)
+    error[(status.ravel() != 1) | (back_status.ravel() != 1)] = np.inf
+    return error
+
+def track_pairs(grays, points, lk_params):
+    # Displacement, forward-backward error and minimum eigenvalue of the spatial gradient
+    # matrix (a measure of texture inside the window) of every point for each consecutive
+    # pair.
+    results = []
+    for prev_gray, gray in zip(grays, grays[1:]):
+        new_points, status, min_eig = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, flags=cv2.OPTFLOW_LK_GET_MIN_EIGENVALS, **lk_params)
+        error = forward_backward_error(prev_gray, gray, points, new_points, status, lk_params)
+        results.append(((new_points - points).reshape(-1, 2), error, min_eig.ravel()))
+    return results
+
+def calibrate_window(grays, points, roi, factor, max_level, criteria, sizes=CALIBRATION_SIZES, tolerance=0.5, min_texture=1e-4):
+    # Returns (win_size, levels, table); table holds, for every candidate tried, the median
+    # forward-backward error in pixels, the fraction of points tracked both ways and the
+    # median texture of its windows. The median lets a minority of points on a moving
+    # subject disagree. Candidates are tried with a pyramid deep enough for small windows
+    # even when max_level is low.
+    levels = max(max_level, 4)
+    largest = cell_window(roi, factor)
+    candidates = [size for size in sizes if size < largest] + [largest]
+
+    table = []
+    for size in candidates:
+        results = track_pairs(grays, points, dict(winSize=(size, size), maxLevel=levels, criteria=criteria))
+        error = np.concatenate([error for _, error, _ in results])
+        row = (size, float(np.median(error)), float(np.isfinite(error).mean()), float(np.median([np.median(min_eig) for _, _, min_eig in results])))
+        table.append(row)
+        if row[1] <= tolerance and row[3] >= min_texture:
+            break
+
+    motion = max((np.percentile(np.linalg.norm(d[np.isfinite(fb_error)], axis=1), 90) for d, fb_error, _ in results if np.isfinite(fb_error).any()), default=0.0)
+    return size, max(max_level, pyramid_levels(size, motion)), table
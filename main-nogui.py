@@ -1,10 +1,23 @@
 import cv2
 
 import os
+import sys
 import argparse
 
 from stabilizing import local_stabilizer_video, global_stabilizer_video, perspective_stabilizer_video
+from trajectory import SMOOTHING_METHODS
+from trajectory_cache import TrajectoryCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE
+from streaming import StageStats
+from profiling import Profiler
+from lk_window import WINDOW_POLICIES
+from point_selection import SELECTION_METHODS
+from warping import INTERPOLATIONS, BORDERS
+from encoding import CODECS, FFMPEG_CODECS, X264_PRESETS, DEFAULT_PRESET, DEFAULT_CRF, ffmpeg_available
+from cropping import parse_size
 from report import generate_report
+from results import StabilizationError
+import batch
+import live
 
 def select_roi(video_path):
     cap = cv2.VideoCapture(video_path)
@@ -50,6 +63,9 @@ def process_stabilization_choice(args):
     if args.roi_x is not None and args.roi_y is not None and args.roi_width is not None and args.roi_height is not None:
         roi = (args.roi_x, args.roi_y, args.roi_width, args.roi_height)
     elif args.stabilization_type in ['local', 'perspective']:
+        if args.headless:
+            print("ROI coordinates are required in headless mode.")
+            return
         roi = select_roi(args.video_path)
         if roi is None:
             print("ROI selection failed.")
@@ -69,30 +85,80 @@ def process_stabilization_choice(args):
         'max_level': max_level,
         'eps': eps,
         'count': count,
-        'factor': factor
+        'factor': factor,
+        'two_pass': args.two_pass,
+        'smoothing': args.smoothing,
+        'smoothing_window': args.smoothing_window,
+        'lk_window': args.lk_window,
+        'points': args.points,
+        'points_budget': args.points_budget,
+        'analysis_scale': args.analysis_scale,
+        'interpolation': args.interpolation,
+        'border': args.border,
+        'codec': args.codec,
+        'preset': args.preset,
+        'crf': args.crf,
+        'bitrate': args.bitrate,
+        'crop': args.crop,
+        'output_size': parse_size(args.output_size) if args.output_size is not None else None
+    }
+
+def run_stabilization(video_path, output_path, args, preview=True, cache=None, threaded=False, stats=None, workers=1):
+    options = {
+        'preview': preview,
+        'cache': cache,
+        'threaded': threaded,
+        'stats': stats,
+        'two_pass': args['two_pass'],
+        'smoothing': args['smoothing'],
+        'smoothing_window': args['smoothing_window'],
+        'lk_window': args['lk_window'],
+        'points': args['points'],
+        'budget': args['points_budget'],
+        'analysis_scale': args['analysis_scale'],
+        'interpolation': args['interpolation'],
+        'border': args['border'],
+        'codec': args['codec'],
+        'preset': args['preset'],
+        'crf': args['crf'],
+        'bitrate': args['bitrate'],
+        'crop': args['crop'],
+        'output_size': args['output_size']
     }
 
-def run_stabilization(video_path, output_path, args):
-    if args['stabilization_type'] == 'local':
-        print("Starting local stabilization...")
-        local_stabilizer_video(video_path, output_path, [args['max_level'], args['eps'], args['count']], [args['roi_x'], args['roi_y'], args['roi_width'], args['roi_height']], args['factor'])
-    elif args['stabilization_type'] == 'global':
-        if args['max_shift_x'] is None or args['max_shift_y'] is None:
-            print("Max shift values are required for global stabilization.")
+    try:
+        if args['stabilization_type'] == 'local':
+            print("Starting local stabilization...")
+            result = local_stabilizer_video(video_path, output_path, [args['max_level'], args['eps'], args['count']], [args['roi_x'], args['roi_y'], args['roi_width'], args['roi_height']], args['factor'], **options)
+        elif args['stabilization_type'] == 'global':
+            if args['max_shift_x'] is None or args['max_shift_y'] is None:
+                print("Max shift values are required for global stabilization.")
+                return
+            print("Starting global stabilization...")
+            result = global_stabilizer_video(video_path, output_path, [args['max_level'], args['eps'], args['count']], args['max_shift_x'], args['max_shift_y'], args['factor'], workers=workers, **options)
+        elif args['stabilization_type'] == 'perspective':
+            print("Starting perspective stabilization...")
+            result = perspective_stabilizer_video(video_path, output_path, [args['max_level'], args['eps'], args['count']], [args['roi_x'], args['roi_y'], args['roi_width'], args['roi_height']], args['factor'], **options)
+        else:
+            print("Invalid stabilization type. Exiting.")
             return
-        print("Starting global stabilization...")
-        global_stabilizer_video(video_path, output_path, [args['max_level'], args['eps'], args['count']], args['max_shift_x'], args['max_shift_y'], args['factor'])
-    elif args['stabilization_type'] == 'perspective':
-        print("Starting perspective stabilization...")
-        perspective_stabilizer_video(video_path, output_path, [args['max_level'], args['eps'], args['count']], [args['roi_x'], args['roi_y'], args['roi_width'], args['roi_height']], args['factor'])
-    else:
-        print("Invalid stabilization type. Exiting.")
+    except StabilizationError as error:
+        print(error)
         return
 
     print("Stabilization completed.")
+    print(f"{result.frames} frames written in {result.elapsed:.1f} s ({result.fps:.1f} fps), tracking failed on {len(result.failed_frames)} frames")
+    return result
 
 def main():
-    parser = argparse.ArgumentParser(description="Video Stabilization script by Giuseppe Tomarchio")
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch.main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "live":
+        live.main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Video Stabilization script by Giuseppe Tomarchio", epilog="Use 'main-nogui.py batch -h' to stabilize many videos at once, 'main-nogui.py live -h' to stabilize a camera or a stream.")
     parser.add_argument("-i", "--input", dest="video_path", required=True, help="Path to the input video file")
     parser.add_argument("output_path", help="Path for the output video")
     parser.add_argument("-t", "--stabilization_type", choices=['local', 'global', 'perspective'], required=True, help="Type of stabilization")
@@ -107,6 +173,31 @@ def main():
     parser.add_argument("-rw", "--roi_width", type=int, help="ROI Width")
     parser.add_argument("-rh", "--roi_height", type=int, help="ROI Height")
     parser.add_argument("-r", "--report", help="Generate a report after stabilization")
+    parser.add_argument("--headless", action="store_true", help="Disable the preview window and log progress instead")
+    parser.add_argument("-tp", "--two_pass", action="store_true", help="Analyze the whole trajectory first, then render it smoothed")
+    parser.add_argument("-s", "--smoothing", choices=SMOOTHING_METHODS, default='moving_average', help="Trajectory smoothing for the two-pass mode")
+    parser.add_argument("-sw", "--smoothing_window", type=int, default=30, help="Smoothing window (frames) for the two-pass mode")
+    parser.add_argument("--no_cache", action="store_true", help="Do not read or write the motion trajectory cache")
+    parser.add_argument("--clear_cache", action="store_true", help="Empty the motion trajectory cache before running")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="Folder of the motion trajectory cache")
+    parser.add_argument("--cache_size", type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024), help="Maximum size of the motion trajectory cache in MB")
+    parser.add_argument("--threaded", action="store_true", help="Decode and encode on separate threads, overlapped with tracking")
+    parser.add_argument("--stats", action="store_true", help="Print the throughput of every pipeline stage")
+    parser.add_argument("--profile", help="Save the time of every stage, with percentiles and histograms of the per-frame times, and the tracking failures to this JSON file")
+    parser.add_argument("--trace", help="Save a timeline of every stage on every thread to this file, in the Chrome trace format (chrome://tracing, ui.perfetto.dev)")
+    parser.add_argument("--lk_window", choices=WINDOW_POLICIES, default='auto', help="LK window size: calibrated on the first frames (auto), fixed 21x21 (fixed) or twice the ROI height (roi)")
+    parser.add_argument("-p", "--points", choices=SELECTION_METHODS, default='grid', help="Tracked points: good features to track (gftt), strongest corner per grid cell (bucketed), FAST corners (fast) or the uniform grid (grid)")
+    parser.add_argument("-pb", "--points_budget", type=int, help="Maximum number of tracked points (default: (factor-1)^2)")
+    parser.add_argument("-as", "--analysis_scale", type=float, default=1.0, help="Track on frames downscaled by this factor, e.g. 0.5 or 0.25 (the output keeps the full resolution)")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default='linear', help="Interpolation of the stabilized frames: bilinear (linear), nearest neighbour (nearest, local and global frames are then only copied, much faster) or bicubic (cubic)")
+    parser.add_argument("--border", choices=BORDERS, default='constant', help="Fill of the areas uncovered by the warp: black (constant), edge pixels (replicate) or mirrored (reflect)")
+    parser.add_argument("--codec", choices=CODECS, default='XVID', help="Output codec: XVID, MJPG (fastest, large files), mp4v, or libx264 through ffmpeg (must be installed)")
+    parser.add_argument("--preset", choices=X264_PRESETS, default=DEFAULT_PRESET, help="x264 speed preset for libx264 (ultrafast is the fastest)")
+    parser.add_argument("--crf", type=int, default=DEFAULT_CRF, help="x264 constant quality for libx264 (lower is better)")
+    parser.add_argument("--bitrate", help="Target bitrate for libx264 instead of the constant quality, e.g. 4M")
+    parser.add_argument("--crop", action="store_true", help="Crop the output to the largest area covered by every stabilized frame, computed on the whole trajectory (without --two_pass the frames are locked in place)")
+    parser.add_argument("--output_size", help="Scale the output to WIDTHxHEIGHT, e.g. 1280x720 (with --crop the crop window takes its aspect ratio)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Worker processes for global stabilization (chunked parallel mode)")
 
     args = parser.parse_args()
 
@@ -118,12 +209,42 @@ def main():
         print("Invalid output path")
         return
 
+    if args.codec in FFMPEG_CODECS and not ffmpeg_available():
+        print(f"The {args.codec} codec needs ffmpeg, which was not found")
+        return
+
+    if not 0 < args.analysis_scale <= 1:
+        print("Invalid analysis scale: it must be greater than 0 and at most 1")
+        return
+
+    if args.output_size is not None and parse_size(args.output_size) is None:
+        print("Invalid output size: it must be WIDTHxHEIGHT, e.g. 1280x720")
+        return
+
+    cache = TrajectoryCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    if args.clear_cache:
+        cache.clear()
+        print("Trajectory cache cleared.")
+
     parameters = process_stabilization_choice(args)
+    if parameters is None:
+        return
+
+    # The per-frame times are only kept when they are saved.
+    stats = Profiler(trace=args.trace is not None) if args.profile is not None or args.trace is not None else StageStats()
+    result = run_stabilization(args.video_path, args.output_path, parameters, not args.headless, None if args.no_cache else cache, args.threaded, stats, args.workers)
 
-    run_stabilization(args.video_path, args.output_path, parameters)
+    if args.stats:
+        print(stats.report())
+    if args.profile is not None:
+        stats.save_json(args.profile)
+        print("Profile saved in:", args.profile)
+    if args.trace is not None:
+        stats.save_trace(args.trace)
+        print("Trace saved in:", args.trace)
 
     if args.report is not None:
-        generate_report(parameters, args.report)
+        generate_report(parameters, args.report, result)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
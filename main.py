@@ -3,11 +3,14 @@ from tkinter import Scale, Button, Label, filedialog, messagebox, PhotoImage
 
 import cv2
 
-import threading
 import os
 
 from report import generate_report
 from stabilizing import local_stabilizer_video, global_stabilizer_video, perspective_stabilizer_video
+from results import StabilizationError
+from proxy import ProxyGenerator, scale_roi, scale_offset
+from jobs import JobManager, DONE, FAILED
+from jobs_panel import JobsPanel
 from video_player import VideoPlayer, VideoControls
 from placeholder_entry import PlaceholderEntry
 
@@ -56,8 +59,44 @@ def select_video():
         for vplayer in vplayers:
             vplayer.load_video(file_path)
         controls.update_slider_range()
+        toggle_proxy()
     controls.update()
 
+def toggle_proxy():
+    # The proxy of the loaded video is generated in the background while the parameters are
+    # set up, for the previews (proxy.py).
+    global proxy
+
+    if proxy is not None:
+        # Its previews stop at their next frame; the files are removed once they have.
+        proxy.cancel(jobs)
+        stale_proxies.append(proxy)
+        remove_proxy(proxy)
+        proxy = None
+    video_path = video_path_entry.get()
+    if use_proxy_var.get() and video_path:
+        proxy = ProxyGenerator(video_path).start()
+        update_proxy_status()
+    else:
+        proxy_status_label.config(text="")
+
+def remove_proxy(old_proxy):
+    if old_proxy.poll():
+        stale_proxies.remove(old_proxy)
+    else:
+        window.after(250, remove_proxy, old_proxy)
+
+def update_proxy_status():
+    if proxy is None:
+        return
+    if proxy.error is not None:
+        proxy_status_label.config(text=f"Proxy failed: {proxy.error}")
+    elif proxy.ready.is_set():
+        proxy_status_label.config(text=f"Proxy ready ({proxy.scale:.2f}x)")
+    else:
+        proxy_status_label.config(text=f"Generating proxy... {proxy.progress * 100:.0f}%")
+        window.after(250, update_proxy_status)
+
 def select_output_path():
     output_path = filedialog.asksaveasfilename(
         defaultextension=".avi",
@@ -68,14 +107,7 @@ def select_output_path():
         output_path_entry.delete(0, tk.END)
         output_path_entry.insert(0, output_path)
 
-def start_stabilization():
-    video_path = video_path_entry.get()
-    output_path = output_path_entry.get()
-
-    if not video_path or not output_path:
-        messagebox.showerror("Errore", "Seleziona un video e un percorso di output")
-        return
-
+def read_parameters():
     max_shift_x = int(max_shift_x_entry.get()) if max_shift_x_entry.winfo_ismapped() else 0
     max_shift_y = int(max_shift_y_entry.get()) if max_shift_y_entry.winfo_ismapped() else 0
 
@@ -94,17 +126,73 @@ def start_stabilization():
     factor = int(factor_entry.get()) if factor_entry.winfo_ismapped() else 4
 
     stabilization_type = stabilization_type_var.get()
-    threading.Thread(target=run_stabilization, args=(video_path, output_path, [max_level, eps, count], [roi_x, roi_y, roi_width, roi_height], [max_shift_x, max_shift_y], stabilization_type, factor)).start()
+    return [max_level, eps, count], [roi_x, roi_y, roi_width, roi_height], [max_shift_x, max_shift_y], stabilization_type, factor
+
+def start_stabilization():
+    video_path = video_path_entry.get()
+    output_path = output_path_entry.get()
+
+    if not video_path or not output_path:
+        messagebox.showerror("Errore", "Seleziona un video e un percorso di output")
+        return
 
-def run_stabilization(video_path, output_path, lkparams, roi, max_shifts, stabilization_type, factor):
+    parameters = read_parameters()
+    if parameters is None:
+        return
+    jobs.submit(f"Export {os.path.basename(output_path)}", run_stabilization, video_path, output_path, *parameters,
+                on_done=lambda job: show_output(job, output_path))
+
+def start_preview():
+    # Stabilizes the proxy, or a range of its frames, without the OpenCV window.
+    if proxy is None or not proxy.ready.is_set():
+        messagebox.showerror("Error", "The proxy is not ready")
+        return
+
+    try:
+        start = int(preview_from_entry.get() or 0)
+        end = int(preview_to_entry.get()) if preview_to_entry.get() else None
+    except ValueError:
+        messagebox.showerror("Error", "Enter the preview range in frames")
+        return
+    if start < 0 or (end is not None and end <= start):
+        messagebox.showerror("Error", "Invalid preview range")
+        return
+
+    parameters = read_parameters()
+    if parameters is None:
+        return
+    lkparams, roi, max_shifts, stabilization_type, factor = parameters
+    output_path = proxy.output_path()
+    label = f"Preview frames {start}-{end}" if start > 0 or end is not None else "Preview"
+    proxy.jobs.append(jobs.submit(label, run_stabilization, proxy.path, output_path, lkparams, scale_roi(roi, proxy.scale), list(scale_offset(max_shifts, proxy.scale)),
+                                  stabilization_type, factor, frame_range=(start, end), on_done=lambda job: show_output(job, output_path, start)))
+
+def run_stabilization(video_path, output_path, lkparams, roi, max_shifts, stabilization_type, factor, frame_range=None, progress_callback=None, cancel=None):
+    # Run by the job manager: the progress and Cancel of the jobs panel replace the OpenCV
+    # preview window, which cannot be shown from several jobs at once.
     if stabilization_type == "local":
-        local_stabilizer_video(video_path, output_path, lkparams, roi, factor)
+        return local_stabilizer_video(video_path, output_path, lkparams, roi, factor, False, progress_callback, frame_range=frame_range, cancel=cancel)
     elif stabilization_type == "global":
-        global_stabilizer_video(video_path, output_path, lkparams, max_shifts[0], max_shifts[1], factor)
+        return global_stabilizer_video(video_path, output_path, lkparams, max_shifts[0], max_shifts[1], factor, False, progress_callback, frame_range=frame_range, cancel=cancel)
     elif stabilization_type == "perspective":
-        perspective_stabilizer_video(video_path, output_path, lkparams, roi, factor)
-    
-    vplayers[1].load_video(output_path)
+        return perspective_stabilizer_video(video_path, output_path, lkparams, roi, factor, False, progress_callback, frame_range=frame_range, cancel=cancel)
+
+def show_output(job, output_path, first_frame=0):
+    # Called on the main loop when a job is finished.
+    if job.state == FAILED:
+        if isinstance(job.error, StabilizationError):
+            messagebox.showerror("Error", str(job.error))
+        else:
+            messagebox.showerror("Error", f"{job.label} failed: {job.error!r}")
+        return
+    if job.state != DONE:
+        return
+
+    # A preview of a range is shown from its first frame, next to the same frame of the input.
+    vplayers[1].load_video(output_path, first_frame)
+    controls.update_slider_range()
+    controls.seek(first_frame)
+    controls.update()
 
 def toggle_shift_entries():
     if stabilization_type_var.get() == "global":
@@ -240,4 +328,36 @@ if __name__ == "__main__":
     tk.Button(window, text="Start Stabilization", command=start_stabilization).grid(row=11, column=2, padx=5, pady=15)
     tk.Button(window, text="Generate Report", command=lambda: generate_report(get_entry_data())).grid(row=11, column=0, padx=5, pady=15)
 
-    window.mainloop()
\ No newline at end of file
+    proxy = None
+    # Proxies replaced or turned off, until their files are removed.
+    stale_proxies = []
+    use_proxy_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(window, text="Preview on proxy", variable=use_proxy_var, command=toggle_proxy).grid(row=12, column=0, padx=5, pady=5, sticky="W")
+    tk.Label(window, text="From frame").grid(row=12, column=1, padx=(0,80), pady=5, sticky="E")
+    preview_from_entry = tk.Entry(window, width=10)
+    preview_from_entry.grid(row=12, column=1, padx=5, pady=5, sticky="E")
+    tk.Label(window, text="To frame").grid(row=12, column=2, padx=5, pady=5, sticky="W")
+    preview_to_entry = tk.Entry(window, width=10)
+    preview_to_entry.grid(row=12, column=2, padx=5, pady=5, sticky="E")
+    tk.Button(window, text="Preview", command=start_preview).grid(row=12, column=3, padx=5, pady=5, sticky="WE")
+    proxy_status_label = tk.Label(window, text="")
+    proxy_status_label.grid(row=13, column=0, columnspan=4, padx=5, pady=5, sticky="W")
+
+    jobs = JobManager()
+    JobsPanel(window, jobs).grid(row=14, column=0, columnspan=5, padx=5, pady=5, sticky="WE")
+
+    def close():
+        jobs.shutdown()
+        if proxy is not None:
+            proxy.cancel(jobs)
+            stale_proxies.append(proxy)
+        window.destroy()
+    window.protocol("WM_DELETE_WINDOW", close)
+
+    window.mainloop()
+
+    # Off the main loop: the cancelled jobs can be waited for before removing the proxies.
+    jobs.shutdown(wait=True)
+    for old_proxy in stale_proxies:
+        old_proxy.thread.join()
+        old_proxy.poll()
\ No newline at end of file
@@ -0,0 +1,230 @@
+import os
+import time
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from trajectory import Trajectory
+from streaming import StageStats
+from results import VideoOpenError
+from cropping import fit_output
+from lk_window import DEFAULT_WIN_SIZE
+from encoding import CODEC_EXTENSIONS, DEFAULT_PRESET, DEFAULT_CRF, ffmpeg_available, make_encoder
+
+# Chunked multi-process stabilization. The video is split in one frame range per worker;
+# every range is tracked in its own process starting "overlap" frames early, the per-chunk
+# trajectories are stitched on the overlapping frames, and the ranges are rendered in
+# parallel and concatenated.
+#
+# Each chunk re-seeds its tracking points at its first frame, while a single process keeps
+# tracking points that slowly drift, so the stitched trajectory is not bit-identical to a
+# single-process one. On a static scene with a known camera path (the synthetic pan of
+# benchmarks/common.py) the camera path stays within TOLERANCE_RMS pixels RMS and
+# TOLERANCE_MAX pixels on every frame of the single-process path with 2 to 8 workers (see
+# benchmarks/parallel_tolerance.py). On example/vespa.mp4 the points follow the moving
+# scooter as much as the camera, and two single-process runs that only differ in the LK
+# window already disagree by tens of pixels, so that clip cannot bound the stitching.
+#
+# The stages run in the workers, so the stats only time the phases seen from here: tracking
+# the chunks, rendering them and joining the parts.
+
+TOLERANCE_RMS = 0.5
+TOLERANCE_MAX = 1.5
+
+def trajectory_difference(reference, trajectory):
+    a = reference.camera_path()
+    b = trajectory.camera_path()
+    n = min(len(a), len(b))
+    distance = np.linalg.norm(a[:n, :2, 2] - b[:n, :2, 2], axis=1)
+    return float(np.sqrt(np.mean(distance ** 2))), float(distance.max())
+
+class RangeDecoder(VideoDecoder):
+    def __init__(self, video_path, start, end=None):
+        super().__init__(video_path)
+        self.start = start
+        self.end = end
+        self.position = start
+
+    def open(self):
+        if not super().open():
+            return False
+        if self.start > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+        self.position = self.start
+        end = self.end if self.end is not None else self.frame_count
+        self.frame_count = max(end - self.start, 0)
+        return True
+
+    def read(self):
+        if self.end is not None and self.position >= self.end:
+            return None
+        frame = super().read()
+        self.position += 1
+        return frame
+
+def split_ranges(frame_count, chunks, overlap):
+    # (start, end, tracked_from) for every chunk; the last chunk reads up to the end of the
+    # file, since CAP_PROP_FRAME_COUNT is only an estimate for some containers.
+    boundaries = np.linspace(0, frame_count, chunks + 1).astype(int)
+    ranges = []
+    for i in range(chunks):
+        start, end = int(boundaries[i]), int(boundaries[i + 1])
+        if end <= start:
+            continue
+        ranges.append((start, end if i < chunks - 1 else None, max(start - overlap, 0)))
+    return ranges
+
+def stitch_trajectories(trajectories, ranges):
+    estimates = []
+    valid = []
+    previous = None
+    for trajectory, (start, end, tracked_from) in zip(trajectories, ranges):
+        chunk_estimates = trajectory.estimates.copy()
+        chunk_valid = trajectory.valid
+
+        if trajectory.absolute and previous is not None:
+            # Translation chunks are measured from their own reference points: shift them
+            # onto the previous chunk using the frames both have tracked.
+            previous_estimates, previous_valid, previous_from = previous
+            overlap = np.arange(tracked_from, start)
+            both = previous_valid[overlap - previous_from] & chunk_valid[overlap - tracked_from]
+            if both.any():
+                shift = (previous_estimates[overlap - previous_from][both] - chunk_estimates[overlap - tracked_from][both]).mean(axis=0)
+                chunk_estimates[:, :2, 2] += shift[:2, 2]
+
+        previous = (chunk_estimates, chunk_valid, tracked_from)
+        estimates.append(chunk_estimates[start - tracked_from:])
+        valid.append(chunk_valid[start - tracked_from:])
+
+    return Trajectory(np.concatenate(estimates), np.concatenate(valid), trajectories[0].absolute)
+
+def concatenate_videos(part_paths, output_path, fps, size, encoder=None):
+    if ffmpeg_available():
+        list_path = output_path + ".parts.txt"
+        with open(list_path, "w") as file:
+            for part_path in part_paths:
+                file.write(f"file '{os.path.abspath(part_path)}'\n")
+        try:
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path], check=True)
+        finally:
+            os.remove(list_path)
+        return
+
+    encoder = encoder if encoder is not None else VideoEncoder(output_path)
+    encoder.open(fps, size)
+    for part_path in part_paths:
+        decoder = VideoDecoder(part_path)
+        if not decoder.open():
+            continue
+        while True:
+            frame = decoder.read()
+            if frame is None:
+                break
+            encoder.write(frame)
+        decoder.release()
+    encoder.release()
+
+def _init_worker():
+    # The workers already keep every core busy, OpenCV's own threads would only compete.
+    cv2.setNumThreads(1)
+
+def _track_chunk(stabilization_type, video_path, start, end, lkparams, roi, factor, window, win_size, points, budget, analysis_scale):
+    pipeline = build_pipeline(stabilization_type, RangeDecoder(video_path, start, end), VideoEncoder(None), lkparams, roi, factor,
+                              window=window, win_size=win_size, calibration_frames=0, points=points, budget=budget, analysis_scale=analysis_scale)
+    trajectory = pipeline.analyze()
+    return Trajectory(trajectory.estimates, trajectory.valid, trajectory.absolute)
+
+def _render_chunk(stabilization_type, video_path, encoder, start, end, transforms, lkparams, interpolation, border, size):
+    pipeline = build_pipeline(stabilization_type, RangeDecoder(video_path, start, end), encoder, lkparams,
+                              interpolation=interpolation, border=border)
+    pipeline.render(transforms, size=size)
+    return encoder.output_path
+
+def parallel_stabilize(stabilization_type, video_path, output_path, lkparams, roi=None, factor=4, offset=(0, 0), workers=2, overlap=15,
+                       smoothing='none', smoothing_window=30, cache=None, progress_callback=None, window='auto', points='grid', budget=None, analysis_scale=1.0,
+                       interpolation='linear', border='constant', codec='XVID', preset=DEFAULT_PRESET, crf=DEFAULT_CRF, bitrate=None, crop=False, output_size=None, stats=None):
+    stats = stats if stats is not None else StageStats()
+    decoder = VideoDecoder(video_path)
+    if not decoder.open():
+        raise VideoOpenError(f"Error loading video: {video_path}")
+    frame_count, fps, size = decoder.frame_count, decoder.fps, (decoder.width, decoder.height)
+    decoder.release()
+
+    # Translation chunks need at least one valid shared frame besides their first one,
+    # homography chunks need one to get the motion into their first frame.
+    overlap = max(overlap, 2)
+    ranges = split_ranges(frame_count, workers, overlap)
+    total = 2 * frame_count
+    done = 0
+
+    key = trajectory = None
+    if cache is not None and os.path.isfile(video_path):
+        parameters = build_pipeline(stabilization_type, VideoDecoder(video_path), VideoEncoder(None), lkparams, roi, factor, window=window, points=points, budget=budget,
+                                    analysis_scale=analysis_scale).tracking_parameters()
+        parameters['chunks'] = [[start, end, tracked_from] for start, end, tracked_from in ranges]
+        key = cache.key(video_path, parameters)
+        trajectory = cache.load(key)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        if trajectory is None:
+            win_size = DEFAULT_WIN_SIZE
+            if window == 'auto':
+                # Calibrated once on the start of the video and shared by all the chunks, which
+                # would otherwise each size their window on different content.
+                win_size, levels = build_pipeline(stabilization_type, VideoDecoder(video_path), VideoEncoder(None), lkparams, roi, factor, points=points, budget=budget,
+                                                   analysis_scale=analysis_scale).calibrate_tracker()
+                lkparams = [levels] + list(lkparams[1:])
+            start_time = time.perf_counter()
+            futures = {pool.submit(_track_chunk, stabilization_type, video_path, tracked_from, end, lkparams, roi, factor, window, win_size, points, budget, analysis_scale): i
+                       for i, (start, end, tracked_from) in enumerate(ranges)}
+            trajectories = [None] * len(ranges)
+            for future in as_completed(futures):
+                i = futures[future]
+                trajectories[i] = future.result()
+                done += len(trajectories[i]) - (ranges[i][0] - ranges[i][2])
+                if progress_callback is not None:
+                    progress_callback(done, total)
+            trajectory = stitch_trajectories(trajectories, ranges)
+            stats.add("track chunks", time.perf_counter() - start_time, len(trajectory))
+            if key is not None:
+                cache.store(key, trajectory)
+        done = len(trajectory)
+
+        transforms = trajectory.corrections(smoothing, smoothing_window, offset)
+        if crop or output_size is not None:
+            # Computed on the whole trajectory, so that every part has the same window.
+            transforms, size = fit_output(transforms, size, crop, output_size)
+
+        # Parts are written with the output codec when ffmpeg can join them without
+        # re-encoding, losslessly when they have to be re-encoded for the concatenation.
+        concatenate = ffmpeg_available()
+        part_ext = (os.path.splitext(output_path)[1] or CODEC_EXTENSIONS[codec]) if concatenate else '.avi'
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as tmp:
+            start_time = time.perf_counter()
+            futures = {}
+            for i, (start, end, tracked_from) in enumerate(ranges):
+                part_path = os.path.join(tmp, f"part{i:04d}{part_ext}")
+                part_end = end if end is not None else len(transforms)
+                encoder = make_encoder(part_path, codec, preset, crf, bitrate) if concatenate else VideoEncoder(part_path, 'FFV1')
+                futures[pool.submit(_render_chunk, stabilization_type, video_path, encoder, start, end, transforms[start:part_end], lkparams,
+                                     interpolation, border, size)] = i
+
+            part_paths = [None] * len(ranges)
+            for future in as_completed(futures):
+                i = futures[future]
+                part_paths[i] = future.result()
+                start, end = ranges[i][0], ranges[i][1] if ranges[i][1] is not None else len(transforms)
+                done += end - start
+                if progress_callback is not None:
+                    progress_callback(done, total)
+
+            stats.add("render chunks", time.perf_counter() - start_time, len(transforms))
+            start_time = time.perf_counter()
+            concatenate_videos(part_paths, output_path, fps, size, make_encoder(output_path, codec, preset, crf, bitrate))
+            stats.add("join parts", time.perf_counter() - start_time, len(transforms))
+
+    return trajectory
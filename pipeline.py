@@ -0,0 +1,808 @@
+import os
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from smoothing import EMASmoother
+from streaming import StageStats, LatencyStats, ThreadedDecoder, ThreadedEncoder
+from buffers import BufferPool, FrameRing
+from warping import AffineWarper, PerspectiveWarper, TranslationWarper
+from encoding import VideoEncoder
+from trajectory import Trajectory, translation_matrix, scale_transform
+from cropping import fit_output
+from results import VideoOpenError
+from point_selection import PointSelector, fit_roi, initialize_points
+from lk_window import WINDOW_POLICIES, DEFAULT_WIN_SIZE, CALIBRATION_FRAMES, roi_window, cell_window, calibrate_window
+
+def draw_progress_bar(image, progress, bar_height=15):
+    img_with_bar = np.zeros((image.shape[0] + bar_height, image.shape[1], 3), dtype=np.uint8)
+    img_with_bar[:image.shape[0], :] = image
+    return draw_progress(img_with_bar, progress, bar_height)
+
+def draw_progress(canvas, progress, bar_height=15):
+    # Draws the bar in place over the last bar_height rows of the canvas.
+    bar_width = canvas.shape[1]
+    bar_x = 0
+    bar_y = canvas.shape[0] - bar_height
+
+    cv2.rectangle(canvas, (bar_x, bar_y), (bar_x + bar_width, bar_y + bar_height), (200, 200, 200), -1)
+
+    completed_width = int(bar_width * progress)
+    cv2.rectangle(canvas, (bar_x, bar_y), (bar_x + completed_width, bar_y + bar_height), (6, 176, 37), -1)
+
+    return canvas
+
+class ProgressLogger:
+    def __init__(self, label="Progress", step=0.1):
+        self.label = label
+        self.step = step
+        self.next_mark = 0
+
+    def __call__(self, current_frame, frame_count):
+        progress = current_frame / frame_count if frame_count > 0 else 0
+        if progress >= self.next_mark:
+            print(f"{self.label}: {progress:.0%}")
+            while self.next_mark <= progress:
+                self.next_mark += self.step
+
+def exponential_moving_average(H_list, alpha=0.2):
+    smoothed_H = np.eye(3)
+    for H in H_list:
+        smoothed_H = (1 - alpha) * smoothed_H + alpha * H
+        smoothed_H /= smoothed_H[2, 2]
+    return smoothed_H
+
+
+# Stages
+
+class VideoDecoder:
+    stage_name = "decode"
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.cap = None
+        self.frame_count = 0
+        self.fps = 0
+        self.width = 0
+        self.height = 0
+        # When set, frames are decoded into buffers of this BufferPool.
+        self.pool = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.video_path)
+        if not self.cap.isOpened():
+            return False
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return True
+
+    def read(self):
+        if self.pool is None:
+            ret, frame = self.cap.read()
+            return frame if ret else None
+        buffer = self.pool.acquire((self.height, self.width, 3))
+        ret, frame = self.cap.read(buffer)
+        if frame is not buffer:
+            # End of the video, or frames of another size than reported.
+            self.pool.release(buffer)
+        return frame if ret else None
+
+    def release(self):
+        if self.cap:
+            self.cap.release()
+
+class GrayscaleConverter:
+    # With a scale below 1 the frames are tracked downsampled: the motion estimate needs
+    # far fewer pixels than the warp.
+    def __init__(self, scale=1.0, pool=None):
+        self.scale = scale
+        self.pool = pool
+        self.full = None
+
+    def size(self, width, height):
+        return max(int(round(width * self.scale)), 1), max(int(round(height * self.scale)), 1)
+
+    def convert(self, frame):
+        if self.pool is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if self.scale == 1:
+                return gray
+            return cv2.resize(gray, self.size(gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_AREA)
+
+        height, width = frame.shape[:2]
+        if self.scale == 1:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.pool.acquire((height, width)))
+        # The full-size gray frame is only needed until it is resized.
+        if self.full is None or self.full.shape != (height, width):
+            self.full = np.empty((height, width), dtype=np.uint8)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.full)
+        size = self.size(width, height)
+        return cv2.resize(self.full, size, dst=self.pool.acquire((size[1], size[0])), interpolation=cv2.INTER_AREA)
+
+class LKTracker:
+    def __init__(self, max_level, eps, count, window='auto', win_size=DEFAULT_WIN_SIZE, calibration_frames=CALIBRATION_FRAMES, max_error=1.0, check_interval=10, crop=True, search_range=0.1, max_crop=0.5):
+        if window not in WINDOW_POLICIES:
+            raise ValueError(f"Unknown LK window policy: {window}")
+        self.max_level = max_level
+        self.eps = eps
+        self.count = count
+        self.window = window
+        self.win_size = win_size
+        self.calibration_frames = calibration_frames
+        self.max_error = max_error
+        self.check_interval = check_interval
+        self.crop = crop
+        self.search_range = search_range
+        self.max_crop = max_crop
+        self.needs_calibration = False
+        self.calibration = None
+        self.roi = None
+        self.lk_params = None
+        # Range of the "auto" window: the calibrated size up to one cell of the point grid.
+        self.min_window = None
+        self.max_window = None
+        self.unchecked = 0
+
+    def prepare(self, roi, factor=4):
+        self.roi = roi
+        win_size = roi_window(roi) if self.window == 'roi' else self.win_size
+        self.lk_params = dict(winSize=(win_size, win_size), maxLevel=self.max_level, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, self.count, self.eps))
+        self.needs_calibration = self.window == 'auto' and self.calibration_frames > 0
+        self.min_window = win_size
+        self.max_window = max(cell_window(roi, factor), win_size)
+        self.unchecked = 0
+
+    def calibrate(self, grays, points, factor):
+        if len(grays) > 1:
+            win_size, levels, self.calibration = calibrate_window(grays, points, self.roi, factor, self.max_level, self.lk_params['criteria'])
+            self.lk_params.update(winSize=(win_size, win_size), maxLevel=levels)
+            self.min_window = win_size
+        self.needs_calibration = False
+
+    def _region(self, shape, points):
+        # Part of the frames the points can reach: a window plus search_range of the frame
+        # size around them. None when it is not much smaller than the frame.
+        height, width = shape[:2]
+        margin = self.lk_params['winSize'][0] + int(self.search_range * max(height, width))
+        low = np.floor(points.reshape(-1, 2).min(axis=0)).astype(int) - margin
+        high = np.ceil(points.reshape(-1, 2).max(axis=0)).astype(int) + margin + 1
+        x0, y0 = max(low[0], 0), max(low[1], 0)
+        x1, y1 = min(high[0], width), min(high[1], height)
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) > self.max_crop * width * height:
+            return None
+        return x0, y0, x1, y1
+
+    def _lk(self, prev_gray, gray, points):
+        # OpenCV rebuilds both image pyramids, and the derivatives of the first one, on every
+        # call, and its Python binding cannot be given prebuilt ones. Passing only the region
+        # around the points keeps that work proportional to the ROI instead of the frame.
+        region = self._region(gray.shape, points) if self.crop and len(points) else None
+        if region is None:
+            new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **self.lk_params)
+            return new_points, status
+        x0, y0, x1, y1 = region
+        offset = np.float32([x0, y0])
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray[y0:y1, x0:x1], gray[y0:y1, x0:x1], points - offset, None, **self.lk_params)
+        return new_points + offset, status
+
+    def track(self, prev_gray, gray, points):
+        new_points, status = self._lk(prev_gray, gray, points)
+        if self.window != 'auto':
+            return new_points, status
+        # The forward-backward check costs a second LK call, so it only runs on the frames
+        # where points were lost and, while the window is grown, every check_interval frames
+        # to see whether it can shrink back.
+        self.unchecked += 1
+        if status.all() and (self.lk_params['winSize'][0] == self.min_window or self.unchecked < self.check_interval):
+            return new_points, status
+        self.unchecked = 0
+        consistent = self._consistent(prev_gray, gray, points, new_points, status)
+        win_size = previous_size = self.lk_params['winSize'][0]
+        # Most points mis-tracked: the motion got faster than the window was calibrated for,
+        # so the frame is tracked again with a larger one. A minority (e.g. points on a
+        # moving subject) is only dropped, and the window shrinks back once three quarters
+        # of the points are consistent again.
+        while 2 * consistent.sum() < len(points) and win_size < self.max_window:
+            win_size = min(win_size * 2 + 1, self.max_window)
+            self.lk_params['winSize'] = (win_size, win_size)
+            new_points, status = self._lk(prev_gray, gray, points)
+            consistent = self._consistent(prev_gray, gray, points, new_points, status)
+        if win_size == previous_size and win_size > self.min_window and 4 * consistent.sum() >= 3 * len(points):
+            win_size = max(win_size // 2 | 1, self.min_window)
+            self.lk_params['winSize'] = (win_size, win_size)
+        return new_points, consistent.astype(status.dtype).reshape(status.shape)
+
+    def _consistent(self, prev_gray, gray, points, new_points, status):
+        # Tracked points that come back within max_error pixels of where they started.
+        consistent = status.ravel() == 1
+        if consistent.any():
+            back_points, back_status = self._lk(gray, prev_gray, new_points[consistent])
+            error = np.linalg.norm((back_points - points[consistent]).reshape(-1, 2), axis=1)
+            consistent[consistent] = (back_status.ravel() == 1) & (error <= self.max_error)
+        return consistent
+
+# Motion models return a 3x3 matrix, or None when the motion cannot be estimated.
+# "absolute" models estimate the displacement of the ROI from its reference position,
+# the others the motion between consecutive frames.
+# On failure, "defer" models keep the frames until the next good estimate while
+# "hold" models keep warping with the last transform.
+
+class TranslationModel:
+    failure_policy = "defer"
+    absolute = True
+
+    def __init__(self, min_points=4):
+        self.min_points = min_points
+        self.reference = None
+        self.base = (0, 0)
+
+    def prepare(self, roi):
+        self.reference = None
+        self.base = (0, 0)
+
+    def rebase(self, points, estimate=None):
+        # Displacements are measured from the motion of these points from now on, on top of
+        # the current estimate, so lost points no longer pull the mean and new points can be
+        # selected anywhere in the ROI.
+        self.reference = points.reshape(-1, 2)
+        self.base = (estimate[0, 2], estimate[1, 2]) if estimate is not None else (0, 0)
+
+    def estimate(self, prev_points, new_points, status):
+        if status.sum() < self.min_points:
+            return None
+        valid = status.ravel() == 1
+        motion = new_points.reshape(-1, 2)[valid] - self.reference[valid]
+
+        return translation_matrix(self.base[0] + np.mean(motion[:, 0]), self.base[1] + np.mean(motion[:, 1]))
+
+class HomographyModel:
+    failure_policy = "hold"
+    absolute = False
+
+    def __init__(self, min_points=4):
+        self.min_points = min_points
+
+    def prepare(self, roi):
+        pass
+
+    def rebase(self, points, estimate=None):
+        pass
+
+    def estimate(self, prev_points, new_points, status):
+        valid_prev_pts = prev_points[status == 1]
+        valid_curr_pts = new_points[status == 1]
+        if len(valid_prev_pts) < self.min_points or len(valid_curr_pts) < self.min_points:
+            return None
+        H_new, _ = cv2.findHomography(valid_prev_pts, valid_curr_pts, cv2.RANSAC)
+        return H_new
+
+# Single-pass smoothers turn each motion estimate into the transform used to warp
+# the current frame.
+
+class TranslationLockSmoother:
+    def apply(self, displacement):
+        return translation_matrix(-displacement[0, 2], -displacement[1, 2])
+
+class HomographyEMASmoother:
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.ema = EMASmoother(alpha, initial=np.eye(3), normalize=True)
+        self.H = np.eye(3)
+
+    def apply(self, H_new):
+        smoothed_H = self.ema.update(H_new)
+        self.H = smoothed_H.dot(self.H)
+        return self.H
+
+class PreviewWindow:
+    def __init__(self, delay=30, title="Converting...", bar_height=15):
+        self.delay = delay
+        self.title = title
+        self.bar_height = bar_height
+        self.canvas = None
+
+    def show(self, frame, stabilized_frame, points, progress):
+        # The frames side by side and the progress bar are drawn into the same canvas
+        # every time. The stabilized frame is smaller or larger when the output is cropped
+        # or scaled.
+        height, width = frame.shape[:2]
+        stabilized_height, stabilized_width = stabilized_frame.shape[:2]
+        shape = (max(height, stabilized_height) + self.bar_height, width + stabilized_width, 3)
+        if self.canvas is None or self.canvas.shape != shape:
+            self.canvas = np.zeros(shape, dtype=np.uint8)
+        frame_x = self.canvas[:height, :width]
+        frame_x[:] = frame
+        for point in points:
+            x, y = point.ravel()
+            cv2.circle(frame_x, (int(x), int(y)), 3, (int(x), int(y), 0), -1)
+        self.canvas[:stabilized_height, width:] = stabilized_frame
+        cv2.imshow(self.title, draw_progress(self.canvas, progress, self.bar_height))
+
+    def poll(self):
+        return not (cv2.waitKey(self.delay) & 0xFF == ord('q'))
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class StabilizationPipeline:
+    def __init__(self, decoder, encoder, tracker, motion_model, roi=None, factor=4, grayscale=None, smoother=None, warper=None, offset=(0, 0), preview=None, progress_callback=None, cache=None, threaded=False, queue_size=8, stats=None, point_selector=None, analysis_scale=1.0, reuse_buffers=True, cancel=None, frame_range=None):
+        self.stats = stats if stats is not None else StageStats()
+        # Decoded and grayscale frames come from this pool and go back to it once used; the
+        # warped frames cycle through a ring long enough for the encoder queue.
+        self.buffers = BufferPool() if reuse_buffers else None
+        self.output_ring = FrameRing(queue_size + 2 if threaded else 1) if reuse_buffers else None
+        if reuse_buffers:
+            decoder.pool = self.buffers
+        if threaded:
+            decoder = ThreadedDecoder(decoder, queue_size, self.stats)
+            encoder = ThreadedEncoder(encoder, queue_size, self.stats)
+        self.decoder = decoder
+        self.encoder = encoder
+        self.tracker = tracker
+        self.motion_model = motion_model
+        self.roi = roi
+        self.factor = factor
+        self.point_selector = point_selector if point_selector is not None else PointSelector(factor=factor)
+        self.analysis_scale = analysis_scale
+        self.grayscale = grayscale if grayscale is not None else GrayscaleConverter(analysis_scale, self.buffers)
+        self.smoother = smoother if smoother is not None else TranslationLockSmoother()
+        self.warper = warper if warper is not None else AffineWarper()
+        self.offset = offset
+        self.preview = preview
+        self.progress_callback = progress_callback
+        self.cache = cache
+        # (start, end) of the frames the decoder reads when it is a RangeDecoder (parallel.py),
+        # part of the cache key.
+        self.frame_range = frame_range
+        # A threading.Event set from another thread to stop the run at the next frame, like
+        # q in the preview window.
+        self.cancel = cancel
+        # Outcome of the last run: frames written, stopped from the preview, trajectory.
+        self.frames_written = 0
+        self.cancelled = False
+        self.trajectory = None
+
+    def tracking_parameters(self):
+        return {
+            'motion_model': type(self.motion_model).__name__,
+            'roi': [int(v) for v in self.roi] if self.roi is not None else None,
+            'factor': self.factor,
+            'max_level': self.tracker.max_level,
+            'eps': self.tracker.eps,
+            'count': self.tracker.count,
+            'window': self.tracker.window,
+            'win_size': self.tracker.win_size,
+            'points': self.point_selector.method,
+            'budget': self.point_selector.budget,
+            'analysis_scale': self.analysis_scale
+        }
+
+    def _cached_trajectory(self):
+        if self.cache is None or not os.path.isfile(self.decoder.video_path):
+            return None, None
+        parameters = self.tracking_parameters()
+        if self.frame_range is not None:
+            parameters['frames'] = list(self.frame_range)
+        key = self.cache.key(self.decoder.video_path, parameters)
+        return key, self.cache.load(key)
+
+    def _frame_size(self):
+        # Only known once the decoder has been opened, which a cached trajectory skips.
+        if self.decoder.width > 0:
+            return self.decoder.width, self.decoder.height
+        probe = VideoDecoder(self.decoder.video_path)
+        probe.open()
+        probe.release()
+        return probe.width, probe.height
+
+    def _read(self):
+        with self.stats.timer(self.decoder.stage_name):
+            return self.decoder.read()
+
+    def _write(self, frame):
+        with self.stats.timer(self.encoder.stage_name):
+            self.encoder.write(frame)
+        self.frames_written += 1
+
+    def _warp(self, frame, transform, size=None):
+        shape = (size[1], size[0]) + frame.shape[2:] if size is not None else frame.shape
+        dst = self.output_ring.next(shape, frame.dtype) if self.output_ring is not None else None
+        with self.stats.timer("warp"):
+            return self.warper.warp(frame, transform, dst, size)
+
+    def _recycle(self, buffer):
+        # Hands a decoded or grayscale frame back to the pool once nothing reads it anymore.
+        if self.buffers is not None:
+            self.buffers.release(buffer)
+
+    def _cancel_requested(self):
+        return self.cancel is not None and self.cancel.is_set()
+
+    def _poll(self):
+        if self._cancel_requested():
+            return False
+        if self.preview is None:
+            return True
+        with self.stats.timer("preview wait"):
+            return self.preview.poll()
+
+    def _open(self):
+        if not self.decoder.open():
+            raise VideoOpenError(f"Error loading video: {self.decoder.video_path}")
+
+        first_frame = self._read()
+        if first_frame is None:
+            self.decoder.release()
+            raise VideoOpenError(f"Error loading first frame: {self.decoder.video_path}")
+        self.frames_written = 0
+        self.cancelled = False
+        return first_frame
+
+    def _open_encoder(self, size):
+        try:
+            self.encoder.open(self.decoder.fps, size)
+        except Exception:
+            self.decoder.release()
+            raise
+
+    def _tracking_roi(self):
+        # In the coordinates of the (possibly downsampled) grayscale frames.
+        if self.analysis_scale == 1:
+            return self.roi if self.roi is not None else (0, 0, self.decoder.width, self.decoder.height)
+        if self.roi is None:
+            return (0, 0) + self.grayscale.size(self.decoder.width, self.decoder.height)
+        return tuple(int(round(v * self.analysis_scale)) for v in self.roi)
+
+    def _to_frame(self, estimate, points):
+        # Estimates and points of the downsampled frames, in full-resolution coordinates.
+        if self.analysis_scale == 1:
+            return estimate, points
+        if estimate is not None:
+            estimate = scale_transform(estimate, 1 / self.analysis_scale)
+        return estimate, points / np.float32(self.analysis_scale)
+
+    def _calibrate(self, first_gray, points):
+        # The first frames are read ahead to size the LK window; they are returned as
+        # (frame, gray) pairs so that they can be tracked as usual afterwards.
+        lookahead = []
+        for _ in range(self.tracker.calibration_frames):
+            frame = self._read()
+            if frame is None:
+                break
+            with self.stats.timer("grayscale"):
+                lookahead.append((frame, self.grayscale.convert(frame)))
+        with self.stats.timer("calibrate"):
+            self.tracker.calibrate([first_gray] + [gray for _, gray in lookahead], points, self.factor)
+        return lookahead
+
+    def calibrate_tracker(self):
+        # Only sizes the LK window of an "auto" tracker, so that other pipelines (the chunks
+        # of the parallel mode) can share it. Returns (win_size, levels).
+        first_frame = self._open()
+        roi = self._tracking_roi()
+        self.tracker.prepare(roi, self.factor)
+        if self.tracker.needs_calibration:
+            gray = self.grayscale.convert(first_frame)
+            self._calibrate(gray, self.point_selector.select(gray, roi))
+        self.decoder.release()
+        return self.tracker.lk_params['winSize'][0], self.tracker.lk_params['maxLevel']
+
+    def _track(self, first_frame, recording=None):
+        roi = self._tracking_roi()
+        self.tracker.prepare(roi, self.factor)
+        self.motion_model.prepare(roi)
+
+        with self.stats.timer("grayscale"):
+            prev_gray = self.grayscale.convert(first_frame)
+        with self.stats.timer("select"):
+            points = self.point_selector.select(prev_gray, roi)
+        self.motion_model.rebase(points)
+        # Where the current points were selected, to find the ROI again when re-detecting, and
+        # how many were selected: lost points are dropped from origin as they go.
+        origin, origin_roi = points, roi
+        selected = len(points)
+        last_estimate = None
+        current_frame = 0
+        if recording is not None:
+            recording.append((np.eye(3), not self.motion_model.absolute, self._to_frame(None, points)[1], np.ones((len(points), 1), dtype=np.uint8)))
+
+        lookahead = self._calibrate(prev_gray, points) if self.tracker.needs_calibration else []
+        lookahead.reverse()
+
+        while True:
+            if lookahead:
+                frame, gray = lookahead.pop()
+            else:
+                frame = self._read()
+                if frame is None:
+                    return
+                with self.stats.timer("grayscale"):
+                    gray = self.grayscale.convert(frame)
+            current_frame += 1
+
+            win_size = self.tracker.lk_params['winSize']
+            with self.stats.timer("track"):
+                new_points, status = self.tracker.track(prev_gray, gray, points)
+            if self.tracker.lk_params['winSize'] != win_size:
+                self.stats.event("lk window grown" if self.tracker.lk_params['winSize'][0] > win_size[0] else "lk window shrunk")
+            with self.stats.timer("estimate"):
+                estimate = self.motion_model.estimate(points, new_points, status)
+            if estimate is None:
+                # Too few points tracked, or none of the RANSAC models fitted: the failure
+                # policy of the model takes over.
+                self.stats.event("tracking failure" if status.sum() < self.motion_model.min_points else "ransac fallback")
+            frame_estimate, frame_points = self._to_frame(estimate, new_points)
+            if recording is not None:
+                recording.append((frame_estimate if frame_estimate is not None else np.eye(3), frame_estimate is not None, frame_points, status))
+
+            yield current_frame, frame, frame_points, status, frame_estimate
+
+            self._recycle(prev_gray)
+            prev_gray = gray
+            if estimate is not None:
+                last_estimate = estimate
+            tracked = status.ravel() == 1
+            if self.point_selector.needs_redetect(tracked.sum(), selected):
+                # Too many points lost: add new ones where the ROI is now.
+                if tracked.any():
+                    shift = (new_points[tracked] - origin[tracked]).reshape(-1, 2).mean(axis=0)
+                    # Kept inside the frame, or the points would be selected where there is
+                    # nothing to track.
+                    origin_roi = fit_roi((origin_roi[0] + shift[0], origin_roi[1] + shift[1], origin_roi[2], origin_roi[3]), gray.shape)
+                    if origin_roi[2] == 0 or origin_roi[3] == 0:
+                        origin_roi = roi
+                self.stats.event("redetect")
+                with self.stats.timer("select"):
+                    points = self.point_selector.top_up(gray, origin_roi, new_points[tracked])
+                origin, selected = points, len(points)
+                self.motion_model.rebase(points, last_estimate)
+            elif estimate is not None or self.motion_model.failure_policy != "defer":
+                points = new_points
+                if not tracked.all():
+                    points, origin = points[tracked], origin[tracked]
+                    self.motion_model.rebase(points, estimate)
+
+    def _replay(self, trajectory):
+        # Same frames as _track, but the motion comes from a cached trajectory.
+        current_frame = 0
+        while current_frame + 1 < len(trajectory):
+            frame = self._read()
+            if frame is None:
+                return
+            current_frame += 1
+
+            estimate = trajectory.estimates[current_frame] if trajectory.valid[current_frame] else None
+            points = trajectory.points[current_frame] if trajectory.points is not None else ()
+            status = trajectory.status[current_frame] if trajectory.status is not None else ()
+            yield current_frame, frame, points, status, estimate
+
+    def _trajectory_from(self, recording):
+        estimates, valid, points, status = zip(*recording)
+        return Trajectory(np.array(estimates), np.array(valid), self.motion_model.absolute, list(points), list(status))
+
+    def _report(self, current_frame, frame_count):
+        if self.progress_callback is not None:
+            self.progress_callback(current_frame, frame_count)
+
+    def _offset_transform(self, transform):
+        if self.offset[0] == 0 and self.offset[1] == 0:
+            return transform
+        return translation_matrix(self.offset[0], self.offset[1]).dot(transform)
+
+    def _flush(self, frame_buffer, transform, new_points, current_frame, frame_count):
+        for frame_x in frame_buffer:
+            stabilized_frame = self._warp(frame_x, transform)
+            self._write(stabilized_frame)
+            if self.preview is not None:
+                with self.stats.timer("preview"):
+                    self.preview.show(frame_x, stabilized_frame, new_points, current_frame/frame_count)
+            self._report(current_frame, frame_count)
+            self._recycle(frame_x)
+
+    def _finish(self):
+        self.decoder.release()
+        self.encoder.release()
+        if self.preview is not None:
+            self.preview.close()
+
+    def run(self):
+        first_frame = self._open()
+
+        frame_count = self.decoder.frame_count
+        self._open_encoder((first_frame.shape[1], first_frame.shape[0]))
+
+        key, trajectory = self._cached_trajectory()
+        recording = None
+        if trajectory is not None:
+            frames = self._replay(trajectory)
+        else:
+            recording = []
+            frames = self._track(first_frame, recording)
+
+        frame_buffer = [first_frame]
+        transform = np.eye(3)
+        current_frame, new_points = 0, ()
+
+        for current_frame, frame, new_points, status, estimate in frames:
+            frame_buffer.append(frame)
+
+            if estimate is not None:
+                transform = self._offset_transform(self.smoother.apply(estimate))
+            elif self.motion_model.failure_policy == "defer":
+                # Written with the next good estimate; counted as a tracking failure.
+                if not self._poll():
+                    self.cancelled = True
+                    break
+                continue
+
+            self._flush(frame_buffer, transform, new_points, current_frame, frame_count)
+            frame_buffer = []
+
+            if not self._poll():
+                self.cancelled = True
+                break
+
+        if not self.cancelled:
+            # Frames still deferred when the video ends get the last transform.
+            self._flush(frame_buffer, transform, new_points, current_frame, frame_count)
+        self._finish()
+        if recording is not None:
+            self.trajectory = self._trajectory_from(recording)
+            if key is not None and not self.cancelled:
+                self.cache.store(key, self.trajectory)
+        else:
+            self.trajectory = trajectory
+        return True
+
+    # Two-pass mode: analyze() only tracks and returns the per-frame trajectory,
+    # render() decodes the video once more and warps every frame with the given transforms.
+
+    def analyze(self, report_scale=1):
+        key, trajectory = self._cached_trajectory()
+        if trajectory is not None:
+            self.trajectory = trajectory
+            return trajectory
+
+        first_frame = self._open()
+
+        frame_count = self.decoder.frame_count
+        recording = []
+        for current_frame, frame, new_points, status, estimate in self._track(first_frame, recording):
+            self._report(current_frame, frame_count * report_scale)
+            self._recycle(frame)
+            if self._cancel_requested():
+                self.cancelled = True
+                break
+
+        self.decoder.release()
+        trajectory = self._trajectory_from(recording)
+        if key is not None and not self.cancelled:
+            self.cache.store(key, trajectory)
+        self.trajectory = trajectory
+        return trajectory
+
+    def render(self, transforms, report_offset=0, report_scale=1, size=None):
+        # size is the size of the output frames, the frame size by default.
+        frame = self._open()
+
+        frame_count = self.decoder.frame_count
+        self._open_encoder(size if size is not None else (frame.shape[1], frame.shape[0]))
+
+        current_frame = 0
+        while frame is not None and current_frame < len(transforms):
+            stabilized_frame = self._warp(frame, transforms[current_frame], size)
+            self._write(stabilized_frame)
+            if self.preview is not None:
+                with self.stats.timer("preview"):
+                    self.preview.show(frame, stabilized_frame, (), current_frame/frame_count)
+            if not self._poll():
+                self.cancelled = True
+                break
+            self._report(report_offset + current_frame, frame_count * report_scale)
+
+            self._recycle(frame)
+            frame = self._read()
+            current_frame += 1
+
+        self._finish()
+        return True
+
+    def run_two_pass(self, smoothing='moving_average', window_size=30, crop=False, output_size=None):
+        trajectory = self.analyze(report_scale=2)
+        if self.cancelled:
+            return trajectory
+        transforms = trajectory.corrections(smoothing, window_size, self.offset)
+        size = None
+        if crop or output_size is not None:
+            transforms, size = fit_output(transforms, self._frame_size(), crop, output_size)
+        self.render(transforms, report_offset=len(trajectory), report_scale=2, size=size)
+        return trajectory
+
+    # Live mode: the decoder is a LatestFrameDecoder and the encoder a DroppingEncoder (see
+    # streaming.py). Every frame is held until `lookahead` later frames have been tracked,
+    # then warped with the camera path of a causal smoother (smoothing.py) that has seen
+    # those frames too. A frame that is already older than max_latency seconds by then is
+    # dropped instead of warped, so that the loop catches up.
+
+    def run_live(self, smoother, lookahead=0, max_latency=None, latency=None, max_frames=None):
+        first_frame = self._open()
+        self._open_encoder((first_frame.shape[1], first_frame.shape[0]))
+        latency = latency if latency is not None else LatencyStats()
+
+        smoother.reset()
+        path = np.eye(3)
+        smoothed = smoother.update(path)
+        waiting = deque([(first_frame, self.decoder.timestamp, path, ())])
+        frames = self._track(first_frame)
+        try:
+            if lookahead == 0 and not self._emit_live(waiting.popleft(), smoothed, max_latency, latency):
+                return True
+            for current_frame, frame, new_points, status, estimate in frames:
+                if estimate is not None:
+                    path = estimate if self.motion_model.absolute else estimate.dot(path)
+                waiting.append((frame, self.decoder.timestamp, path, new_points))
+                smoothed = smoother.update(path)
+                if len(waiting) > lookahead and not self._emit_live(waiting.popleft(), smoothed, max_latency, latency):
+                    return True
+                if max_frames is not None and current_frame + 1 >= max_frames:
+                    break
+            # End of the stream: the last frames have no more lookahead.
+            while waiting:
+                if not self._emit_live(waiting.popleft(), smoothed, max_latency, latency):
+                    break
+        finally:
+            frames.close()
+            self._finish()
+        return True
+
+    def _emit_live(self, waiting, smoothed, max_latency, latency):
+        frame, timestamp, path, points = waiting
+        if max_latency is not None and time.perf_counter() - timestamp > max_latency:
+            latency.drop("late")
+            return True
+        stabilized_frame = self._warp(frame, self._offset_transform(smoothed.dot(np.linalg.inv(path))))
+        self._write(stabilized_frame)
+        latency.add(time.perf_counter() - timestamp)
+        if self.preview is not None:
+            with self.stats.timer("preview"):
+                self.preview.show(frame, stabilized_frame, points, 0)
+            if not self._poll():
+                self.cancelled = True
+                return False
+        return True
+
+
+STABILIZATION_TYPES = ['local', 'global', 'perspective']
+
+def build_pipeline(stabilization_type, decoder, encoder, lkparams, roi=None, factor=4, offset=(0, 0), preview=False, window='auto', win_size=DEFAULT_WIN_SIZE, calibration_frames=CALIBRATION_FRAMES, points='grid', budget=None, analysis_scale=1.0, interpolation='linear', border='constant', **kwargs):
+    if stabilization_type not in STABILIZATION_TYPES:
+        raise ValueError(f"Unknown stabilization type: {stabilization_type}")
+    if not 0 < analysis_scale <= 1:
+        raise ValueError(f"Analysis scale must be in (0, 1]: {analysis_scale}")
+
+    if stabilization_type == 'perspective':
+        motion_model, smoother, delay = HomographyModel(), HomographyEMASmoother(alpha=0.2), 1
+        warper = PerspectiveWarper(interpolation, border)
+    else:
+        motion_model, smoother, warper, delay = TranslationModel(), TranslationLockSmoother(), TranslationWarper(interpolation, border), 30
+
+    return StabilizationPipeline(
+        decoder,
+        encoder,
+        LKTracker(lkparams[0], lkparams[1], lkparams[2], window, win_size, calibration_frames),
+        motion_model,
+        roi=tuple(roi) if roi is not None else None,
+        factor=factor,
+        smoother=smoother,
+        warper=warper,
+        offset=offset,
+        preview=PreviewWindow(delay) if preview else None,
+        point_selector=PointSelector(points, budget, factor),
+        analysis_scale=analysis_scale,
+        **kwargs
+    )
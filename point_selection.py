@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+
+# Choice of the points tracked inside the ROI.
+#
+# "grid" is the original uniform (factor-1)^2 grid, which puts many points on flat areas
+# where they fail or drift. "gftt" (good features to track) and "fast" pick the strongest
+# corners of the ROI, "bucketed" the strongest corner of every cell of the same grid, so
+# the points stay spread over the ROI. The number of points is capped by the budget,
+# (factor-1)^2 unless given. Any method falls back to the grid on a ROI without corners.
+# The grid stays the default: over a whole frame the strongest corners are often on the
+# moving subject rather than on the background.
+
+SELECTION_METHODS = ['gftt', 'bucketed', 'fast', 'grid']
+
+def initialize_points(_points, _factor = 4):
+    points = []
+    x,y,w,h = _points
+    step_x, step_y = w // _factor, h // _factor
+    for i in range(1, _factor):
+        for j in range(1, _factor):
+            points.append((x + i * step_x, y + j * step_y))
+    return np.array(points, dtype=np.float32).reshape(-1, 1, 2)
+
+def clip_roi(roi, shape):
+    x, y, w, h = (int(round(v)) for v in roi)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, shape[1]), min(y + h, shape[0])
+    return x0, y0, max(x1 - x0, 0), max(y1 - y0, 0)
+
+def fit_roi(roi, shape):
+    # Moves the ROI back inside the frame, keeping its size, and clips what still does not fit.
+    x, y, w, h = roi
+    x = min(max(x, 0), shape[1] - w)
+    y = min(max(y, 0), shape[0] - h)
+    return clip_roi((x, y, w, h), shape)
+
+def good_features(gray, roi, budget, quality=0.01):
+    x, y, w, h = roi
+    min_distance = max(int(np.sqrt(w * h / budget) / 2), 3)
+    corners = cv2.goodFeaturesToTrack(gray[y:y + h, x:x + w], maxCorners=budget, qualityLevel=quality, minDistance=min_distance)
+    if corners is None:
+        return np.empty((0, 2), dtype=np.float32)
+    return corners.reshape(-1, 2) + (x, y)
+
+def fast_features(gray, roi, budget, threshold=20):
+    x, y, w, h = roi
+    keypoints = cv2.FastFeatureDetector_create(threshold, nonmaxSuppression=True).detect(gray[y:y + h, x:x + w])
+    keypoints = sorted(keypoints, key=lambda keypoint: -keypoint.response)[:budget]
+    return np.array([keypoint.pt for keypoint in keypoints], dtype=np.float32).reshape(-1, 2) + (x, y)
+
+def bucketed_features(gray, roi, budget, buckets, quality=0.01):
+    x, y, w, h = roi
+    response = cv2.cornerMinEigenVal(gray[y:y + h, x:x + w], blockSize=3)
+    threshold = quality * response.max()
+    per_bucket = max(budget // (buckets * buckets), 1)
+    points = []
+    for i in range(buckets):
+        for j in range(buckets):
+            x0, x1 = w * i // buckets, w * (i + 1) // buckets
+            y0, y1 = h * j // buckets, h * (j + 1) // buckets
+            cell = response[y0:y1, x0:x1]
+            if cell.size == 0:
+                continue
+            strongest = np.argsort(cell, axis=None)[::-1][:per_bucket]
+            for index in strongest:
+                cy, cx = np.unravel_index(index, cell.shape)
+                # Flat cells get no point rather than a poor one.
+                if cell[cy, cx] > threshold:
+                    points.append((x + x0 + cx, y + y0 + cy))
+    return np.array(points, dtype=np.float32).reshape(-1, 2)[:budget]
+
+class PointSelector:
+    def __init__(self, method='grid', budget=None, factor=4, redetect_ratio=0.5, min_points=4):
+        if method not in SELECTION_METHODS:
+            raise ValueError(f"Unknown point selection method: {method}")
+        self.method = method
+        self.budget = budget if budget is not None else max((factor - 1) ** 2, 1)
+        self.factor = factor
+        self.redetect_ratio = redetect_ratio
+        self.min_points = min_points
+
+    def select(self, gray, roi):
+        clipped = clip_roi(roi, gray.shape)
+        if clipped[2] > 0 and clipped[3] > 0:
+            if self.method != 'grid':
+                if self.method == 'gftt':
+                    points = good_features(gray, clipped, self.budget)
+                elif self.method == 'fast':
+                    points = fast_features(gray, clipped, self.budget)
+                else:
+                    points = bucketed_features(gray, clipped, self.budget, max(self.factor - 1, 1))
+                if len(points) >= self.min_points:
+                    return np.float32(points).reshape(-1, 1, 2)
+            roi = clipped
+        return initialize_points(roi, self.factor)
+
+    def top_up(self, gray, roi, points):
+        # Keeps the points that are still tracked and adds new ones, away from them, up to
+        # the budget. Selecting them all again moves every point at once, often onto a
+        # moving subject, and each of those jumps shows in the estimate.
+        kept = points.reshape(-1, 2)
+        kept = kept[(kept >= 0).all(axis=1) & (kept[:, 0] < gray.shape[1]) & (kept[:, 1] < gray.shape[0])]
+        x, y, w, h = clip_roi(roi, gray.shape)
+        spacing = max(np.sqrt(w * h / self.budget) / 2, 3)
+        added = []
+        for candidate in self.select(gray, roi).reshape(-1, 2):
+            if len(kept) + len(added) >= self.budget:
+                break
+            if len(kept) == 0 or np.min(np.linalg.norm(kept - candidate, axis=1)) >= spacing:
+                added.append(candidate)
+        return np.float32(np.concatenate([kept, np.float32(added).reshape(-1, 2)])).reshape(-1, 1, 2)
+
+    def needs_redetect(self, tracked, selected):
+        # Points are selected again once too many of them are lost.
+        return tracked < max(self.min_points, self.redetect_ratio * selected)
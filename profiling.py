@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import threading
+from array import array
+
+import numpy as np
+
+from streaming import StageStats
+
+# Detailed profile of a stabilization. On top of the totals of StageStats it keeps the
+# duration of every call of every stage (one per frame for most of them), for the
+# percentiles and histograms of the per-frame times, and with trace=True a timeline of the
+# calls and events of every thread, saved in the Chrome trace format (chrome://tracing or
+# ui.perfetto.dev). It is only used when asked for: by default the pipeline times its stages
+# with a StageStats, which only sums the durations.
+
+HISTOGRAM_BINS = 20
+
+class Profiler(StageStats):
+    def __init__(self, trace=False):
+        super().__init__()
+        self.samples = {}
+        self.trace = [] if trace else None
+        self.threads = {}
+        self.origin = time.perf_counter()
+
+    def add(self, stage, seconds, count=1):
+        end = time.perf_counter()
+        super().add(stage, seconds, count)
+        with self.lock:
+            self.samples.setdefault(stage, array('d')).append(seconds / count)
+            if self.trace is not None:
+                self._record(stage, 'X', end - seconds, seconds)
+
+    def event(self, name, count=1):
+        super().event(name, count)
+        if self.trace is not None:
+            with self.lock:
+                self._record(name, 'i', time.perf_counter(), 0)
+
+    def _record(self, name, phase, start, seconds):
+        thread = threading.current_thread()
+        self.threads[thread.ident] = thread.name
+        self.trace.append((name, phase, start, seconds, thread.ident))
+
+    def summary(self, bins=HISTOGRAM_BINS):
+        summary = super().summary()
+        with self.lock:
+            samples = {stage: np.array(values) * 1000 for stage, values in self.samples.items()}
+        for stage, times in samples.items():
+            if times.min() > 0 and times.max() > times.min():
+                # Logarithmic bins: the slow frames are orders of magnitude above the median.
+                counts, edges = np.histogram(times, np.geomspace(times.min(), times.max(), bins + 1))
+            else:
+                counts, edges = np.histogram(times, bins)
+            summary['stages'][stage].update({
+                'mean_ms': float(times.mean()),
+                'p50_ms': float(np.percentile(times, 50)),
+                'p95_ms': float(np.percentile(times, 95)),
+                'p99_ms': float(np.percentile(times, 99)),
+                'max_ms': float(times.max()),
+                'histogram': {'edges_ms': edges.tolist(), 'counts': counts.tolist()}
+            })
+        return summary
+
+    def report(self):
+        summary = self.summary()
+        lines = [f"{'stage':<14}{'frames':>8}{'time (s)':>10}{'fps':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'max (ms)':>10}"]
+        for stage, stage_summary in summary['stages'].items():
+            lines.append(f"{stage:<14}{stage_summary['frames']:>8}{stage_summary['seconds']:>10.2f}{stage_summary['fps']:>10.1f}"
+                         f"{stage_summary['p50_ms']:>10.2f}{stage_summary['p95_ms']:>10.2f}{stage_summary['max_ms']:>10.2f}")
+        return "\n".join(lines + self._event_lines())
+
+    def save_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def save_trace(self, path):
+        if self.trace is None:
+            raise ValueError("The profiler was created without trace=True")
+        pid = os.getpid()
+        with self.lock:
+            records = list(self.trace)
+            threads = dict(self.threads)
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}} for tid, name in threads.items()]
+        for name, phase, start, seconds, tid in records:
+            event = {'name': name, 'ph': phase, 'ts': (start - self.origin) * 1e6, 'pid': pid, 'tid': tid}
+            if phase == 'X':
+                event['dur'] = seconds * 1e6
+            else:
+                event['s'] = 't'
+            events.append(event)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
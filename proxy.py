@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import cv2
+
+from pipeline import VideoDecoder, VideoEncoder
+from results import VideoOpenError
+
+# Low-resolution copies of the input for tuning the parameters in the GUI. The proxy is
+# written in the background as soon as a video is loaded, and the previews are stabilized
+# on it (optionally on a range of frames only), so trying a new set of parameters takes
+# seconds; the full-resolution video is only stabilized on export. The proxy is MJPG: every
+# frame is a keyframe, so a preview range starts without decoding from an earlier keyframe.
+# Pixel parameters (ROI, max shifts) are given at full resolution and scaled to the proxy.
+
+PROXY_HEIGHT = 360
+
+def proxy_size(width, height, max_height=PROXY_HEIGHT):
+    # Even sizes, for the codecs that need them; videos smaller than max_height are kept.
+    scale = min(max_height / height, 1.0)
+    return max(int(round(width * scale / 2)) * 2, 2), max(int(round(height * scale / 2)) * 2, 2)
+
+def make_proxy(video_path, proxy_path, max_height=PROXY_HEIGHT, progress_callback=None, cancel=None):
+    # Returns the scale of the proxy to the input, or None if cancelled (cancel is a
+    # threading.Event).
+    decoder = VideoDecoder(video_path)
+    if not decoder.open():
+        raise VideoOpenError(f"Error opening video: {video_path}")
+    size = proxy_size(decoder.width, decoder.height, max_height)
+    encoder = VideoEncoder(proxy_path, 'MJPG')
+    try:
+        encoder.open(decoder.fps, size)
+        current_frame = 0
+        while True:
+            if cancel is not None and cancel.is_set():
+                return None
+            frame = decoder.read()
+            if frame is None:
+                break
+            encoder.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+            current_frame += 1
+            if progress_callback:
+                progress_callback(current_frame, decoder.frame_count)
+    finally:
+        decoder.release()
+        encoder.release()
+    return size[0] / decoder.width
+
+def scale_roi(roi, scale):
+    return [int(round(v * scale)) for v in roi] if roi is not None else None
+
+def scale_offset(offset, scale):
+    return tuple(int(round(v * scale)) for v in offset)
+
+class ProxyGenerator:
+    # Writes the proxy of video_path into a temporary directory on a background thread.
+    # path and scale are set once ready is set; error holds the exception if it failed.
+    # jobs are the preview jobs (jobs.py) writing into the same directory.
+    def __init__(self, video_path, max_height=PROXY_HEIGHT):
+        self.video_path = video_path
+        self.max_height = max_height
+        self.directory = tempfile.mkdtemp(prefix="proxy-")
+        self.path = None
+        self.scale = None
+        self.error = None
+        self.progress = 0.0
+        self.previews = 0
+        self.jobs = []
+        self.ready = threading.Event()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._generate, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _generate(self):
+        path = os.path.join(self.directory, "proxy.avi")
+        try:
+            scale = make_proxy(self.video_path, path, self.max_height, self._progress, self.cancelled)
+        except Exception as error:
+            self.error = error
+            return
+        if scale is not None:
+            self.path, self.scale = path, scale
+            self.ready.set()
+
+    def _progress(self, current_frame, frame_count):
+        self.progress = current_frame / frame_count if frame_count > 0 else 0.0
+
+    def output_path(self):
+        # A new file for every preview: the previous one may still be open in a player.
+        self.previews += 1
+        return os.path.join(self.directory, f"preview-{self.previews}.avi")
+
+    def cancel(self, manager):
+        # Stops the generation and the previews still queued or running on the proxy, through
+        # their JobManager. The files are only removed by poll(), once these have stopped.
+        self.cancelled.set()
+        for job in self.jobs:
+            if not job.finished:
+                manager.cancel(job)
+
+    def stopped(self):
+        return not self.thread.is_alive() and all(job.finished for job in self.jobs)
+
+    def poll(self):
+        # After cancel(), from the main loop of the GUI: removes the proxy and its previews
+        # once nothing writes into the directory anymore. Returns True once removed.
+        if not self.stopped():
+            return False
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return True
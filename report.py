@@ -5,7 +5,30 @@ from datetime import datetime
 import platform
 import cpuinfo
 
-def generate_report(parameters, _output_path = None):
+def run_report(result):
+    # Section of the report with the data of the run, from the StabilizationResult.
+    failed = result.failed_frames
+    failed_list = ", ".join(str(frame) for frame in failed[:20]) + (", ..." if len(failed) > 20 else "")
+    stage_rows = "".join(f"<tr><td>{stage}</td><td>{values['frames']}</td><td>{values['seconds']:.2f}</td><td>{values['fps']:.1f}</td></tr>"
+                         for stage, values in result.stats['stages'].items())
+    events = "".join(f"<li>{name}: {count}</li>" for name, count in result.stats['events'].items())
+    # No output video when the run was cancelled before rendering.
+    output = f"{result.output_size[0]}x{result.output_size[1]} at {result.output_fps:.3f} fps ({result.codec})" if result.output_size is not None else "n/a"
+    return f"""
+        <h2 class="section-header">Run</h2>
+        <div class='parameter-description'>
+            <p><strong>Status:</strong> {"Completed" if result.completed else "Stopped before the end of the video"}</p>
+            <p><strong>Frames Processed:</strong> {result.frames}</p>
+            <p><strong>Frames Where Tracking Failed:</strong> {len(failed)}{" (" + failed_list + ")" if failed else ""}</p>
+            <p><strong>Processing Time:</strong> {result.elapsed:.2f} s ({result.fps:.1f} fps)</p>
+            <p><strong>Output:</strong> {result.output_path}, {output}</p>
+            <h3>Time per Stage</h3>
+            <table><tr><th>Stage</th><th>Frames</th><th>Time (s)</th><th>FPS</th></tr>{stage_rows}</table>
+            {"<h3>Tracking Events</h3><ul>" + events + "</ul>" if events else ""}
+        </div>
+    """
+
+def generate_report(parameters, _output_path = None, result = None):
     
     stabilization_type = parameters['stabilization_type']
     max_shift_x = parameters['max_shift_x']
@@ -41,6 +64,8 @@ def generate_report(parameters, _output_path = None):
             h2, h3 {{ color: #34495E; }}
             .section-header {{ background-color: #E9ECEF; padding: 10px; border-radius: 5px; }}
             .parameter-description {{ margin-top: 15px; }}
+            table {{ border-collapse: collapse; }}
+            th, td {{ border: 1px solid #CED4DA; padding: 4px 10px; text-align: right; }}
             .footer {{ margin-top: 30px; text-align: center; font-size: 0.8em; color: #777; }}
         </style>
     </head>
@@ -73,6 +98,7 @@ def generate_report(parameters, _output_path = None):
         {"<div class='parameter-description'><h3>Count</h3><p><strong>Description:</strong> The number of iterations or the maximum number of samples considered during the analysis. A higher count can improve the quality of the final stabilization result by allowing more thorough analysis, but it also increases the processing time.</p><p><strong>Value:</strong> " + str(count) + "</p></div>" if count is not None else ""}
         {"<div class='parameter-description'><h3>Factor</h3><p><strong>Description:</strong> The `factor` parameter controls the density of points of interest used for the calculation of motion within the region of interest (ROI). A higher value indicates a larger number of points, which can improve the accuracy of motion estimation, but also increases the computational load. The optimal value of `factor` depends on the complexity of the video and the available computational resources.</p><p><strong>Value:</strong> " + str(factor) + "</p></div>" if factor is not None else ""}
 
+        {run_report(result) if result is not None else ""}
 
         <div class="footer">
             <p>This software is distributed as free software under the GPLv3 License, which allows modification and redistribution of the source code.</p>
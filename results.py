@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+# What the stabilizer functions return, and the errors they raise instead of printing them.
+# The command line and the GUI print the message of a StabilizationError, the batch runner
+# records its type along with the result of every job.
+
+class StabilizationError(Exception):
+    pass
+
+class VideoOpenError(StabilizationError):
+    # The input video or live source cannot be opened, or has no frames.
+    pass
+
+class EncoderError(StabilizationError):
+    # The stabilized video cannot be written.
+    pass
+
+class StabilizationResult:
+    def __init__(self, stabilization_type, video_path, output_path, trajectory, frames, cancelled, elapsed, stats, output_fps=0, output_size=None, codec=None):
+        self.stabilization_type = stabilization_type
+        self.video_path = video_path
+        self.output_path = output_path
+        # Trajectory of the tracked frames (trajectory.py), partial if cancelled.
+        self.trajectory = trajectory
+        # Frames written to the output.
+        self.frames = frames
+        # Stopped from the preview window before the end of the video.
+        self.cancelled = cancelled
+        self.elapsed = elapsed
+        # StageStats.summary(): time per stage and tracking events.
+        self.stats = stats
+        self.output_fps = output_fps
+        self.output_size = output_size
+        self.codec = codec
+
+    @property
+    def completed(self):
+        return not self.cancelled
+
+    @property
+    def fps(self):
+        return self.frames / self.elapsed if self.elapsed > 0 else 0
+
+    @property
+    def failed_frames(self):
+        # Frames without a motion estimate. The first frame has none by definition for the
+        # models that measure the displacement from it.
+        if self.trajectory is None or len(self.trajectory) == 0:
+            return []
+        valid = np.array(self.trajectory.valid, dtype=bool)
+        valid[0] = True
+        return np.flatnonzero(~valid).tolist()
+
+    def summary(self):
+        # Everything but the trajectory, as plain JSON types.
+        return {
+            'stabilization_type': self.stabilization_type,
+            'input': self.video_path,
+            'output': self.output_path,
+            'completed': self.completed,
+            'frames': self.frames,
+            'tracked_frames': len(self.trajectory) if self.trajectory is not None else 0,
+            'failed_frames': self.failed_frames,
+            'elapsed': self.elapsed,
+            'fps': self.fps,
+            'output_fps': self.output_fps,
+            'output_size': list(self.output_size) if self.output_size is not None else None,
+            'output_bytes': os.path.getsize(self.output_path) if self.frames > 0 and os.path.isfile(self.output_path) else 0,
+            'codec': self.codec,
+            'stats': self.stats
+        }
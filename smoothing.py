@@ -0,0 +1,88 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# Stateful smoothers: update() takes the newest value (a translation vector or a 3x3
+# homography) and returns the smoothed one in constant time and memory.
+# With normalize=True the result is rescaled so that its [2, 2] element is 1, as
+# needed for homographies.
+
+def normalize_homography(H):
+    return H / H[2, 2]
+
+class EMASmoother:
+    def __init__(self, alpha=0.2, initial=None, normalize=False):
+        self.alpha = alpha
+        self.initial = initial
+        self.normalize = normalize
+        self.reset()
+
+    def reset(self):
+        self.state = None if self.initial is None else np.array(self.initial, dtype=np.float64)
+
+    def update(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        if self.state is None:
+            self.state = value.copy()
+        else:
+            self.state = (1 - self.alpha) * self.state + self.alpha * value
+        if self.normalize:
+            self.state /= self.state[2, 2]
+        return self.state
+
+class SlidingWindowSmoother:
+    def __init__(self, window_size=30, normalize=False):
+        self.window_size = window_size
+        self.normalize = normalize
+        self.reset()
+
+    def reset(self):
+        self.window = deque()
+        self.total = None
+
+    def update(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        self.window.append(value)
+        self.total = value.copy() if self.total is None else self.total + value
+        if len(self.window) > self.window_size:
+            self.total -= self.window.popleft()
+        mean = self.total / len(self.window)
+        return normalize_homography(mean) if self.normalize else mean
+
+class OneEuroSmoother:
+    # One-euro filter: an EMA whose cutoff frequency grows with the speed of the signal,
+    # so slow drifts are smoothed hard while fast intentional moves keep little lag.
+    def __init__(self, min_cutoff=1.0, beta=0.0, d_cutoff=1.0, rate=30.0, normalize=False):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.rate = rate
+        self.normalize = normalize
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.derivative = None
+
+    def _alpha(self, cutoff):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau * self.rate)
+
+    def update(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        if self.state is None:
+            self.state = value.copy()
+            self.derivative = np.zeros_like(value)
+            return self.state
+
+        derivative = (value - self.state) * self.rate
+        d_alpha = self._alpha(self.d_cutoff)
+        self.derivative = (1 - d_alpha) * self.derivative + d_alpha * derivative
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.derivative)
+        alpha = self._alpha(cutoff)
+        self.state = (1 - alpha) * self.state + alpha * value
+        if self.normalize:
+            self.state /= self.state[2, 2]
+        return self.state
@@ -1,285 +1,85 @@
-import cv2
-import numpy as np
-
-def draw_progress_bar(image, progress, bar_height=15):
-    bar_width = image.shape[1]
-    bar_x = 0
-    bar_y = image.shape[0]
-
-    img_with_bar = np.zeros((image.shape[0] + bar_height, bar_width, 3), dtype=np.uint8)
-    img_with_bar[:image.shape[0], :] = image
-
-    cv2.rectangle(img_with_bar, (bar_x, bar_y), (bar_x + bar_width, bar_y + bar_height), (200, 200, 200), -1)
-    
-    completed_width = int(bar_width * progress)
-    cv2.rectangle(img_with_bar, (bar_x, bar_y), (bar_x + completed_width, bar_y + bar_height), (6, 176, 37), -1)
-    
-    return img_with_bar
-
-def initialize_points(_points, _factor = 4):
-    points = []
-    x,y,w,h = _points
-    step_x, step_y = w // _factor, h // _factor
-    for i in range(1, _factor):
-        for j in range(1, _factor):
-            points.append((x + i * step_x, y + j * step_y))
-    return np.array(points, dtype=np.float32).reshape(-1, 1, 2)
-
-def local_stabilizer_video(video_path, output_path, lkparams, roi, factor = 4):
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print("Error loading video")
-        return
-
-    ret, first_frame = cap.read()
-    if not ret:
-        print("Error loading first frame")
-        cap.release()
-        return
-
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-    frame_buffer = [first_frame.copy()]
-
-    x, y, w, h = roi
-    center_x = x + w // 2
-    center_y = y + h // 2
-
-    points_to_track = initialize_points(roi, factor)
-
-    lk_params = dict(winSize=(int(h*2), int(h*2)), maxLevel=lkparams[0], criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, lkparams[2], lkparams[1]))
-    prev_gray = cv2.cvtColor(first_frame, cv2.COLOR_BGR2GRAY)
-
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_path, fourcc, int(cap.get(cv2.CAP_PROP_FPS)), (first_frame.shape[1], first_frame.shape[0]))
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_buffer.append(frame)
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points_to_track, None, **lk_params)
-
-        if status.sum() >= 4:
-            valid_points = new_points[status == 1]
-            new_center_x = np.mean(valid_points[:, 0])
-            new_center_y = np.mean(valid_points[:, 1])
-
-            dx = center_x - new_center_x
-            dy = center_y - new_center_y
-
-            T = np.float32([[1, 0, dx], [0, 1, dy]])
-            for frame_x in frame_buffer:
-                s_frame = frame_x.copy()
-                for point in new_points:
-                    x, y = point.ravel()
-                    cv2.circle(frame_x, (int(x), int(y)), 3, (int(x), int(y), 0), -1)
-
-                stabilized_frame = cv2.warpAffine(s_frame, T, (frame.shape[1], frame.shape[0]))
-
-                out.write(stabilized_frame)
-                concatenated_frame = np.hstack((frame_x, stabilized_frame))
-                current_frame = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
-                cv2.imshow("Converting...", draw_progress_bar(concatenated_frame, current_frame/frame_count))
-
-            frame_buffer = []
-
-            prev_gray = gray.copy()
-            points_to_track = new_points
+import time
+
+from pipeline import (StabilizationPipeline, VideoDecoder, VideoEncoder, LKTracker, TranslationModel, HomographyModel,
+                      HomographyEMASmoother, AffineWarper, PerspectiveWarper, PreviewWindow, ProgressLogger,
+                      draw_progress_bar, initialize_points, exponential_moving_average, build_pipeline)
+from trajectory import moving_average_filter
+from parallel import parallel_stabilize, RangeDecoder
+from encoding import DEFAULT_PRESET, DEFAULT_CRF, make_encoder
+from streaming import StageStats
+from results import StabilizationResult, StabilizationError, VideoOpenError, EncoderError
+
+def stabilize_video(stabilization_type, video_path, output_path, lkparams, roi, factor, offset, preview, progress_callback,
+                    two_pass, smoothing, smoothing_window, cache, threaded, stats, workers=1, lk_window='auto', points='grid', budget=None, analysis_scale=1.0,
+                    interpolation='linear', border='constant', codec='XVID', preset=DEFAULT_PRESET, crf=DEFAULT_CRF, bitrate=None, crop=False, output_size=None,
+                    frame_range=None, cancel=None):
+    # Returns a StabilizationResult, raises a StabilizationError (results.py) on failure.
+    # Pass a profiling.Profiler as stats for per-frame times. frame_range (start, end) only
+    # stabilizes those frames, end excluded or None for the end of the video, in one process;
+    # the ROI is then on the first frame of the range. Setting the threading.Event cancel
+    # stops the stabilization like q in the preview window (not with several workers).
+    label = stabilization_type.title() + " stabilization"
+    stats = stats if stats is not None else StageStats()
+    if progress_callback is None and not preview:
+        progress_callback = ProgressLogger(label)
+
+    start = time.perf_counter()
+    if workers > 1 and frame_range is None:
+        # Only used by global stabilization: the ROI of the other types is only known on the
+        # first frame, so later chunks could not re-seed their points. The parallel mode
+        # always renders from the analyzed trajectory; without two_pass the frame is locked
+        # in place like in the single-pass mode.
+        trajectory = parallel_stabilize(stabilization_type, video_path, output_path, lkparams, roi, factor, offset, workers,
+                                        smoothing=smoothing if two_pass else 'none', smoothing_window=smoothing_window,
+                                        cache=cache, progress_callback=progress_callback, window=lk_window, points=points, budget=budget,
+                                        analysis_scale=analysis_scale, interpolation=interpolation, border=border,
+                                        codec=codec, preset=preset, crf=crf, bitrate=bitrate, crop=crop, output_size=output_size, stats=stats)
+        frames, cancelled = len(trajectory), False
+    else:
+        decoder = RangeDecoder(video_path, *frame_range) if frame_range is not None else VideoDecoder(video_path)
+        pipeline = build_pipeline(stabilization_type, decoder, make_encoder(output_path, codec, preset, crf, bitrate), lkparams, roi, factor, offset, preview,
+                                  progress_callback=progress_callback, cache=cache, threaded=threaded, stats=stats, window=lk_window,
+                                  points=points, budget=budget, analysis_scale=analysis_scale, interpolation=interpolation, border=border, cancel=cancel,
+                                  frame_range=frame_range)
+        if two_pass or crop or output_size is not None:
+            # The crop window needs the whole trajectory: without two_pass the frames are
+            # locked in place, like in the parallel mode.
+            pipeline.run_two_pass(smoothing if two_pass else 'none', smoothing_window, crop, output_size)
         else:
-            print("Error in point tracking")
-            prev_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        if cv2.waitKey(30) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    out.release()
-    cv2.destroyAllWindows()
-    print("Local stabilization completed and video saved in:", output_path)
-
-
-def global_stabilizer_video(video_path, output_path, lkparams, max_shift_x, max_shift_y, factor = 4):
-    global rect
-    rect = (0, 0, 0, 0)
-
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print("Error loading video")
-        return
-
-    ret, first_frame = cap.read()
-    if not ret:
-        print("Error loading first frame")
-        cap.release()
-        return
-
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-    x, y = (0,0)
-    center_x = x + w // 2
-    center_y = y + h // 2
-
-    points_to_track = initialize_points((x,y,w,h), factor)
-
-    lk_params = dict(winSize=(int(h*2), int(h*2)), maxLevel=lkparams[0], criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, lkparams[2], lkparams[1]))
-    prev_gray = cv2.cvtColor(first_frame, cv2.COLOR_BGR2GRAY)
-
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_path, fourcc, int(cap.get(cv2.CAP_PROP_FPS)), (first_frame.shape[1], first_frame.shape[0]))
-
-    frame_buffer = [first_frame.copy()]
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_buffer.append(frame)
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points_to_track, None, **lk_params)
-
-        if status.sum() >= 4:
-            valid_points = new_points[status == 1]
-            new_center_x = np.mean(valid_points[:, 0])
-            new_center_y = np.mean(valid_points[:, 1])
-
-            dx = center_x - new_center_x
-            dy = center_y - new_center_y
-
-            T = np.float32([[1, 0, dx+max_shift_x], [0, 1, dy+max_shift_y]])
-            for frame_x in frame_buffer:
-                s_frame = frame_x.copy()
-                for point in new_points:
-                    x, y = point.ravel()
-                    cv2.circle(frame_x, (int(x), int(y)), 3, (int(x), int(y), 0), -1)
-
-                stabilized_frame = cv2.warpAffine(s_frame, T, (frame.shape[1], frame.shape[0]))
-
-                out.write(stabilized_frame)
-                concatenated_frame = np.hstack((frame_x, stabilized_frame))
-                current_frame = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
-                cv2.imshow("Converting...", draw_progress_bar(concatenated_frame, current_frame/frame_count))
-
-            frame_buffer = []
-
-            prev_gray = gray.copy()
-            points_to_track = new_points
-        else:
-            print("Error in point tracking")
-            prev_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        if cv2.waitKey(30) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    out.release()
-    cv2.destroyAllWindows()
-    print("Global stabilization completed and video saved in:", output_path)
-
-
-def moving_average_filter(transformations, window_size=5):
-    averaged_transformations = []
-    for i in range(len(transformations)):
-        if i < window_size:
-            avg = np.mean(transformations[:i+1], axis=0)
-        else:
-            avg = np.mean(transformations[i-window_size+1:i+1], axis=0)
-        averaged_transformations.append(avg)
-    return averaged_transformations
-
-def exponential_moving_average(H_list, alpha=0.2):
-    smoothed_H = np.eye(3)
-    for H in H_list:
-        smoothed_H = (1 - alpha) * smoothed_H + alpha * H
-        smoothed_H /= smoothed_H[2, 2]
-    return smoothed_H
-
-def perspective_stabilizer_video(video_path, output_path, lkparams, roi, factor = 4):
-    cap = cv2.VideoCapture(video_path)
-
-    if not cap.isOpened():
-        print("Error opening video")
-        return
-
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    frame_rate = int(cap.get(cv2.CAP_PROP_FPS))
-    
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_path, fourcc, frame_rate, (frame_width, frame_height))
-    
-    ret, prev_frame = cap.read()
-    if not ret:
-        print("Error when reading the first frame")
-        return
-
-    frame_buffer = [prev_frame.copy()]
-    
-    x, y, w, h = roi
-    prev_pts = initialize_points((x,y,w,h), factor)
-    
-    lk_params = dict(winSize=(int(h*2), int(h*2)), maxLevel=lkparams[0], criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, lkparams[2], lkparams[1]))
-    prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-    
-    H_matrices = []
-    smoothed_H = np.eye(3)
-    H = np.eye(3)
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_buffer.append(frame.copy())
-        
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        if prev_pts is not None:
-            curr_pts, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, gray, prev_pts, None, **lk_params)
-        
-            valid_prev_pts = prev_pts[status == 1]
-            valid_curr_pts = curr_pts[status == 1]
-            
-            if len(valid_prev_pts) >= 4 and len(valid_curr_pts) >= 4:
-                H_new, _ = cv2.findHomography(valid_prev_pts, valid_curr_pts, cv2.RANSAC)
-                
-                if H_new is not None:
-                    H_matrices.append(H_new)
-                    smoothed_H = exponential_moving_average(H_matrices, alpha=0.2)
-                    H = smoothed_H.dot(H)
-        
-        for frame_x in frame_buffer:
-            s_frame = frame_x.copy()
-            for point in curr_pts:
-                c_x, c_y = point.ravel()
-                cv2.circle(frame_x, (int(c_x), int(c_y)), 3, (int(c_x), int(c_y), 0), -1)
-
-            stabilized_frame = cv2.warpPerspective(s_frame, H, (s_frame.shape[1], s_frame.shape[0]))
-
-            out.write(stabilized_frame)
-            concatenated_frame = np.hstack((frame_x, stabilized_frame))
-            current_frame = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
-            cv2.imshow("Converting...", draw_progress_bar(concatenated_frame, current_frame/frame_count))
-
-        frame_buffer = []
-        
-        prev_gray = gray.copy()
-        prev_pts = curr_pts
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    out.release()
-    cv2.destroyAllWindows()
-    print("Perspective stabilization completed and video saved in:", output_path)
\ No newline at end of file
+            pipeline.run()
+        trajectory, frames, cancelled = pipeline.trajectory, pipeline.frames_written, pipeline.cancelled
+    elapsed = time.perf_counter() - start
+
+    # The output metadata is read back from the written file. Without any frame written (e.g.
+    # cancelled during the analysis), a file found there is from an earlier run.
+    output = VideoDecoder(output_path)
+    if frames > 0 and output.open():
+        output.release()
+    elif not cancelled:
+        raise EncoderError(f"No output written: {output_path}")
+
+    if cancelled:
+        print(label + f" stopped after {frames} frames, video saved in:", output_path)
+    else:
+        print(label + " completed and video saved in:", output_path)
+    return StabilizationResult(stabilization_type, video_path, output_path, trajectory, frames, cancelled, elapsed, stats.summary(),
+                               output.fps, (output.width, output.height) if output.width > 0 else None, codec)
+
+def local_stabilizer_video(video_path, output_path, lkparams, roi, factor = 4, preview = True, progress_callback = None, two_pass = False, smoothing = 'moving_average', smoothing_window = 30, cache = None, threaded = False, stats = None, lk_window = 'auto', points = 'grid', budget = None, analysis_scale = 1.0, interpolation = 'linear', border = 'constant', codec = 'XVID', preset = DEFAULT_PRESET, crf = DEFAULT_CRF, bitrate = None, crop = False, output_size = None, frame_range = None, cancel = None):
+    return stabilize_video('local', video_path, output_path, lkparams, roi, factor, (0, 0), preview, progress_callback,
+                    two_pass, smoothing, smoothing_window, cache, threaded, stats, lk_window=lk_window, points=points, budget=budget,
+                    analysis_scale=analysis_scale, interpolation=interpolation, border=border, codec=codec, preset=preset, crf=crf, bitrate=bitrate,
+                    crop=crop, output_size=output_size, frame_range=frame_range, cancel=cancel)
+
+
+def global_stabilizer_video(video_path, output_path, lkparams, max_shift_x, max_shift_y, factor = 4, preview = True, progress_callback = None, two_pass = False, smoothing = 'moving_average', smoothing_window = 30, cache = None, threaded = False, stats = None, workers = 1, lk_window = 'auto', points = 'grid', budget = None, analysis_scale = 1.0, interpolation = 'linear', border = 'constant', codec = 'XVID', preset = DEFAULT_PRESET, crf = DEFAULT_CRF, bitrate = None, crop = False, output_size = None, frame_range = None, cancel = None):
+    return stabilize_video('global', video_path, output_path, lkparams, None, factor, (max_shift_x, max_shift_y), preview, progress_callback,
+                    two_pass, smoothing, smoothing_window, cache, threaded, stats, workers, lk_window, points, budget, analysis_scale,
+                    interpolation, border, codec, preset, crf, bitrate, crop, output_size, frame_range, cancel)
+
+
+def perspective_stabilizer_video(video_path, output_path, lkparams, roi, factor = 4, preview = True, progress_callback = None, two_pass = False, smoothing = 'moving_average', smoothing_window = 30, cache = None, threaded = False, stats = None, lk_window = 'auto', points = 'grid', budget = None, analysis_scale = 1.0, interpolation = 'linear', border = 'constant', codec = 'XVID', preset = DEFAULT_PRESET, crf = DEFAULT_CRF, bitrate = None, crop = False, output_size = None, frame_range = None, cancel = None):
+    return stabilize_video('perspective', video_path, output_path, lkparams, roi, factor, (0, 0), preview, progress_callback,
+                    two_pass, smoothing, smoothing_window, cache, threaded, stats, lk_window=lk_window, points=points, budget=budget,
+                    analysis_scale=analysis_scale, interpolation=interpolation, border=border, codec=codec, preset=preset, crf=crf, bitrate=bitrate,
+                    crop=crop, output_size=output_size, frame_range=frame_range, cancel=cancel)
@@ -0,0 +1,283 @@
+import time
+import queue
+import threading
+
+import numpy as np
+
+class StageStats:
+    # Busy time and frame count per pipeline stage, and counts of the tracking events
+    # (failures, re-detections...). Worker threads report here too, so it is safe to share
+    # between threads.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.times = {}
+        self.counts = {}
+        self.events = {}
+
+    def add(self, stage, seconds, count=1):
+        with self.lock:
+            self.times[stage] = self.times.get(stage, 0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def event(self, name, count=1):
+        with self.lock:
+            self.events[name] = self.events.get(name, 0) + count
+
+    def timer(self, stage):
+        return StageTimer(self, stage)
+
+    def fps(self, stage):
+        seconds = self.times.get(stage, 0)
+        return self.counts.get(stage, 0) / seconds if seconds > 0 else 0
+
+    def summary(self):
+        with self.lock:
+            return {
+                'stages': {stage: {'frames': self.counts[stage], 'seconds': self.times[stage], 'fps': self.fps(stage)} for stage in self.times},
+                'events': dict(self.events)
+            }
+
+    def report(self):
+        lines = [f"{'stage':<14}{'frames':>8}{'time (s)':>10}{'fps':>10}"]
+        for stage in self.times:
+            lines.append(f"{stage:<14}{self.counts[stage]:>8}{self.times[stage]:>10.2f}{self.fps(stage):>10.1f}")
+        return "\n".join(lines + self._event_lines())
+
+    def _event_lines(self):
+        if not self.events:
+            return []
+        return ["", f"{'event':<18}{'count':>8}"] + [f"{name:<18}{count:>8}" for name, count in self.events.items()]
+
+class LatencyStats:
+    # Capture-to-output latency of every frame written in the live mode, and the frames
+    # dropped on the way, by reason. Shared with the capture and output threads.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.drops = {}
+
+    def add(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def drop(self, reason, count=1):
+        with self.lock:
+            self.drops[reason] = self.drops.get(reason, 0) + count
+
+    def percentile(self, q):
+        with self.lock:
+            return float(np.percentile(self.latencies, q)) if self.latencies else 0.0
+
+    def report(self):
+        lines = [f"{'frames':<14}{len(self.latencies):>8}"]
+        for q in (50, 95, 99):
+            lines.append(f"{f'p{q} (ms)':<14}{self.percentile(q) * 1000:>8.1f}")
+        lines.append(f"{'max (ms)':<14}{self.percentile(100) * 1000:>8.1f}")
+        for reason, count in self.drops.items():
+            lines.append(f"{'dropped ' + reason:<14}{count:>8}")
+        return "\n".join(lines)
+
+class StageTimer:
+    __slots__ = ('stats', 'stage', 'start')
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.add(self.stage, time.perf_counter() - self.start)
+
+
+# Decoder and encoder wrappers running the wrapped stage on its own thread. They are
+# connected to the processing loop by bounded queues, so at most queue_size frames are
+# held in memory on each side. The time the processing loop spends blocked on them is
+# reported as "decode wait"/"encode wait".
+
+class ThreadedDecoder:
+    stage_name = "decode wait"
+
+    def __init__(self, decoder, queue_size=8, stats=None):
+        self.decoder = decoder
+        self.queue_size = queue_size
+        self.stats = stats
+        self.queue = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.finished = False
+
+    @property
+    def video_path(self):
+        return self.decoder.video_path
+
+    @property
+    def frame_count(self):
+        return self.decoder.frame_count
+
+    @property
+    def fps(self):
+        return self.decoder.fps
+
+    @property
+    def width(self):
+        return self.decoder.width
+
+    @property
+    def height(self):
+        return self.decoder.height
+
+    def open(self):
+        if not self.decoder.open():
+            return False
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.stop_event.clear()
+        self.finished = False
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        return True
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            frame = self.decoder.read()
+            if frame is not None and self.stats is not None:
+                self.stats.add("decode", time.perf_counter() - start)
+            if not self._put(frame) or frame is None:
+                return
+
+    def _put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(self):
+        if self.finished:
+            return None
+        frame = self.queue.get()
+        if frame is None:
+            self.finished = True
+        return frame
+
+    def release(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.decoder.release()
+
+class ThreadedEncoder:
+    stage_name = "encode wait"
+
+    def __init__(self, encoder, queue_size=8, stats=None):
+        self.encoder = encoder
+        self.queue_size = queue_size
+        self.stats = stats
+        self.queue = None
+        self.thread = None
+        self.error = None
+
+    @property
+    def output_path(self):
+        return self.encoder.output_path
+
+    def open(self, fps, size):
+        self.encoder.open(fps, size)
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def _worker(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+            if self.error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                self.encoder.write(frame)
+            except Exception as error:
+                # Keep draining the queue so the processing loop never blocks on a dead writer.
+                self.error = error
+                continue
+            if self.stats is not None:
+                self.stats.add("encode", time.perf_counter() - start)
+
+    def write(self, frame):
+        self.queue.put(frame)
+
+    def release(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.encoder.release()
+        if self.error is not None:
+            raise self.error
+
+
+# Live variants: a camera or a stream does not wait for the processing loop, so instead of
+# blocking, which would only add latency, they drop frames when the loop falls behind.
+
+class LatestFrameDecoder(ThreadedDecoder):
+    # Keeps at most queue_size captured frames, dropping the oldest one for every new frame
+    # once full. read() also sets timestamp, the capture time of the frame it returns.
+    stage_name = "capture wait"
+
+    def __init__(self, decoder, queue_size=1, stats=None, latency=None):
+        super().__init__(decoder, queue_size, stats)
+        self.latency = latency
+        self.timestamp = None
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            frame = self.decoder.read()
+            if frame is None:
+                self._put(None)
+                return
+            self._put_latest((frame, time.perf_counter()))
+
+    def _put_latest(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            if self.latency is not None:
+                self.latency.drop("capture")
+
+    def read(self):
+        if self.finished:
+            return None
+        item = self.queue.get()
+        if item is None:
+            self.finished = True
+            return None
+        frame, self.timestamp = item
+        return frame
+
+class DroppingEncoder(ThreadedEncoder):
+    # write() never waits: a frame that finds the queue full is dropped.
+    def __init__(self, encoder, queue_size=2, stats=None, latency=None):
+        super().__init__(encoder, queue_size, stats)
+        self.latency = latency
+
+    def write(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            if self.latency is not None:
+                self.latency.drop("output")
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def noise_video(tmp_path):
+    # Short clip of a textured scene, still or shaken by a random walk of up to `shake`
+    # pixels per frame; returns its path.
+    def write(frame_count=12, size=(64, 48), shake=0, seed=0):
+        path = str(tmp_path / "noise.avi")
+        rng = np.random.default_rng(seed)
+        margin = shake * frame_count
+        scene = cv2.GaussianBlur(rng.integers(0, 256, (size[1] + 2 * margin, size[0] + 2 * margin, 3)).astype(np.uint8), (0, 0), 1)
+        position = np.array([margin, margin])
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, size)
+        for _ in range(frame_count):
+            out.write(np.ascontiguousarray(scene[position[1]:position[1] + size[1], position[0]:position[0] + size[0]]))
+            position += rng.integers(-shake, shake + 1, 2)
+        out.release()
+        return path
+    return write
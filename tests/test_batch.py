@@ -0,0 +1,18 @@
+import os
+
+from batch import DEFAULT_JOB, load_jobs
+
+def test_folder_skips_outputs_and_other_files(tmp_path):
+    for name in ["a.mp4", "b.AVI", "a_stabilized.avi", "b_stabilized.mp4", "optimal points.txt"]:
+        (tmp_path / name).write_bytes(b"")
+    for name in ["clips/c.mp4", "out/c.avi"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+
+    jobs = load_jobs(str(tmp_path), DEFAULT_JOB)
+    assert [os.path.basename(job['video_path']) for job in jobs] == ["a.mp4", "b.AVI"]
+    assert [os.path.basename(job['output_path']) for job in jobs] == ["a_stabilized.avi", "b_stabilized.avi"]
+
+    # Nor are the outputs written to a folder the glob matches.
+    jobs = load_jobs(str(tmp_path / "*" / "*"), DEFAULT_JOB, output_dir=str(tmp_path / "out"))
+    assert [os.path.basename(job['video_path']) for job in jobs] == ["c.mp4"]
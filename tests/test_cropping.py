@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+from cropping import parse_size, crop_window, fit_output
+from trajectory import translation_matrix
+
+def test_parse_size():
+    assert parse_size("1280x720") == (1280, 720)
+    assert parse_size("1280X720") == (1280, 720)
+    assert parse_size("0x720") is None
+    assert parse_size("wide") is None
+
+def test_translations_crop_to_the_common_area():
+    transforms = [np.eye(3), translation_matrix(5, 0), translation_matrix(-3, 2), translation_matrix(0, -4)]
+    # x from 5 to 96 and y from 2 to 75 are covered by every frame; 74 rows is already even.
+    assert crop_window(transforms, (100, 80)) == (5, 2, 92, 74)
+    assert crop_window([np.eye(3)] * 3, (100, 80)) == (0, 0, 100, 80)
+
+def test_rotation_keeps_the_aspect_ratio_inside_every_frame():
+    size = (160, 90)
+    transforms = [np.vstack([cv2.getRotationMatrix2D((80, 45), angle, 1.0), [0, 0, 1]]) for angle in (-4, 0, 3)]
+    x, y, width, height = crop_window(transforms, size)
+    assert width % 2 == 0 and height % 2 == 0
+    assert abs(width / height - 159 / 89) < 0.05
+    assert width > 0.8 * size[0]
+
+    # Every corner of the window comes from inside every frame.
+    corners = np.float64([[x, y, 1], [x + width - 1, y, 1], [x, y + height - 1, 1], [x + width - 1, y + height - 1, 1]])
+    for transform in transforms:
+        source = np.linalg.inv(transform).dot(corners.T).T
+        assert (source[:, :2] >= -1e-6).all() and (source[:, 0] <= size[0] - 1 + 1e-6).all() and (source[:, 1] <= size[1] - 1 + 1e-6).all()
+
+def test_disjoint_frames_are_not_cropped():
+    transforms = [np.eye(3), translation_matrix(200, 0)]
+    assert crop_window(transforms, (100, 80)) is None
+    corrections, size = fit_output(transforms, (100, 80), crop=True)
+    assert size == (100, 80)
+    assert np.allclose(corrections, transforms)
+
+def test_fit_output_crops_then_scales():
+    transforms = [np.eye(3), translation_matrix(10, 0)]
+    corrections, size = fit_output(transforms, (100, 80), crop=True, output_size=(45, 40))
+    assert size == (45, 40)
+    # The crop window keeps the ratio of the output and fills it: its outer pixel edges map
+    # onto the edges of the output.
+    x, y, width, height = crop_window(transforms, (100, 80), 45 / 40)
+    assert x >= 10 and x + width <= 100 and height == 80
+    edges = corrections[0].dot(np.float64([[x - 0.5, y - 0.5, 1], [x + width - 0.5, y + height - 0.5, 1]]).T).T
+    assert np.allclose(edges[:, :2], [[-0.5, -0.5], [44.5, 39.5]])
@@ -0,0 +1,36 @@
+import sys
+
+import numpy as np
+import pytest
+
+from encoding import VideoEncoder, FFmpegEncoder
+from pipeline import VideoDecoder
+from results import EncoderError
+
+def test_zero_fps_falls_back_to_30(tmp_path):
+    path = str(tmp_path / "out.avi")
+    encoder = VideoEncoder(path, 'MJPG')
+    encoder.open(0, (32, 24))
+    encoder.write(np.zeros((24, 32, 3), dtype=np.uint8))
+    encoder.release()
+
+    decoder = VideoDecoder(path)
+    assert decoder.open()
+    decoder.release()
+    assert decoder.fps == pytest.approx(30)
+
+def test_missing_ffmpeg_raises_encoder_error(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    with pytest.raises(EncoderError):
+        FFmpegEncoder(str(tmp_path / "out.mp4")).open(25, (32, 24))
+
+def test_crashed_ffmpeg_raises_encoder_error(tmp_path):
+    encoder = FFmpegEncoder(str(tmp_path / "out.mp4"))
+    # Exits at once without reading the frames.
+    encoder.command = lambda fps, size: [sys.executable, "-c", "import sys; sys.exit(1)"]
+    encoder.open(25, (320, 240))
+    encoder.process.wait()
+    with pytest.raises(EncoderError):
+        encoder.write(np.zeros((240, 320, 3), dtype=np.uint8))
+    with pytest.raises(EncoderError):
+        encoder.release()
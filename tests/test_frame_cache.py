@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+
+from frame_cache import FrameCache, SeekableVideo, FORWARD_LIMIT
+
+def frame(nbytes, value=0):
+    return np.full(nbytes, value, dtype=np.uint8)
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = FrameCache(max_bytes=300)
+    for index in range(3):
+        cache.put(index, frame(100, index))
+    assert cache.get(0)[0] == 0
+    cache.put(1, frame(100))
+
+    # 0 was read and 1 put again (without counting twice): 2 is the oldest.
+    cache.put(3, frame(100))
+    assert list(cache.frames) == [0, 1, 3]
+    assert cache.bytes == 300
+
+    cache.put(4, frame(150))
+    assert list(cache.frames) == [3, 4]
+    assert cache.bytes == 250
+
+    # A frame larger than the whole cache replaces everything but is kept.
+    cache.put(5, frame(1000))
+    assert list(cache.frames) == [5]
+    assert cache.bytes == 1000
+
+def test_forward_or_seek():
+    video = SeekableVideo("unused", prefetch=0)
+    video.keyframes = [0, 10, 20]
+    video.position = 5
+    assert video._forward(5) and video._forward(9)
+    assert not video._forward(10) and not video._forward(4)
+    video.position = 25
+    assert video._forward(1000)
+
+    video.keyframes = None
+    video.position = 5
+    assert video._forward(5 + FORWARD_LIMIT)
+    assert not video._forward(6 + FORWARD_LIMIT)
+
+class CountingCapture:
+    def __init__(self, cap):
+        self.cap = cap
+        self.seeks = []
+
+    def read(self):
+        return self.cap.read()
+
+    def set(self, prop, value):
+        self.seeks.append(value)
+        return self.cap.set(prop, value)
+
+    def release(self):
+        self.cap.release()
+
+def test_reads_match_sequential_decode(noise_video):
+    path = noise_video()
+    cap = cv2.VideoCapture(path)
+    expected = [cap.read()[1] for _ in range(12)]
+    cap.release()
+
+    video = SeekableVideo(path, prefetch=0)
+    assert video.open()
+    video.keyframes = [0, 6]
+    video.cap = CountingCapture(video.cap)
+
+    for index in (3, 8, 5, 4):
+        assert (video.read(index) == expected[index]).all()
+    # 3 is decoded forward from the start, 8 from its keyframe past the next one, and 5,
+    # behind the decoder, from the first keyframe again; 4 is then cached.
+    assert video.cap.seeks == [6, 0]
+    assert sorted(video.cache.frames) == [0, 1, 2, 3, 4, 5, 6, 7, 8]
+    assert video.read(12) is None
+    video.release()
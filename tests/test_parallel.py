@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+
+from parallel import RangeDecoder, split_ranges, stitch_trajectories, trajectory_difference, parallel_stabilize, TOLERANCE_RMS, TOLERANCE_MAX
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from trajectory import Trajectory, translation_matrix
+
+def test_split_ranges_cover_every_frame():
+    ranges = split_ranges(100, 3, 15)
+    assert ranges == [(0, 33, 0), (33, 66, 18), (66, None, 51)]
+    assert split_ranges(2, 4, 15) == [(0, 1, 0), (1, None, 0)]
+
+def test_range_decoder_reads_the_range(noise_video):
+    path = noise_video()
+    cap = cv2.VideoCapture(path)
+    expected = [cap.read()[1] for _ in range(12)]
+    cap.release()
+
+    decoder = RangeDecoder(path, 4, 9)
+    assert decoder.open() and decoder.frame_count == 5
+    frames = []
+    while (frame := decoder.read()) is not None:
+        frames.append(frame)
+    decoder.release()
+    assert len(frames) == 5
+    assert all((frame == expected[4 + i]).all() for i, frame in enumerate(frames))
+
+def chunks(truth, ranges, absolute, invalid=()):
+    # What the workers return for a camera path: translations measured from the first
+    # frame each chunk tracked, or the steps between frames.
+    trajectories = []
+    for start, end, tracked_from in ranges:
+        frames = range(tracked_from, end if end is not None else len(truth))
+        if absolute:
+            estimates = [translation_matrix(*(truth[i] - truth[tracked_from])) for i in frames]
+        else:
+            estimates = [np.eye(3) if i == tracked_from else translation_matrix(*(truth[i] - truth[i - 1])) for i in frames]
+        valid = np.array([i not in invalid or i == tracked_from for i in frames])
+        trajectories.append(Trajectory(np.array(estimates), valid, absolute))
+    return trajectories
+
+def test_stitch_translation_chunks_onto_one_path():
+    truth = np.cumsum(np.random.default_rng(0).normal(0, 2, (100, 2)), axis=0)
+    truth -= truth[0]
+    ranges = split_ranges(100, 4, 10)
+    # Frames missing in the overlaps only reduce the frames the chunks are aligned on.
+    stitched = stitch_trajectories(chunks(truth, ranges, True, invalid={20, 21, 45, 70}), ranges)
+    assert len(stitched) == 100
+    path = stitched.camera_path()[:, :2, 2]
+    valid = np.ones(100, dtype=bool)
+    valid[[20, 21, 45, 70]] = False
+    assert np.allclose(path[valid], truth[valid], atol=1e-9)
+
+def test_stitch_homography_chunks_keep_the_steps():
+    truth = np.cumsum(np.random.default_rng(1).normal(0, 2, (60, 2)), axis=0)
+    truth -= truth[0]
+    ranges = split_ranges(60, 3, 5)
+    stitched = stitch_trajectories(chunks(truth, ranges, False), ranges)
+    assert np.allclose(stitched.camera_path()[:, :2, 2], truth, atol=1e-9)
+
+def test_parallel_matches_single_process(noise_video, tmp_path):
+    path = noise_video(frame_count=60, size=(96, 72), shake=1)
+    single = build_pipeline('global', VideoDecoder(path), VideoEncoder(None), [3, 0.01, 30]).analyze()
+    stitched = parallel_stabilize('global', path, str(tmp_path / "out.avi"), [3, 0.01, 30], workers=3)
+
+    assert len(stitched) == len(single) == 60
+    rms, worst = trajectory_difference(single, stitched)
+    assert rms <= TOLERANCE_RMS and worst <= TOLERANCE_MAX
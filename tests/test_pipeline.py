@@ -0,0 +1,85 @@
+import numpy as np
+
+from pipeline import VideoDecoder, VideoEncoder, LKTracker, build_pipeline
+from point_selection import PointSelector
+
+class LosingTracker(LKTracker):
+    # Loses the last of the current points on every frame.
+    def track(self, prev_gray, gray, points):
+        status = np.ones((len(points), 1), dtype=np.uint8)
+        status[-1] = 0
+        return points.copy(), status
+
+class DriftingTracker(LKTracker):
+    # Moves every point 10 pixels right and loses half of them on every frame.
+    def track(self, prev_gray, gray, points):
+        status = np.ones((len(points), 1), dtype=np.uint8)
+        status[::2] = 0
+        return points + np.float32([10, 0]), status
+
+class FailingTracker(LKTracker):
+    # Tracks every point until frame `last`, then loses them all.
+    def __init__(self, last, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last = last
+        self.frame = 0
+
+    def track(self, prev_gray, gray, points):
+        self.frame += 1
+        status = np.full((len(points), 1), self.frame <= self.last, dtype=np.uint8)
+        return points.copy(), status
+
+class RecordingSelector(PointSelector):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selections = []
+
+    def top_up(self, gray, roi, points):
+        points = super().top_up(gray, roi, points)
+        self.selections.append(points)
+        return points
+
+def test_redetect_after_gradual_point_loss(noise_video):
+    pipeline = build_pipeline('local', VideoDecoder(noise_video()), VideoEncoder(None), [3, 0.01, 30], (8, 8, 48, 32), points='grid')
+    pipeline.tracker = LosingTracker(3, 0.01, 30, window='fixed')
+    trajectory = pipeline.analyze()
+
+    # 9 grid points, one lost per frame: on frame 5 only 4 are tracked, less than half of
+    # the 9 selected, and 9 new points are selected before tracking fails.
+    assert [len(status) for status in trajectory.status[:8]] == [9, 9, 8, 7, 6, 5, 9, 8]
+    assert pipeline.stats.events.get("redetect") == 2
+    assert "tracking failure" not in pipeline.stats.events
+
+def test_redetect_near_the_border_stays_in_frame(noise_video):
+    pipeline = build_pipeline('local', VideoDecoder(noise_video()), VideoEncoder(None), [3, 0.01, 30], (32, 8, 24, 32), points='grid')
+    pipeline.tracker = DriftingTracker(3, 0.01, 30, window='fixed')
+    pipeline.point_selector = RecordingSelector('grid')
+    pipeline.analyze()
+
+    # The ROI follows the points to the right edge of the 64x48 frame, and no further.
+    assert len(pipeline.point_selector.selections) == pipeline.stats.events["redetect"] > 1
+    for points in pipeline.point_selector.selections:
+        assert (points[..., 0] >= 0).all() and (points[..., 0] < 64).all()
+        assert (points[..., 1] >= 0).all() and (points[..., 1] < 48).all()
+    assert pipeline.point_selector.selections[-1][..., 0].max() > 56
+
+def test_deferred_frames_written_at_the_end(noise_video, tmp_path):
+    pipeline = build_pipeline('local', VideoDecoder(noise_video()), VideoEncoder(str(tmp_path / "out.avi")), [3, 0.01, 30], (8, 8, 48, 32), points='grid')
+    pipeline.tracker = FailingTracker(8, 3, 0.01, 30, window='fixed')
+    pipeline.run()
+
+    # Frames 9 to 11 never get a good estimate: they are written with the last transform.
+    assert not pipeline.trajectory.valid[9:].any()
+    assert pipeline.frames_written == 12
+
+def test_top_up_keeps_tracked_points():
+    gray = np.zeros((48, 64), dtype=np.uint8)
+    kept = np.float32([[16, 12], [30, 30], [100, 10]]).reshape(-1, 1, 2)
+    points = PointSelector('grid').top_up(gray, (0, 0, 64, 48), kept)
+
+    # The point outside the frame is dropped and the others stay first. Of the 3x3 grid,
+    # (16, 12) and the two points 6 px from (30, 30) are too close to them and skipped.
+    assert points.shape == (8, 1, 2)
+    assert (points[:2] == kept[:2]).all()
+    distances = np.linalg.norm(points[2:].reshape(-1, 1, 2) - kept[:2].reshape(1, -1, 2), axis=2)
+    assert (distances >= np.sqrt(64 * 48 / 9) / 2).all()
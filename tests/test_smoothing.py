@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+
+from pipeline import HomographyEMASmoother, exponential_moving_average
+from smoothing import EMASmoother, SlidingWindowSmoother, OneEuroSmoother
+from trajectory import moving_average_filter
+
+def homographies(n, seed=0):
+    H = np.repeat(np.eye(3)[np.newaxis], n, axis=0)
+    H += np.random.default_rng(seed).normal(0, 1e-3, (n, 3, 3))
+    H[:, :2, 2] *= 1000
+    return H
+
+def test_homography_ema_matches_full_history():
+    H = homographies(50)
+    smoother = HomographyEMASmoother(alpha=0.2)
+    path = np.eye(3)
+    for k in range(len(H)):
+        # The old smoother replayed every homography seen so far on each frame.
+        path = exponential_moving_average(H[:k + 1], alpha=0.2).dot(path)
+        assert np.allclose(smoother.apply(H[k]), path, rtol=0, atol=1e-12)
+
+def test_ema_normalize_and_reset():
+    smoother = EMASmoother(alpha=0.5, initial=np.eye(3), normalize=True)
+    for H in homographies(10):
+        assert smoother.update(H)[2, 2] == 1
+    smoother.reset()
+    assert (smoother.update(np.eye(3) * 2) == np.eye(3)).all()
+
+def test_sliding_window_is_trailing_mean():
+    values = np.random.default_rng(0).normal(0, 1, (100, 2))
+    smoother = SlidingWindowSmoother(window_size=7)
+    smoothed = np.array([smoother.update(value) for value in values])
+    assert np.allclose(smoothed, moving_average_filter(values, 7))
+    assert len(smoother.window) == 7
+
+def test_one_euro_without_beta_is_an_ema():
+    values = np.random.default_rng(0).normal(0, 1, (100, 2))
+    one_euro = OneEuroSmoother(min_cutoff=1.0, beta=0.0, rate=30.0)
+    ema = EMASmoother(alpha=1.0 / (1.0 + 30.0 / (2 * math.pi)))
+    for value in values:
+        assert np.allclose(one_euro.update(value), ema.update(value))
+
+def test_one_euro_follows_fast_moves_with_less_lag():
+    step = np.concatenate([np.zeros(30), np.full(30, 100.0)])
+    lag = {}
+    for beta in (0.0, 0.1):
+        smoother = OneEuroSmoother(min_cutoff=1.0, beta=beta, rate=30.0)
+        lag[beta] = 100 - [smoother.update(value) for value in step][35]
+    assert 0 < lag[0.1] < lag[0.0] / 2
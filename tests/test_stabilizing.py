@@ -0,0 +1,40 @@
+import threading
+
+import cv2
+import numpy as np
+
+from stabilizing import global_stabilizer_video
+from trajectory_cache import TrajectoryCache
+
+def test_cached_frame_range_threaded(noise_video, tmp_path):
+    video_path = noise_video(frame_count=40, size=(96, 72), shake=2)
+    cache = TrajectoryCache(str(tmp_path / "cache"))
+    lkparams = [3, 0.01, 30]
+
+    def stabilize(name, **kwargs):
+        return global_stabilizer_video(video_path, str(tmp_path / name), lkparams, 0, 0, preview=False, threaded=True, **kwargs)
+
+    full = stabilize("full.avi", cache=cache)
+    expected = stabilize("expected.avi", frame_range=(20, 30))
+    ranged = stabilize("ranged.avi", cache=cache, frame_range=(20, 30))
+
+    assert len(full.trajectory) == 40
+    # Tracked from frame 20, not replayed from the cached trajectory of the full video.
+    assert len(ranged.trajectory) == 10
+    assert (ranged.trajectory.estimates == expected.trajectory.estimates).all()
+    assert (ranged.trajectory.estimates != full.trajectory.estimates[:10]).any()
+
+def test_cancelled_analysis_ignores_stale_output(noise_video, tmp_path):
+    output_path = str(tmp_path / "out.avi")
+    stale = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (32, 24))
+    for _ in range(5):
+        stale.write(np.zeros((24, 32, 3), dtype=np.uint8))
+    stale.release()
+
+    cancel = threading.Event()
+    cancel.set()
+    result = global_stabilizer_video(noise_video(), output_path, [3, 0.01, 30], 0, 0, preview=False, two_pass=True, cancel=cancel)
+
+    assert result.cancelled and result.frames == 0
+    assert result.output_size is None and result.output_fps == 0
+    assert result.summary()['output_bytes'] == 0
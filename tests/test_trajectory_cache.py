@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from pipeline import VideoDecoder, VideoEncoder, build_pipeline
+from trajectory import Trajectory
+from trajectory_cache import TrajectoryCache
+
+def trajectory(n, seed=0):
+    estimates = np.repeat(np.eye(3)[np.newaxis], n, axis=0)
+    estimates[:, :2, 2] = np.random.default_rng(seed).normal(0, 1, (n, 2))
+    return Trajectory(estimates, np.ones(n, dtype=bool), True)
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = TrajectoryCache(str(tmp_path))
+    for age, key in enumerate(["a", "b", "c"]):
+        cache.store(key, trajectory(50, age))
+        os.utime(cache.entry_path(key), (1000 + age, 1000 + age))
+
+    # Loading "a" makes it the most recently used: "b" is now the oldest entry.
+    assert len(cache.load("a")) == 50
+    sizes = {name: size for _, size, name in cache.entries()}
+    cache.max_size = sum(sizes.values()) - 1
+    cache.evict()
+    assert sorted(name for _, _, name in cache.entries()) == ["a.npz", "c.npz"]
+
+    cache.max_size = sizes["a.npz"]
+    cache.evict()
+    assert [name for _, _, name in cache.entries()] == ["a.npz"]
+    assert cache.load("b") is None
+
+def test_corrupt_entry_is_removed(tmp_path):
+    cache = TrajectoryCache(str(tmp_path))
+    with open(cache.entry_path("a"), "wb") as file:
+        file.write(b"not a trajectory")
+    assert cache.load("a") is None
+    assert not os.path.exists(cache.entry_path("a"))
+
+def test_key_changes_with_video_and_parameters(noise_video, tmp_path):
+    cache = TrajectoryCache(str(tmp_path / "cache"))
+    video_path = noise_video()
+
+    def key(**kwargs):
+        pipeline = build_pipeline('global', VideoDecoder(video_path), VideoEncoder(None), [3, 0.01, 30], cache=cache, **kwargs)
+        return pipeline._cached_trajectory()[0]
+
+    assert key() == key()
+    keys = {key(), key(factor=5), key(window='fixed'), key(points='gftt'), key(analysis_scale=0.5)}
+    assert len(keys) == 5
+
+    # The same file name with other content is another video.
+    first = key()
+    noise_video(seed=1)
+    assert key() != first
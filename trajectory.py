@@ -0,0 +1,134 @@
+import numpy as np
+
+SMOOTHING_METHODS = ['none', 'moving_average', 'kalman']
+
+def translation_matrix(dx, dy):
+    return np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=np.float64)
+
+def scale_transform(transform, scale):
+    # The same motion in coordinates multiplied by scale: S * transform * S^-1.
+    S = np.diag([scale, scale, 1.0])
+    return S.dot(transform).dot(np.diag([1 / scale, 1 / scale, 1.0]))
+
+def moving_average_filter(transformations, window_size=5, centered=False):
+    values = np.asarray(transformations, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values
+
+    cumsum = np.concatenate((np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)))
+    index = np.arange(n)
+    if centered:
+        start = np.maximum(index - window_size // 2, 0)
+        end = np.minimum(index + (window_size - 1) // 2 + 1, n)
+    else:
+        start = np.maximum(index - window_size + 1, 0)
+        end = index + 1
+
+    counts = (end - start).reshape((-1,) + (1,) * (values.ndim - 1))
+    return (cumsum[end] - cumsum[start]) / counts
+
+def kalman_smoother(values, window_size=30):
+    # Forward Kalman filter + Rauch-Tung-Striebel backward pass on a random walk model.
+    # The ratio between process and measurement noise is tied to the window size, so
+    # both methods share the same "how much to smooth" knob.
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values
+
+    q = 1.0 / max(window_size, 1) ** 2
+    r = 1.0
+
+    filtered = np.empty_like(values)
+    predicted_P = np.empty(n)
+    filtered_P = np.empty(n)
+
+    filtered[0] = values[0]
+    predicted_P[0] = filtered_P[0] = r
+    for k in range(1, n):
+        predicted_P[k] = filtered_P[k - 1] + q
+        gain = predicted_P[k] / (predicted_P[k] + r)
+        filtered[k] = filtered[k - 1] + gain * (values[k] - filtered[k - 1])
+        filtered_P[k] = (1 - gain) * predicted_P[k]
+
+    smoothed = filtered.copy()
+    for k in range(n - 2, -1, -1):
+        gain = filtered_P[k] / predicted_P[k + 1]
+        smoothed[k] = filtered[k] + gain * (smoothed[k + 1] - filtered[k])
+    return smoothed
+
+def smooth_path(path, method='moving_average', window_size=30):
+    if method == 'none':
+        return np.repeat(np.eye(3)[np.newaxis], len(path), axis=0)
+    elif method == 'moving_average':
+        smoothed = moving_average_filter(path, window_size, centered=True)
+    elif method == 'kalman':
+        smoothed = kalman_smoother(path, window_size)
+    else:
+        raise ValueError(f"Unknown smoothing method: {method}")
+    return smoothed / smoothed[:, 2:3, 2:3]
+
+
+class Trajectory:
+    # Per-frame output of the motion model. "absolute" models (translation) estimate the
+    # displacement of the ROI from its reference position, the others (homography)
+    # estimate the motion between consecutive frames.
+    # points/status optionally keep the tracked points of every frame (the number of
+    # points may change from frame to frame).
+    def __init__(self, estimates, valid, absolute, points=None, status=None):
+        self.estimates = np.asarray(estimates, dtype=np.float64)
+        self.valid = np.asarray(valid, dtype=bool)
+        self.absolute = absolute
+        self.points = points
+        self.status = status
+
+    def __len__(self):
+        return len(self.estimates)
+
+    def camera_path(self):
+        n = len(self.estimates)
+        path = np.repeat(np.eye(3)[np.newaxis], n, axis=0)
+        if self.absolute:
+            valid_index = np.flatnonzero(self.valid)
+            if len(valid_index) == 0:
+                return path
+            # Frames without an estimate take the next good one, like the single-pass
+            # loop does with its frame buffer; the tail takes the last good one.
+            source = np.searchsorted(valid_index, np.arange(n))
+            source = valid_index[np.minimum(source, len(valid_index) - 1)]
+            return self.estimates[source]
+
+        for i in range(1, n):
+            step = self.estimates[i] if self.valid[i] else np.eye(3)
+            path[i] = step.dot(path[i - 1])
+        return path
+
+    def corrections(self, method='moving_average', window_size=30, offset=(0, 0)):
+        path = self.camera_path()
+        smoothed = smooth_path(path, method, window_size)
+        corrections = np.matmul(smoothed, np.linalg.inv(path))
+        if offset[0] != 0 or offset[1] != 0:
+            corrections = np.matmul(translation_matrix(offset[0], offset[1]), corrections)
+        return corrections
+
+    def save(self, path, compressed=False):
+        arrays = dict(estimates=self.estimates, valid=self.valid, absolute=self.absolute)
+        if self.points is not None and self.status is not None:
+            arrays['point_counts'] = np.array([len(p) for p in self.points], dtype=np.int32)
+            arrays['points'] = np.concatenate([np.asarray(p, dtype=np.float32).reshape(-1, 2) for p in self.points])
+            arrays['status'] = np.concatenate([np.asarray(s, dtype=np.uint8).reshape(-1) for s in self.status])
+        if compressed:
+            np.savez_compressed(path, **arrays)
+        else:
+            np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            points = status = None
+            if 'point_counts' in data:
+                splits = np.cumsum(data['point_counts'])[:-1]
+                points = [p.reshape(-1, 1, 2) for p in np.split(data['points'], splits)]
+                status = [s.reshape(-1, 1) for s in np.split(data['status'], splits)]
+            return cls(data['estimates'], data['valid'], bool(data['absolute']), points, status)
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+
+from trajectory import Trajectory
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "stabilization-tool")
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TrajectoryCache:
+    # On-disk cache of the tracking pass. Entries are .npz files keyed by the content of the
+    # video plus every parameter that affects tracking, and the least recently used ones are
+    # evicted once the cache grows over max_size bytes.
+    def __init__(self, cache_dir=None, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir if cache_dir is not None else DEFAULT_CACHE_DIR
+        self.max_size = max_size
+
+    def key(self, video_path, parameters):
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(file_digest(video_path).encode())
+        digest.update(json.dumps(parameters, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def load(self, key):
+        path = self.entry_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            trajectory = Trajectory.load(path)
+        except (OSError, ValueError, KeyError):
+            os.remove(path)
+            return None
+        os.utime(path)
+        return trajectory
+
+    def store(self, key, trajectory):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.entry_path(key)
+        tmp_path = path + ".tmp.npz"
+        trajectory.save(tmp_path, compressed=True)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz") and not name.endswith(".tmp.npz"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def clear(self):
+        for _, _, name in self.entries():
+            os.remove(os.path.join(self.cache_dir, name))
@@ -6,69 +6,229 @@ from PIL import Image, ImageTk
 
 import time
 import threading
+from collections import deque
+
+from frame_cache import SeekableVideo
+from buffers import FrameRing
+
+# Playback: every player decodes and scales its frames on its own worker thread into a small
+# PlaybackBuffer, and the controls show, on every tick of a PresentationClock shared by the
+# players, the frame due at that time in each of them. A frame that is late when the next one
+# is already due is dropped, instead of slowing the playback down or letting the players drift
+# apart. The workers never touch Tk: the ticks are scheduled with after() on the Tk main loop,
+# which does all the drawing.
+
+PLAYBACK_BUFFER_FRAMES = 4
+
+class PresentationClock:
+    def __init__(self, fps, start_frame=0):
+        self.fps = fps if fps > 0 else 30
+        self.start_frame = start_frame
+        self.start_time = time.perf_counter()
+
+    def frame(self):
+        # Frame due on screen now.
+        return self.start_frame + int((time.perf_counter() - self.start_time) * self.fps)
+
+    def time_until(self, frame_number):
+        return self.start_time + (frame_number - self.start_frame) / self.fps - time.perf_counter()
+
+class PlaybackBuffer:
+    # (frame number, image) pairs from a decoding worker, None at the end of the video.
+    def __init__(self, size=PLAYBACK_BUFFER_FRAMES):
+        self.size = size
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.stopped = False
+
+    def put(self, item):
+        # Blocks while full; False once stopped.
+        with self.condition:
+            while len(self.items) >= self.size and not self.stopped:
+                self.condition.wait()
+            if self.stopped:
+                return False
+            self.items.append(item)
+            return True
+
+    def take(self, frame_number):
+        # The latest frame due by frame_number, the number of older frames skipped for it,
+        # and whether the end of the video was reached.
+        latest, skipped, ended = None, 0, False
+        with self.condition:
+            while self.items:
+                item = self.items[0]
+                if item is None:
+                    ended = latest is None
+                    break
+                if item[0] > frame_number:
+                    break
+                if latest is not None:
+                    skipped += 1
+                latest = self.items.popleft()
+            self.condition.notify()
+        return latest, skipped, ended
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
 
 class VideoPlayer(tk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
         self.canvas = Canvas(self, bg='black')
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        # Read by the decoding worker, which must not call Tk.
+        self.display_size = (1, 1)
+        self.canvas.bind("<Configure>", self.resize)
+        # A single canvas item and PhotoImage, updated in place for every frame; the
+        # PhotoImage is only replaced when the canvas size changes.
+        self.image_item = None
+        self.photo = None
+        # Scaled and converted frames of update_frame(), two arrays per frame (see prepare());
+        # the decoding worker has its own.
+        self.frames = FrameRing(2)
 
         self.video_source = None
         self.vid = None
+        # Frame number of the first frame of the video, for a preview of a range of frames
+        # shown next to the whole input.
+        self.first_frame = 0
         self.fps = 0
         self.frame_count = 0
         self.duration = 0
         self.frame_interval = 0
         self.current_frame = 0
+        # Frame shown by the next update_frame().
+        self.next_frame = 0
 
         self.is_playing = False
+        self.buffer = None
+        self.worker = None
+        self.dropped = 0
+        self.presented = deque(maxlen=60)
 
         self.mutex = threading.Lock()
 
-    def load_video(self, video_source):
+    def resize(self, event):
+        self.display_size = (max(event.width, 1), max(event.height, 1))
+
+    def load_video(self, video_source, first_frame=0):
+        # Frames are read through a SeekableVideo (frame_cache.py): seeking and stepping hit
+        # its cache or decode from the nearest keyframe, and playback is decoded ahead.
+        self.release()
         self.video_source = video_source
-        self.vid = cv2.VideoCapture(video_source)
-        self.fps = int(self.vid.get(cv2.CAP_PROP_FPS))
-        self.frame_count = int(self.vid.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.vid = SeekableVideo(video_source)
+        self.vid.open()
+        self.first_frame = first_frame
+        self.fps = self.vid.fps
+        self.frame_count = first_frame + self.vid.frame_count
         self.duration = self.frame_count / self.fps
         self.frame_interval = int(1000 // self.fps)
+        self.next_frame = first_frame
         self.update_frame()
 
     def update_frame(self):
-        if self.vid and self.vid.isOpened():
-            ret, frame = self.vid.read()
-            if ret:
+        vid = self.vid
+        if vid:
+            with self.mutex:
+                frame_number = self.next_frame
+            frame = vid.read(frame_number - self.first_frame)
+            if frame is not None:
                 start_time = time.time()
-
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image = Image.fromarray(frame)
-                image = image.resize((self.canvas.winfo_width(), self.canvas.winfo_height()), Image.BOX)
-                photo = ImageTk.PhotoImage(image)
-
-                self.canvas.create_image(0, 0, image=photo, anchor=tk.NW)
-                self.canvas.image = photo
-                self.current_frame = int(self.vid.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+                self.display(frame_number, self.prepare(frame, self.frames))
                 elapsed_time = (time.time() - start_time) * 1000
 
                 return elapsed_time
         return -1
 
+    def prepare(self, frame, ring):
+        # Frame to an RGB image at the size of the canvas, scaled first so that only the
+        # displayed pixels are converted, into the arrays of the ring (reallocated only when
+        # the canvas size changes). Both arrays are alive until the image is displayed: the
+        # ring must hold two per frame that can be waiting. Also run by the decoding worker.
+        width, height = self.display_size
+        scaled = cv2.resize(frame, (width, height), dst=ring.next((height, width, 3)), interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(scaled, cv2.COLOR_BGR2RGB, dst=ring.next((height, width, 3)))
+        return Image.frombuffer("RGB", (width, height), rgb, "raw", "RGB", 0, 1)
+
+    def display(self, frame_number, image):
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == image.size:
+            self.photo.paste(image)
+        else:
+            self.photo = ImageTk.PhotoImage(image)
+            if self.image_item is None:
+                self.image_item = self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
+            else:
+                self.canvas.itemconfig(self.image_item, image=self.photo)
+        self.current_frame = frame_number
+        with self.mutex:
+            if self.next_frame == frame_number:
+                self.next_frame = frame_number + 1
+
+    def _decode(self, buffer, vid, frame_number):
+        # Two arrays per frame, for every frame the buffer and the display may hold.
+        ring = FrameRing(2 * (buffer.size + 2))
+        while True:
+            frame = vid.read(frame_number - self.first_frame)
+            if frame is None:
+                buffer.put(None)
+                return
+            if not buffer.put((frame_number, self.prepare(frame, ring))):
+                return
+            frame_number += 1
+
+    def present(self, frame_number):
+        # From the Tk main loop only. Shows the latest decoded frame due by frame_number;
+        # False at the end of the video.
+        if self.buffer is None:
+            return False
+        item, skipped, ended = self.buffer.take(frame_number)
+        self.dropped += skipped
+        if item is not None:
+            self.display(*item)
+            self.presented.append(time.perf_counter())
+        return not ended
+
+    def playback_fps(self):
+        if len(self.presented) < 2 or self.presented[-1] == self.presented[0]:
+            return 0
+        return (len(self.presented) - 1) / (self.presented[-1] - self.presented[0])
+
     def seek(self, frame_number):
-        if self.vid and self.vid.isOpened():
+        if self.vid:
             with self.mutex:
-                self.vid.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+                self.next_frame = frame_number
             if not self.is_playing:
                 self.update_frame()
 
+    def step(self, frames):
+        self.seek(min(max(self.current_frame + frames, 0), self.frame_count - 1))
+
     def play(self):
         self.is_playing = True
+        if self.vid:
+            self.dropped = 0
+            self.presented.clear()
+            self.buffer = PlaybackBuffer()
+            self.worker = threading.Thread(target=self._decode, args=(self.buffer, self.vid, self.next_frame), daemon=True)
+            self.worker.start()
 
     def pause(self):
+        # The worker stops at its next put(), at most one frame later.
         self.is_playing = False
+        buffer, worker = self.buffer, self.worker
+        self.buffer = self.worker = None
+        if worker is not None:
+            buffer.stop()
+            worker.join()
 
     def release(self):
+        self.pause()
         if self.vid:
             self.vid.release()
+            self.vid = None
 
 
 class VideoControls(tk.Frame):
@@ -77,16 +237,25 @@ class VideoControls(tk.Frame):
         self.players = players
 
         self.is_playing = False
+        self.clock = None
+        self.tick_id = None
 
         self.slider = Scale(self, from_=0, to=1, orient=tk.HORIZONTAL, command=self.seek)
         self.slider.pack(fill=tk.X, padx=10, pady=5)
 
-        self.play_button = Button(self, text="Play", command=self.toggle_play)
-        self.play_button.pack(pady=5)
+        buttons = tk.Frame(self)
+        buttons.pack(pady=5)
+        Button(buttons, text="<", command=lambda: self.step(-1)).pack(side=tk.LEFT)
+        self.play_button = Button(buttons, text="Play", command=self.toggle_play)
+        self.play_button.pack(side=tk.LEFT, padx=5)
+        Button(buttons, text=">", command=lambda: self.step(1)).pack(side=tk.LEFT)
 
         self.time_label = Label(self, text="00:00 / 00:00")
         self.time_label.pack(pady=5)
 
+        self.playback_label = Label(self, text="")
+        self.playback_label.pack()
+
         self.update_slider_range()
 
     def update_slider_range(self):
@@ -114,34 +283,55 @@ class VideoControls(tk.Frame):
             self.time_label.config(text=f"{elapsed_time_str} / {duration_str}")
 
     def toggle_play(self):
-        if any(player.is_playing for player in self.players):
-            for player in self.players:
-                player.pause()
-            self.play_button.config(text="Play")
-            self.is_playing = False
-            self.slider.config(command=self.seek)
+        if self.is_playing:
+            self.pause()
         else:
-            for player in self.players:
-                player.play()
-            self.play_button.config(text="Pause")
-            self.is_playing = True
-            self.slider.config(command=self.unseek)
-            threading.Thread(target=self.play_videos).start()
+            self.play()
+
+    def play(self):
+        for player in self.players:
+            player.play()
+        self.play_button.config(text="Pause")
+        self.is_playing = True
+        self.slider.config(command=self.unseek)
+        self.clock = PresentationClock(self.players[0].fps, min(player.next_frame for player in self.players))
+        self.tick_id = self.after(0, self.tick)
 
-    def play_videos(self):
-        while self.is_playing:
-            intervals = [player.update_frame() for player in self.players]
-            if any(interval == -1 for interval in intervals):
-                self.toggle_play()
-                break
-            self.update()
-            time.sleep(max(0, self.players[0].frame_interval - sum(intervals))/1000)
+    def pause(self):
+        self.is_playing = False
+        if self.tick_id is not None:
+            self.after_cancel(self.tick_id)
+            self.tick_id = None
+        for player in self.players:
+            player.pause()
+        self.play_button.config(text="Play")
+        self.slider.config(command=self.seek)
+
+    def tick(self):
+        # Shows the frame due now in every player and schedules the next one.
+        self.tick_id = None
+        if not self.is_playing:
+            return
+        frame_number = self.clock.frame()
+        if not all([player.present(frame_number) for player in self.players]):
+            self.pause()
+            return
+        self.update()
+        self.playback_label.config(text="   ".join(f"{player.playback_fps():.1f} fps, {player.dropped} dropped" for player in self.players))
+        self.tick_id = self.after(max(int(self.clock.time_until(frame_number + 1) * 1000), 1), self.tick)
 
     def seek(self, value):
         frame_number = int(value)
         for player in self.players:
             player.seek(frame_number)
 
+    def step(self, frames):
+        if self.is_playing or not self.players:
+            return
+        for player in self.players:
+            player.step(frames)
+        self.update()
+
     def unseek(self, value):
         pass
 
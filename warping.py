@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+# Warping of the stabilized frames.
+#
+# Local and global stabilization only translate the frames. TranslationWarper copies the
+# frame with an integer shift (a crop plus the border) instead of interpolating it when the
+# shift is within a quarter of warpAffine's 1/32 pixel step of an integer. The pixels are
+# the same as warpAffine's, except that with the constant border warpAffine blends a few
+# gray levels of black into the row and column along the border. Other shifts are
+# interpolated with the chosen method, except with "nearest", which rounds every shift so
+# that every frame is copied.
+
+INTERPOLATIONS = ['linear', 'nearest', 'cubic']
+BORDERS = ['constant', 'replicate', 'reflect']
+
+INTERPOLATION_FLAGS = {'linear': cv2.INTER_LINEAR, 'nearest': cv2.INTER_NEAREST, 'cubic': cv2.INTER_CUBIC}
+BORDER_MODES = {'constant': cv2.BORDER_CONSTANT, 'replicate': cv2.BORDER_REPLICATE, 'reflect': cv2.BORDER_REFLECT}
+
+# warpAffine quantizes coordinates to 1/INTER_TAB_SIZE of a pixel.
+INTER_TAB_SIZE = 32
+INTEGER_TOLERANCE = 1.0 / (4 * INTER_TAB_SIZE)
+
+def shift_frame(frame, dx, dy, border_mode=cv2.BORDER_CONSTANT, dst=None, size=None):
+    # Same as warpAffine with the integer translation (dx, dy) into a canvas of the given
+    # size (the frame's by default), without interpolation. The frame must overlap the canvas.
+    height, width = frame.shape[:2]
+    out_width, out_height = size if size is not None else (width, height)
+    left, right = min(max(dx, 0), out_width), min(max(width + dx, 0), out_width)
+    top, bottom = min(max(dy, 0), out_height), min(max(height + dy, 0), out_height)
+    source = frame[top - dy:bottom - dy, left - dx:right - dx]
+    return cv2.copyMakeBorder(source, top, out_height - bottom, left, out_width - right, border_mode, dst=dst, value=0)
+
+def warp_flags(interpolation, border):
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError(f"Unknown interpolation: {interpolation}")
+    if border not in BORDERS:
+        raise ValueError(f"Unknown border: {border}")
+    return INTERPOLATION_FLAGS[interpolation], BORDER_MODES[border]
+
+def is_translation(transform, tolerance=1e-9):
+    return np.abs(transform[:2, :2] - np.eye(2)).max() <= tolerance and np.abs(transform[2] - (0, 0, 1)).max() <= tolerance
+
+class AffineWarper:
+    def __init__(self, interpolation='linear', border='constant'):
+        self.flags, self.border_mode = warp_flags(interpolation, border)
+
+    def warp(self, frame, transform, dst=None, size=None):
+        size = size if size is not None else (frame.shape[1], frame.shape[0])
+        return cv2.warpAffine(frame, transform[:2], size, dst=dst, flags=self.flags, borderMode=self.border_mode)
+
+class PerspectiveWarper:
+    def __init__(self, interpolation='linear', border='constant'):
+        self.flags, self.border_mode = warp_flags(interpolation, border)
+
+    def warp(self, frame, transform, dst=None, size=None):
+        size = size if size is not None else (frame.shape[1], frame.shape[0])
+        return cv2.warpPerspective(frame, transform, size, dst=dst, flags=self.flags, borderMode=self.border_mode)
+
+class TranslationWarper(AffineWarper):
+    def __init__(self, interpolation='linear', border='constant'):
+        super().__init__(interpolation, border)
+        self.interpolation = interpolation
+        # Frames copied and interpolated, for the benchmarks.
+        self.copied = 0
+        self.interpolated = 0
+
+    def warp(self, frame, transform, dst=None, size=None):
+        if not is_translation(transform):
+            return super().warp(frame, transform, dst, size)
+        height, width = frame.shape[:2]
+        out_width, out_height = size if size is not None else (width, height)
+        dx, dy = transform[0, 2], transform[1, 2]
+        ix, iy = int(round(dx)), int(round(dy))
+        near_integer = abs(dx - ix) < INTEGER_TOLERANCE and abs(dy - iy) < INTEGER_TOLERANCE
+        if (near_integer or self.interpolation == 'nearest') and -width < ix < out_width and -height < iy < out_height:
+            self.copied += 1
+            return shift_frame(frame, ix, iy, self.border_mode, dst, size)
+        self.interpolated += 1
+        return super().warp(frame, transform, dst, size)